@@ -219,7 +219,8 @@ class AIFoundation:
         )
         
         async for chunk in self.llm.stream_generate(request):
-            yield chunk
+            if chunk.text:
+                yield chunk.text
     
     async def agent_execute(self, task: str) -> dict:
         """执行Agent任务"""
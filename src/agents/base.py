@@ -19,7 +19,7 @@ Agent类型：
 """
 
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 from enum import Enum
 from datetime import datetime
@@ -30,6 +30,39 @@ from src.providers.llm.factory import LLMProviderFactory, ILLMProvider
 from src.tools.tool_manager import ToolManager
 
 
+# provider 集合 -> (各 provider 的配置对象, 模型名 -> provider 索引)
+_MODEL_INDEX_CACHE: Dict[Tuple[str, ...], Tuple[Tuple[Any, ...], Dict[str, Tuple[str, ...]]]] = {}
+
+
+def _model_provider_index(providers: Tuple[str, ...]) -> Dict[str, Tuple[str, ...]]:
+    """
+    获取 模型名 -> provider 列表 的索引
+    
+    按 provider 集合缓存；缓存同时记录构建时的配置对象并按身份校验，
+    配置重新加载后对象变化，索引自动重建。
+    """
+    configs = tuple(get_provider_config(provider_name) for provider_name in providers)
+    cached = _MODEL_INDEX_CACHE.get(providers)
+    if cached is not None and all(old is new for old, new in zip(cached[0], configs)):
+        return cached[1]
+
+    index: Dict[str, List[str]] = {}
+    for provider_name, provider_config in zip(providers, configs):
+        if provider_config is None:
+            continue
+
+        configured_models = {
+            configured_model.strip().lower()
+            for configured_model in (provider_config.models or {}).values()
+            if isinstance(configured_model, str)
+        }
+        for configured_model in configured_models:
+            index.setdefault(configured_model, []).append(provider_name)
+    result = {model: tuple(names) for model, names in index.items()}
+    _MODEL_INDEX_CACHE[providers] = (configs, result)
+    return result
+
+
 class AgentType(str, Enum):
     """
     Agent类型枚举
@@ -159,23 +192,13 @@ class BaseAgent(IAgent, ABC):
         if not normalized_model:
             raise ValueError("Model name cannot be empty")
 
-        registered_providers = [name.lower() for name in LLMProviderFactory.list_providers()]
+        registered_providers = tuple(
+            sorted(name.lower() for name in LLMProviderFactory.list_providers())
+        )
         if normalized_model in registered_providers:
             return normalized_model
 
-        matches = []
-        for provider_name in registered_providers:
-            provider_config = get_provider_config(provider_name)
-            if provider_config is None:
-                continue
-
-            configured_models = provider_config.models or {}
-            for configured_model in configured_models.values():
-                if not isinstance(configured_model, str):
-                    continue
-                if configured_model.strip().lower() == normalized_model:
-                    matches.append(provider_name)
-                    break
+        matches = _model_provider_index(registered_providers).get(normalized_model, ())
 
         if len(matches) == 1:
             return matches[0]
@@ -81,12 +81,13 @@ class ConversationalAgent(BaseAgent):
             llm = self._get_llm_provider()
             response = await llm.generate(request)
             
-            # 添加到历史
-            await self._context_manager.add_message(conversation_id, "user", task)
-            await self._context_manager.add_message(
-                conversation_id, 
-                "assistant", 
-                response.content
+            # 添加到历史（一次批量写入）
+            await self._context_manager.add_messages(
+                conversation_id,
+                [
+                    Message(role=MessageRole.USER, content=task),
+                    Message(role=MessageRole.ASSISTANT, content=response.content),
+                ],
             )
             
             # 检查是否需要总结
@@ -4,13 +4,30 @@
 
 from typing import Dict, Any, List, Optional
 from dataclasses import dataclass
-from datetime import datetime
+from functools import lru_cache
 
-from src.core.interfaces import IContextManager, Message, MessageRole, UsageInfo
+from src.core.interfaces import IContextManager, Message, MessageRole, ROLE_MAP, UsageInfo
 from src.providers.llm.factory import LLMProviderFactory, ILLMProvider
 
 
-@dataclass
+# 角色前缀只有固定几种取值，预先构建避免每条消息重复格式化
+_ROLE_PREFIX = {role: f"{role.value}: " for role in MessageRole}
+
+# 每条消息在拼接上下文时额外占用的分隔符Token
+_TOKENS_PER_MESSAGE = 1
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """获取tiktoken编码器，不可用时返回None"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+@dataclass(slots=True, frozen=True)
 class ContextConfig:
     """上下文配置"""
     max_messages: int = 20
@@ -29,6 +46,10 @@ class MemoryContextStore:
         """获取上下文"""
         return self._contexts.get(conversation_id, [])
     
+    def get_sync(self, conversation_id: str) -> List[Message]:
+        """同步获取上下文（纯内存访问，无需事件循环）"""
+        return self._contexts.get(conversation_id, [])
+    
     async def set(self, conversation_id: str, messages: List[Message]) -> None:
         """设置上下文"""
         self._contexts[conversation_id] = messages
@@ -39,11 +60,19 @@ class MemoryContextStore:
             self._contexts[conversation_id] = []
         self._contexts[conversation_id].append(message)
     
+    async def extend(self, conversation_id: str, messages: List[Message]) -> None:
+        """批量添加消息"""
+        self._contexts.setdefault(conversation_id, []).extend(messages)
+    
     async def clear(self, conversation_id: str) -> None:
         """清空上下文"""
         if conversation_id in self._contexts:
             del self._contexts[conversation_id]
     
+    async def clear_all(self) -> None:
+        """清空所有对话的上下文"""
+        self._contexts.clear()
+    
     async def exists(self, conversation_id: str) -> bool:
         """检查上下文是否存在"""
         return conversation_id in self._contexts
@@ -54,6 +83,9 @@ class ContextManager(IContextManager):
     
     def __init__(self, config: Optional[ContextConfig] = None):
         self.config = config or ContextConfig()
+        # 配置不可变，缓存阈值避免热路径上重复属性查找
+        self._max_messages = self.config.max_messages
+        self._max_tokens = self.config.max_tokens
         self._store = MemoryContextStore()
         self._token_counter: Optional[ILLMProvider] = None
     
@@ -65,28 +97,67 @@ class ContextManager(IContextManager):
     
     async def add_message(self, conversation_id: str, role: str, content: str) -> None:
         """添加消息到上下文"""
-        message_role = MessageRole(role) if isinstance(role, str) else role
+        message_role = ROLE_MAP[role] if isinstance(role, str) else role
         
-        message = Message(
-            role=message_role,
-            content=content,
-            timestamp=datetime.utcnow(),
-        )
+        message = Message(role=message_role, content=content)
         
         await self._store.add(conversation_id, message)
+        await self._enforce_max_messages(conversation_id)
+    
+    async def add_messages(self, conversation_id: str, messages: List[Message]) -> None:
+        """批量添加消息到上下文，只写入一次并只检查一次截断"""
+        if not messages:
+            return
         
-        # 检查是否需要截断
+        await self._store.extend(conversation_id, messages)
+        await self._enforce_max_messages(conversation_id)
+    
+    async def append_and_truncate(
+        self,
+        conversation_id: str,
+        message: Message,
+        max_tokens: Optional[int] = None,
+    ) -> List[Message]:
+        """追加消息并按Token与消息数上限截断，返回截断后的消息列表
+        
+        每条消息的Token数只计算一次并缓存在 Message._tokens 上，
+        每轮只需对新消息编码。
+        """
+        max_tokens = max_tokens or self._max_tokens
+        messages = list(await self._store.get(conversation_id))
+        messages.append(message)
+        total = self.calculate_tokens(messages)
+        
+        # 跳过开头的系统提示，从最早的对话消息开始丢弃；新消息始终保留
+        start = 0
+        if self.config.preserve_system_prompt:
+            while start < len(messages) - 1 and messages[start].role == MessageRole.SYSTEM:
+                start += 1
+        end = start
+        while end < len(messages) - 1 and (
+            total > max_tokens or len(messages) - (end - start) > self._max_messages
+        ):
+            total -= messages[end]._tokens + _TOKENS_PER_MESSAGE
+            end += 1
+        if end > start:
+            del messages[start:end]
+        
+        await self._store.set(conversation_id, messages)
+        return messages
+    
+    async def _enforce_max_messages(self, conversation_id: str) -> None:
+        """消息数超过上限时截断上下文"""
         messages = await self._store.get(conversation_id)
-        if len(messages) > self.config.max_messages:
+        if len(messages) > self._max_messages:
             # 保留系统提示（如果配置）
             if self.config.preserve_system_prompt:
                 system_messages = [m for m in messages if m.role == MessageRole.SYSTEM]
                 other_messages = [m for m in messages if m.role != MessageRole.SYSTEM]
                 # 保留最近的 max_messages - len(system_messages) 条
-                other_messages = other_messages[-(self.config.max_messages - len(system_messages)):]
+                other_messages = other_messages[-(self._max_messages - len(system_messages)):]
                 messages = system_messages + other_messages
             else:
-                messages = messages[-self.config.max_messages:]
+                messages = messages[-self._max_messages:]
             
             await self._store.set(conversation_id, messages)
     
@@ -98,6 +169,10 @@ class ContextManager(IContextManager):
         """清空上下文"""
         await self._store.clear(conversation_id)
     
+    async def clear_all(self) -> None:
+        """清空所有对话的上下文"""
+        await self._store.clear_all()
+    
     async def summarize(self, conversation_id: str, max_tokens: int = 1000) -> str:
         """总结上下文"""
         messages = await self._store.get(conversation_id)
@@ -142,14 +217,25 @@ Conversation:
             return f"Conversation with {len(messages)} messages. (Summary unavailable: {str(e)})"
     
     def calculate_tokens(self, messages: List[Message]) -> int:
-        """计算Token数"""
+        """计算Token数，逐条消息的结果缓存在 Message._tokens 上，只对新消息批量编码"""
+        pending = [m for m in messages if m._tokens is None]
+        if pending:
+            texts = [_ROLE_PREFIX[m.role] + m.content for m in pending]
+            for message, count in zip(pending, self._count_texts(texts)):
+                message._tokens = count
+        return sum(m._tokens for m in messages) + _TOKENS_PER_MESSAGE * len(messages)
+    
+    def _count_texts(self, texts: List[str]) -> List[int]:
+        """批量计算文本Token数，优先使用tiktoken的encode_batch"""
+        encoding = _get_encoding()
+        if encoding is not None:
+            return [len(tokens) for tokens in encoding.encode_batch(texts)]
         try:
             llm = self._get_token_counter()
-            text = "\n".join([f"{m.role.value}: {m.content}" for m in messages])
-            return llm.count_tokens(text)
+            return [llm.count_tokens(text) for text in texts]
         except Exception:
             # 估算
-            return sum(len(m.content) for m in messages) // 4
+            return [len(text) // 4 for text in texts]
     
     def truncate_context(self, messages: List[Message], max_tokens: int) -> List[Message]:
         """截断过长的上下文"""
@@ -193,9 +279,9 @@ Conversation:
             "conversation_id": conversation_id,
             "message_count": len(messages),
             "token_count": token_count,
-            "is_truncated": len(messages) >= self.config.max_messages or token_count >= self.config.max_tokens,
-            "oldest_message": messages[0].timestamp.isoformat() if messages else None,
-            "latest_message": messages[-1].timestamp.isoformat() if messages else None,
+            "is_truncated": len(messages) >= self._max_messages or token_count >= self._max_tokens,
+            "oldest_message": messages[0].created_at.isoformat() if messages else None,
+            "latest_message": messages[-1].created_at.isoformat() if messages else None,
         }
 
     async def get_context_info(self, conversation_id: str) -> Dict[str, Any]:
@@ -204,18 +290,8 @@ Conversation:
         return self._build_context_info(conversation_id, messages)
 
     def get_context_info_sync(self, conversation_id: str) -> Dict[str, Any]:
-        """同步获取上下文信息，仅用于非异步调用场景"""
-        import asyncio
-
-        try:
-            asyncio.get_running_loop()
-            raise RuntimeError(
-                "Event loop is already running. Use `await get_context_info(...)` in async context."
-            )
-        except RuntimeError as error:
-            if "already running" in str(error):
-                raise
-            return asyncio.run(self.get_context_info(conversation_id))
+        """同步获取上下文信息，直接读取内存存储，不创建事件循环"""
+        return self._build_context_info(conversation_id, self._store.get_sync(conversation_id))
     
     async def copy_context(self, source_id: str, target_id: str) -> None:
         """复制上下文"""
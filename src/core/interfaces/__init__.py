@@ -5,7 +5,8 @@ from abc import ABC, abstractmethod
 from typing import AsyncIterator, Dict, Any, List, Optional
 from dataclasses import dataclass, field
 from enum import Enum
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
 
 class MessageRole(str, Enum):
@@ -16,7 +17,14 @@ class MessageRole(str, Enum):
     TOOL = "tool"
 
 
-@dataclass
+# 角色值到枚举的全局映射，避免 MessageRole(value) 的 EnumMeta 调用开销
+ROLE_MAP: Dict[str, MessageRole] = {role.value: role for role in MessageRole}
+
+# 角色到字符串值的映射，枚举和字符串角色都能直接查到，避免逐条访问 .value
+ROLE_VALUES: Dict[str, str] = {role: role.value for role in MessageRole}
+
+
+@dataclass(slots=True)
 class Message:
     """消息类"""
     role: MessageRole
@@ -24,10 +32,17 @@ class Message:
     name: Optional[str] = None
     tool_calls: Optional[List[Dict]] = None
     tool_call_id: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    timestamp: int = field(default_factory=time.time_ns)  # Unix纪元纳秒
+    # Token数缓存，由上下文管理器首次计算后回写；消息内容视为不可变
+    _tokens: Optional[int] = field(default=None, init=False, repr=False, compare=False)
 
+    @property
+    def created_at(self) -> datetime:
+        """消息创建时间（UTC）"""
+        return datetime.fromtimestamp(self.timestamp / 1e9, tz=timezone.utc)
 
-@dataclass
+
+@dataclass(slots=True)
 class AIRequest:
     """AI请求基类"""
     model: str
@@ -38,17 +53,26 @@ class AIRequest:
     json_mode: bool = False
     tools: Optional[List[Dict[str, Any]]] = None
     extra_params: Optional[Dict[str, Any]] = None
+    # 预处理后的供应商参数，构造时生成一次，供应商直接展开使用
+    _provider_kwargs: Dict[str, Any] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        self._provider_kwargs = {
+            k: v for k, v in (self.extra_params or {}).items() if v is not None
+        }
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UsageInfo:
     """Token使用信息"""
     prompt_tokens: int = 0
     completion_tokens: int = 0
     total_tokens: int = 0
+    cached_tokens: int = 0  # 命中提示缓存的输入Token
+    reasoning_tokens: int = 0  # 推理模型的思考Token
 
 
-@dataclass
+@dataclass(slots=True)
 class AIResponse:
     """AI响应基类"""
     content: str
@@ -59,6 +83,14 @@ class AIResponse:
     reasoning_content: Optional[str] = None  # 思考模型返回的推理过程
 
 
+@dataclass(slots=True)
+class StreamChunk:
+    """流式输出数据块，最后一块携带供应商返回的真实用量"""
+    text: str
+    usage: Optional[UsageInfo] = None
+    finish_reason: Optional[str] = None
+
+
 class ICoreAI(ABC):
     """核心AI接口 - 所有AI功能的基础接口"""
 
@@ -97,7 +129,7 @@ class ILLMProvider(ABC):
         pass
 
     @abstractmethod
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """流式生成"""
         pass
 
@@ -169,6 +201,21 @@ class IMemoryProvider(ABC):
         """检查记忆是否存在"""
         pass
 
+    @abstractmethod
+    async def store_many(self, items: Dict[str, Any], metadata: Optional[Dict] = None) -> bool:
+        """批量存储记忆，items为键到内容的映射，metadata为共享元数据"""
+        pass
+
+    @abstractmethod
+    async def retrieve_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """批量检索记忆，结果与keys顺序一致，不存在的位置为None"""
+        pass
+
+    @abstractmethod
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """批量检查记忆是否存在，结果与keys顺序一致"""
+        pass
+
 
 class IContextManager(ABC):
     """上下文管理接口 - 管理对话上下文和Token"""
@@ -178,6 +225,11 @@ class IContextManager(ABC):
         """添加消息到上下文"""
         pass
 
+    @abstractmethod
+    async def add_messages(self, conversation_id: str, messages: List[Message]) -> None:
+        """批量添加消息到上下文"""
+        pass
+
     @abstractmethod
     async def get_messages(self, conversation_id: str) -> List[Message]:
         """获取对话消息历史"""
@@ -203,6 +255,12 @@ class IContextManager(ABC):
         """截断过长的上下文"""
         pass
 
+    @abstractmethod
+    async def append_and_truncate(self, conversation_id: str, message: Message,
+                                  max_tokens: Optional[int] = None) -> List[Message]:
+        """追加消息并截断上下文，返回截断后的消息列表"""
+        pass
+
 
 class IToolManager(ABC):
     """工具管理接口 - 管理工具注册和执行"""
@@ -317,7 +375,7 @@ class ILoggingService(ABC):
 
 
 class ITokenCounter(ABC):
-    """Token计数接口"""
+    """Token计数接口（实现类应继承 CachedTokenCounter 以复用计数缓存）"""
 
     @abstractmethod
     def count(self, text: str) -> int:
@@ -27,7 +27,8 @@ from abc import ABC, abstractmethod
 from typing import AsyncIterator, Dict, Any, List, Optional
 from dataclasses import dataclass, field
 from enum import Enum
-from datetime import datetime
+import time
+from datetime import datetime, timezone
 
 
 class MessageRole(str, Enum):
@@ -46,7 +47,14 @@ class MessageRole(str, Enum):
     TOOL = "tool"
 
 
-@dataclass
+# 角色值到枚举的全局映射，避免 MessageRole(value) 的 EnumMeta 调用开销
+ROLE_MAP: Dict[str, MessageRole] = {role.value: role for role in MessageRole}
+
+# 角色到字符串值的映射，枚举和字符串角色都能直接查到，避免逐条访问 .value
+ROLE_VALUES: Dict[str, str] = {role: role.value for role in MessageRole}
+
+
+@dataclass(slots=True)
 class Message:
     """
     消息数据类
@@ -57,17 +65,24 @@ class Message:
         name: 可选，发送者名称
         tool_calls: 可选，工具调用列表
         tool_call_id: 可选，工具调用ID
-        timestamp: 消息创建时间戳
+        timestamp: 消息创建时间戳（Unix纪元纳秒）
     """
     role: MessageRole
     content: str
     name: Optional[str] = None
     tool_calls: Optional[List[Dict]] = None
     tool_call_id: Optional[str] = None
-    timestamp: datetime = field(default_factory=datetime.utcnow)
+    timestamp: int = field(default_factory=time.time_ns)  # Unix纪元纳秒
+    # Token数缓存，由上下文管理器首次计算后回写；消息内容视为不可变
+    _tokens: Optional[int] = field(default=None, init=False, repr=False, compare=False)
+
+    @property
+    def created_at(self) -> datetime:
+        """消息创建时间（UTC）"""
+        return datetime.fromtimestamp(self.timestamp / 1e9, tz=timezone.utc)
 
 
-@dataclass
+@dataclass(slots=True)
 class AIRequest:
     """
     AI请求数据类
@@ -82,7 +97,7 @@ class AIRequest:
         stream: 是否使用流式输出
         json_mode: 是否强制JSON格式输出
         tools: 可选，工具定义列表
-        extra_params: 可选，额外参数字典
+        extra_params: 可选，额外参数字典，构造时预处理并透传给供应商SDK
     """
     model: str
     messages: List[Message]
@@ -92,9 +107,16 @@ class AIRequest:
     json_mode: bool = False
     tools: Optional[List[Dict[str, Any]]] = None
     extra_params: Optional[Dict[str, Any]] = None
+    # 预处理后的供应商参数，构造时生成一次，供应商直接展开使用
+    _provider_kwargs: Dict[str, Any] = field(init=False, repr=False, compare=False)
 
+    def __post_init__(self):
+        self._provider_kwargs = {
+            k: v for k, v in (self.extra_params or {}).items() if v is not None
+        }
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class UsageInfo:
     """
     Token使用统计信息
@@ -103,13 +125,17 @@ class UsageInfo:
         prompt_tokens: 输入Token数
         completion_tokens: 输出Token数
         total_tokens: 总Token数
+        cached_tokens: 命中供应商提示缓存的输入Token数
+        reasoning_tokens: 推理模型消耗的思考Token数
     """
     prompt_tokens: int = 0
     completion_tokens: int = 0
     total_tokens: int = 0
+    cached_tokens: int = 0
+    reasoning_tokens: int = 0
 
 
-@dataclass
+@dataclass(slots=True)
 class AIResponse:
     """
     AI响应数据类
@@ -128,6 +154,21 @@ class AIResponse:
     tool_calls: Optional[List[Dict[str, Any]]] = None
 
 
+@dataclass(slots=True)
+class StreamChunk:
+    """
+    流式输出数据块
+    
+    Attributes:
+        text: 本块增量文本
+        usage: 可选，供应商在流结束时返回的真实Token统计
+        finish_reason: 可选，结束原因，仅在最后一块中出现
+    """
+    text: str
+    usage: Optional[UsageInfo] = None
+    finish_reason: Optional[str] = None
+
+
 class ICoreAI(ABC):
     """
     核心AI接口 - 所有AI功能的基础接口
@@ -261,7 +302,7 @@ class ILLMProvider(ABC):
         pass
 
     @abstractmethod
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """
         流式生成
         
@@ -269,7 +310,8 @@ class ILLMProvider(ABC):
             request: AI请求对象
             
         Returns:
-            异步生成器，逐块返回内容
+            异步生成器，逐块返回StreamChunk；
+            供应商提供真实用量时，最后一块携带usage与finish_reason
         """
         pass
 
@@ -424,6 +466,49 @@ class IMemoryProvider(ABC):
         """检查记忆是否存在"""
         pass
 
+    @abstractmethod
+    async def store_many(self, items: Dict[str, Any],
+                         metadata: Optional[Dict] = None) -> bool:
+        """
+        批量存储记忆
+        
+        支持流水线的后端（Redis、MongoDB）应在一次往返内完成写入。
+        
+        Args:
+            items: 记忆标识符到内容的映射
+            metadata: 可选，所有记忆共享的元数据字典
+            
+        Returns:
+            bool: 是否存储成功
+        """
+        pass
+
+    @abstractmethod
+    async def retrieve_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """
+        批量检索记忆
+        
+        Args:
+            keys: 记忆标识符列表
+            
+        Returns:
+            List: 与keys顺序一致的内容列表，不存在的位置为None
+        """
+        pass
+
+    @abstractmethod
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """
+        批量检查记忆是否存在
+        
+        Args:
+            keys: 记忆标识符列表
+            
+        Returns:
+            List[bool]: 与keys顺序一致的存在性列表
+        """
+        pass
+
 
 class IContextManager(ABC):
     """
@@ -448,6 +533,19 @@ class IContextManager(ABC):
         """
         pass
 
+    @abstractmethod
+    async def add_messages(self, conversation_id: str, messages: List[Message]) -> None:
+        """
+        批量添加消息到上下文
+        
+        一次写入多条消息，减少存储后端的往返次数。
+        
+        Args:
+            conversation_id: 对话ID
+            messages: 消息列表
+        """
+        pass
+
     @abstractmethod
     async def get_messages(self, conversation_id: str) -> List[Message]:
         """
@@ -511,6 +609,25 @@ class IContextManager(ABC):
         """
         pass
 
+    @abstractmethod
+    async def append_and_truncate(self, conversation_id: str, message: Message,
+                                  max_tokens: Optional[int] = None) -> List[Message]:
+        """
+        追加消息并截断上下文
+        
+        将追加、Token计数与截断合并为一次操作，
+        逐条消息的Token数缓存后增量维护总数。
+        
+        Args:
+            conversation_id: 对话ID
+            message: 新消息
+            max_tokens: 可选，最大Token数，默认使用配置值
+            
+        Returns:
+            List[Message]: 截断后的消息列表
+        """
+        pass
+
 
 class IToolManager(ABC):
     """
@@ -778,6 +895,10 @@ class ITokenCounter(ABC):
     1. 计算文本Token数
     2. 估算API调用成本
     3. 支持批量计数
+    
+    Note:
+        实现类应继承 `src.services.token_service.CachedTokenCounter`，
+        按文本哈希缓存计数结果，避免对固定前缀重复分词。
     """
     
     @abstractmethod
@@ -1,30 +1,115 @@
 # gRPC服务实现
 
 import asyncio
-from concurrent import futures
-from typing import Iterator, Dict, Any
+from typing import AsyncIterator, Dict, Any, Optional, Tuple
 import json
 import logging
 
 import grpc
 
+try:
+    import orjson as _json
+except ImportError:
+    _json = json
+
 from src.config.manager import get_config
+from src.core.interfaces import (
+    AIRequest,
+    AIResponse,
+    ILoggingService,
+    Message,
+    MessageRole,
+    UsageInfo,
+)
 from src.providers.llm.factory import get_llm_provider
 from src.agents import ReActAgent, ConversationalAgent, AgentConfig, AgentType
 from src.context.manager import ContextManager
-from src.tools.tool_manager import ToolManager
+from src.tools.tool_manager import ToolExecutionError, ToolManager
+
+try:
+    from src.grpc_service import ai_core_pb2
+except ImportError:  # 需先通过 grpc_tools.protoc 生成
+    ai_core_pb2 = None
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# proto MessageRole 枚举值到 MessageRole 的映射，按枚举值下标索引
+_ROLE_BY_INT = (
+    MessageRole.USER,
+    MessageRole.SYSTEM,
+    MessageRole.ASSISTANT,
+    MessageRole.TOOL,
+)
+
+# proto 中 extra_params 为 map<string,string>：只接受白名单内的参数，并转换为SDK需要的类型
+_EXTRA_PARAM_TYPES = {
+    "top_p": float,
+    "top_k": int,
+    "presence_penalty": float,
+    "frequency_penalty": float,
+    "seed": int,
+    "user": str,
+}
+
+
+class InvalidArgumentError(ValueError):
+    """请求参数不合法，以 INVALID_ARGUMENT 状态码返回给客户端"""
+
+
+def _parse_extra_params(raw) -> Optional[Dict[str, Any]]:
+    """
+    校验并转换 extra_params
+    
+    Raises:
+        InvalidArgumentError: 参数名不在白名单内或值无法转换
+    """
+    params = {}
+    for key, value in raw.items():
+        cast = _EXTRA_PARAM_TYPES.get(key)
+        if cast is None:
+            raise InvalidArgumentError(f"Unsupported extra param: '{key}'")
+        try:
+            params[key] = cast(value)
+        except ValueError:
+            raise InvalidArgumentError(
+                f"Invalid value for extra param '{key}': {value!r}"
+            ) from None
+    return params or None
+
+
+# 进程级共享实例，避免每个Servicer重复构建工具注册表与上下文存储；
+# 首次使用时创建，导入模块不产生副作用
+_shared_managers: Optional[Tuple[ToolManager, ContextManager]] = None
+
+
+def _get_shared_managers() -> Tuple[ToolManager, ContextManager]:
+    """获取共享的工具管理器与上下文管理器"""
+    global _shared_managers
+    if _shared_managers is None:
+        _shared_managers = (ToolManager(), ContextManager())
+    return _shared_managers
+
 
 class AICoreServicer:
     """AI Core gRPC服务实现"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        logging_service: Optional[ILoggingService] = None,
+        tool_manager: Optional[ToolManager] = None,
+        context_manager: Optional[ContextManager] = None,
+    ):
         self.llm_provider = None
-        self.context_manager = ContextManager()
-        self.tool_manager = ToolManager()
+        if tool_manager is None or context_manager is None:
+            shared_tools, shared_context = _get_shared_managers()
+            if tool_manager is None:
+                tool_manager = shared_tools
+            if context_manager is None:
+                context_manager = shared_context
+        self.context_manager = context_manager
+        self.tool_manager = tool_manager
+        self.logging_service = logging_service
         self._initialize()
     
     def _initialize(self):
@@ -35,26 +120,74 @@ class AICoreServicer:
         except Exception as e:
             logger.warning(f"Failed to initialize LLM provider: {e}")
     
-    async def _convert_messages(self, messages: list) -> list:
-        """转换消息格式"""
-        from src.core.interfaces import Message, MessageRole
+    def _get_llm_provider(self):
+        """获取LLM供应商，初始化失败时重试并抛出真实错误"""
+        if self.llm_provider is None:
+            self.llm_provider = get_llm_provider("openai")
+        return self.llm_provider
+    
+    def _convert_messages(self, messages: list) -> list:
+        """
+        转换消息格式，角色已由proto枚举解码为整数，直接按下标映射
         
+        Raises:
+            InvalidArgumentError: 未知的角色枚举值（proto3 允许在线路上出现）
+        """
         converted = []
         for msg in messages:
-            role = msg.get("role", "user")
+            if not 0 <= msg.role < len(_ROLE_BY_INT):
+                raise InvalidArgumentError(f"Unknown message role: {msg.role}")
             converted.append(Message(
-                role=MessageRole(role),
-                content=msg.get("content", ""),
-                name=msg.get("name"),
+                role=_ROLE_BY_INT[msg.role],
+                content=msg.content,
+                name=msg.name or None,
             ))
         return converted
     
+    @staticmethod
+    async def _abort(context, method: str, error: Exception) -> None:
+        """以gRPC状态码终止调用，客户端直接收到错误而非空响应"""
+        if isinstance(error, InvalidArgumentError):
+            logger.warning(f"{method} invalid argument: {error}")
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(error))
+        if isinstance(error, asyncio.TimeoutError):
+            logger.warning(f"{method} timed out: {error}")
+            await context.abort(grpc.StatusCode.DEADLINE_EXCEEDED, str(error) or "timed out")
+        logger.exception(f"{method} error: {error}")
+        await context.abort(grpc.StatusCode.INTERNAL, str(error))
+    
+    @staticmethod
+    def _to_proto_usage(usage) -> "ai_core_pb2.Usage":
+        """将UsageInfo直接构造为protobuf消息"""
+        return ai_core_pb2.Usage(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens,
+            cached_tokens=usage.cached_tokens,
+            reasoning_tokens=usage.reasoning_tokens,
+        )
+    
+    @staticmethod
+    def _to_proto_tool_calls(tool_calls) -> list:
+        """将工具调用直接构造为protobuf消息"""
+        result = []
+        for tc in tool_calls or ():
+            function = tc.get("function") or {}
+            arguments = function.get("arguments", "")
+            result.append(ai_core_pb2.ToolCall(
+                id=tc.get("id", ""),
+                type=tc.get("type", "function"),
+                function=ai_core_pb2.FunctionCall(
+                    name=function.get("name", ""),
+                    arguments=arguments if isinstance(arguments, str) else json.dumps(arguments),
+                ),
+            ))
+        return result
+    
     async def SingleCall(self, request, context):
         """单次调用"""
         try:
-            messages = await self._convert_messages(request.messages)
-            
-            from src.core.interfaces import AIRequest, Message
+            messages = self._convert_messages(request.messages)
             
             ai_request = AIRequest(
                 model=request.model,
@@ -62,47 +195,33 @@ class AICoreServicer:
                 temperature=request.temperature,
                 max_tokens=request.max_tokens if request.max_tokens > 0 else None,
                 json_mode=request.json_mode,
+                extra_params=_parse_extra_params(request.extra_params),
             )
             
-            response = await self.llm_provider.generate(ai_request)
+            response = await self._get_llm_provider().generate(ai_request)
             
-            return {
-                "content": response.content,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens,
-                },
-                "model": response.model,
-                "finish_reason": response.finish_reason,
-                "tool_calls": response.tool_calls or [],
-            }
+            return ai_core_pb2.SingleCallResponse(
+                content=response.content,
+                usage=self._to_proto_usage(response.usage),
+                model=response.model,
+                finish_reason=response.finish_reason,
+                tool_calls=self._to_proto_tool_calls(response.tool_calls),
+            )
         except Exception as e:
-            logger.error(f"SingleCall error: {e}")
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(str(e))
-            return {}
+            await self._abort(context, "SingleCall", e)
     
     async def Chat(self, request, context):
         """Chat对话"""
         try:
-            messages = await self._convert_messages(request.messages)
+            messages = self._convert_messages(request.messages)
             
             conversation_id = request.conversation_id or "default"
             
-            # 添加用户消息
+            # 获取历史，并在本地拼接用户消息（不写回存储）
             user_msg = messages[-1] if messages else None
+            history = list(await self.context_manager.get_messages(conversation_id))
             if user_msg:
-                await self.context_manager.add_message(
-                    conversation_id, 
-                    user_msg.role.value, 
-                    user_msg.content
-                )
-            
-            # 获取历史
-            history = await self.context_manager.get_messages(conversation_id)
-            
-            from src.core.interfaces import AIRequest, Message
+                history.append(user_msg)
             
             ai_request = AIRequest(
                 model=request.model,
@@ -111,37 +230,28 @@ class AICoreServicer:
                 max_tokens=request.max_tokens if request.max_tokens > 0 else None,
             )
             
-            response = await self.llm_provider.generate(ai_request)
+            response = await self._get_llm_provider().generate(ai_request)
             
-            # 添加助手回复
-            await self.context_manager.add_message(
-                conversation_id, 
-                "assistant", 
-                response.content
+            # 用户消息与助手回复一次性批量写入
+            assistant_msg = Message(role=MessageRole.ASSISTANT, content=response.content)
+            await self.context_manager.add_messages(
+                conversation_id,
+                [user_msg, assistant_msg] if user_msg else [assistant_msg],
             )
             
-            return {
-                "content": response.content,
-                "usage": {
-                    "prompt_tokens": response.usage.prompt_tokens,
-                    "completion_tokens": response.usage.completion_tokens,
-                    "total_tokens": response.usage.total_tokens,
-                },
-                "conversation_id": conversation_id,
-                "tool_calls": response.tool_calls or [],
-            }
+            return ai_core_pb2.ChatResponse(
+                content=response.content,
+                usage=self._to_proto_usage(response.usage),
+                conversation_id=conversation_id,
+                tool_calls=self._to_proto_tool_calls(response.tool_calls),
+            )
         except Exception as e:
-            logger.error(f"Chat error: {e}")
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(str(e))
-            return {}
+            await self._abort(context, "Chat", e)
     
-    def StreamCall(self, request, context) -> Iterator[Dict]:
+    async def StreamCall(self, request, context) -> AsyncIterator["ai_core_pb2.StreamResponse"]:
         """流式回复"""
         try:
-            from src.core.interfaces import AIRequest, Message, MessageRole
-            
-            messages = asyncio.run(self._convert_messages(request.messages))
+            messages = self._convert_messages(request.messages)
             
             ai_request = AIRequest(
                 model=request.model,
@@ -151,38 +261,38 @@ class AICoreServicer:
                 stream=True,
             )
             
-            loop = asyncio.new_event_loop()
-            try:
-                async def generate():
-                    chunk_count = 0
-                    async for chunk in self.llm_provider.stream_generate(ai_request):
-                        chunk_count += 1
-                        yield {
-                            "chunk": chunk,
-                            "is_final": False,
-                            "usage": {},
-                        }
-                    
-                    # 最终响应
-                    yield {
-                        "chunk": "",
-                        "is_final": True,
-                        "usage": {
-                            "prompt_tokens": 0,
-                            "completion_tokens": chunk_count * 10,  # 估算
-                            "total_tokens": chunk_count * 10,
-                        },
-                    }
-                
-                return generate()
-            finally:
-                loop.close()
+            # 直接在 grpc.aio 的事件循环上驱动流式生成
+            usage = None
+            finish_reason = None
+            # 仅在挂载日志服务时拼接完整回复，UTF-8字节缓冲结束时一次解码
+            buffer = bytearray() if self.logging_service is not None else None
+            async for chunk in self._get_llm_provider().stream_generate(ai_request):
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.finish_reason is not None:
+                    finish_reason = chunk.finish_reason
+                if chunk.text:
+                    if buffer is not None:
+                        buffer += chunk.text.encode("utf-8")
+                    yield ai_core_pb2.StreamResponse(chunk=chunk.text, is_final=False)
+            
+            # 最终响应：透传供应商在流结束时返回的真实用量
+            yield ai_core_pb2.StreamResponse(
+                chunk="",
+                is_final=True,
+                usage=self._to_proto_usage(usage) if usage is not None else None,
+            )
+            
+            if buffer is not None:
+                await self.logging_service.log_call(ai_request, AIResponse(
+                    content=buffer.decode("utf-8"),
+                    usage=usage or UsageInfo(),
+                    model=request.model,
+                    finish_reason=finish_reason or "stop",
+                ))
                 
         except Exception as e:
-            logger.error(f"StreamCall error: {e}")
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(str(e))
-            return iter([])
+            await self._abort(context, "StreamCall", e)
     
     async def ExecuteAgent(self, request, context):
         """Agent执行"""
@@ -196,95 +306,104 @@ class AICoreServicer:
             
             result = await agent.execute(request.task)
             
-            return {
-                "success": result.success,
-                "output": result.output,
-                "steps": [
-                    {
-                        "step": i + 1,
-                        "thought": step.get("thought", ""),
-                        "action": step.get("action"),
-                        "action_input": str(step.get("action_input", "")),
-                        "observation": step.get("observation"),
-                    }
-                    for i, step in enumerate(result.intermediate_steps or [])
-                ],
-                "tokens_used": result.tokens_used,
-                "error": result.error or "",
-            }
+            return ai_core_pb2.AgentResponse(
+                success=result.success,
+                output=result.output,
+                steps=(
+                    ai_core_pb2.IntermediateStep(
+                        step=i + 1,
+                        thought=step.get("thought", ""),
+                        action=step.get("action"),
+                        action_input=str(step.get("action_input", "")),
+                        observation=step.get("observation"),
+                    )
+                    for i, step in enumerate(result.intermediate_steps or ())
+                ),
+                tokens_used=result.tokens_used,
+                error=result.error or "",
+            )
         except Exception as e:
-            logger.error(f"ExecuteAgent error: {e}")
-            context.set_code(grpc.StatusCode.INTERNAL)
-            context.set_details(str(e))
-            return {"success": False, "error": str(e)}
+            await self._abort(context, "ExecuteAgent", e)
     
     async def GenerateImage(self, request, context):
         """图像生成"""
         # TODO: 实现图像生成
-        return {
-            "image_url": "",
-            "image_base64": "",
-            "provider": request.provider,
-        }
+        await context.abort(grpc.StatusCode.UNIMPLEMENTED, "GenerateImage is not implemented")
     
     async def StoreMemory(self, request, context):
         """存储记忆"""
         # TODO: 实现记忆存储
-        return {
-            "success": True,
-            "message": "Memory stored",
-        }
+        await context.abort(grpc.StatusCode.UNIMPLEMENTED, "StoreMemory is not implemented")
     
     async def RetrieveMemory(self, request, context):
         """检索记忆"""
         # TODO: 实现记忆检索
-        return {"results": []}
+        await context.abort(grpc.StatusCode.UNIMPLEMENTED, "RetrieveMemory is not implemented")
     
     async def CallTool(self, request, context):
-        """工具调用"""
+        """工具调用：工具本身执行失败写入响应体，参数不合法或服务端异常以状态码终止"""
         try:
-            params = json.loads(request.parameters) if request.parameters else {}
-            result = await self.tool_manager.execute_tool(request.tool_name, **params)
+            try:
+                params = _json.loads(request.parameters) if request.parameters else {}
+            except ValueError as e:
+                raise InvalidArgumentError(f"Invalid tool parameters: {e}") from None
+            if not isinstance(params, dict):
+                raise InvalidArgumentError("Tool parameters must be a JSON object")
+            
+            try:
+                result = await self.tool_manager.execute_tool(request.tool_name, **params)
+            except ToolExecutionError as e:
+                return ai_core_pb2.ToolCallResponse(success=False, result="", error=str(e))
             
-            return {
-                "success": True,
-                "result": str(result),
-                "error": "",
-            }
+            return ai_core_pb2.ToolCallResponse(success=True, result=str(result), error="")
         except Exception as e:
-            return {
-                "success": False,
-                "result": "",
-                "error": str(e),
-            }
+            await self._abort(context, "CallTool", e)
 
 
 class HealthServicer:
     """健康检查服务"""
     
-    def Check(self, request, context):
+    VERSION = "1.0.0"
+    
+    def __init__(self):
+        self._status = 1  # SERVING
+        self._status_changed = asyncio.Event()
+    
+    def set_status(self, status: int) -> None:
+        """更新服务状态并立即通知所有监控者"""
+        self._status = status
+        # 触发当前事件后换上新事件：各监控者等待自己取到的事件，不会互相清除
+        changed, self._status_changed = self._status_changed, asyncio.Event()
+        changed.set()
+    
+    def _build_response(self) -> "ai_core_pb2.HealthCheckResponse":
+        return ai_core_pb2.HealthCheckResponse(status=self._status, version=self.VERSION)
+    
+    async def Check(self, request, context):
         """检查"""
-        return {
-            "status": 1,  # SERVING
-            "version": "1.0.0",
-        }
+        return self._build_response()
     
-    def Watch(self, request, context):
-        """监控"""
-        while True:
-            yield {
-                "status": 1,
-                "version": "1.0.0",
-            }
-            import time
-            time.sleep(5)
+    async def Watch(self, request, context):
+        """监控：状态变化时立即推送，空闲时每5秒发送一次心跳"""
+        while not context.cancelled():
+            # 先取事件再推送，推送期间发生的状态变化也不会错过
+            changed = self._status_changed
+            yield self._build_response()
+            try:
+                await asyncio.wait_for(changed.wait(), timeout=5)
+            except asyncio.TimeoutError:
+                pass
 
 
-async def serve(port: str = "50051", max_workers: int = 10):
-    """启动gRPC服务器"""
+async def serve(port: str = "50051"):
+    """启动gRPC服务器
+    
+    所有处理器均为协程，直接运行在 grpc.aio 的事件循环上，无需线程池；
+    个别需要卸载的CPU密集操作应在调用处使用 `loop.run_in_executor`。
+    """
     import grpc.aio
     
-    server = grpc.aio.server(futures.ThreadPoolExecutor(max_workers=max_workers))
+    server = grpc.aio.server()
     
     # TODO: 添加服务实现
     
@@ -300,5 +419,8 @@ if __name__ == "__main__":
     import sys
     port = sys.argv[1] if len(sys.argv) > 1 else "50051"
     
-    server = asyncio.run(serve(port))
-    server.wait_for_termination()
+    async def _main():
+        server = await serve(port)
+        await server.wait_for_termination()
+    
+    asyncio.run(_main())
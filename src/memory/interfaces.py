@@ -39,8 +39,23 @@ class IMemoryProvider(ABC):
         """检查记忆是否存在"""
         pass
 
+    @abstractmethod
+    async def store_many(self, items: Dict[str, Any], metadata: Optional[Dict] = None) -> bool:
+        """批量存储记忆，items为键到内容的映射，metadata为共享元数据"""
+        pass
+
+    @abstractmethod
+    async def retrieve_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """批量检索记忆，结果与keys顺序一致，不存在的位置为None"""
+        pass
+
+    @abstractmethod
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """批量检查记忆是否存在，结果与keys顺序一致"""
+        pass
+
 
-@dataclass
+@dataclass(slots=True)
 class Memory:
     """记忆数据类"""
     key: str
@@ -1,5 +1,6 @@
 # 记忆管理服务
 
+import asyncio
 from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
 
@@ -7,11 +8,12 @@ from src.memory.interfaces import IMemoryProvider, Memory, MemoryType
 from src.memory.providers import InMemoryProvider, MongoDBProvider, RedisProvider
 
 
-@dataclass
+@dataclass(slots=True)
 class MemoryConfig:
     """记忆配置"""
     short_term_provider: str = "memory"  # memory, redis
     long_term_provider: str = "mongodb"  # mongodb
+    mongodb_connection_string: str = "mongodb://localhost:27017"
     max_short_term_memories: int = 100
     max_conversation_history: int = 20
 
@@ -31,7 +33,9 @@ class MemoryManager:
             if self.config.short_term_provider == "redis":
                 self._short_term = RedisProvider()
             else:
-                self._short_term = InMemoryProvider()
+                self._short_term = InMemoryProvider(
+                    max_memories=self.config.max_short_term_memories,
+                )
         return self._short_term
     
     @property
@@ -39,8 +43,7 @@ class MemoryManager:
         """获取长期记忆"""
         if self._long_term is None:
             if self.config.long_term_provider == "mongodb":
-                # 需要配置连接字符串
-                self._long_term = MongoDBProvider("mongodb://localhost:27017")
+                self._long_term = MongoDBProvider(self.config.mongodb_connection_string)
             else:
                 self._long_term = InMemoryProvider()
         return self._long_term
@@ -56,8 +59,10 @@ class MemoryManager:
         key = f"conv:{conversation_id}:{role}:{datetime.utcnow().timestamp()}"
         
         provider = self.short_term if memory_type == "short_term" else self.long_term
+        # 支持缓冲写入的后端（MongoDB）合并逐轮写入，减少往返
+        store = getattr(provider, "store_buffered", provider.store)
         
-        return await provider.store(
+        return await store(
             key=key,
             content=content,
             metadata={
@@ -73,6 +78,11 @@ class MemoryManager:
         limit: int = 20
     ) -> List[Dict[str, Any]]:
         """获取对话历史"""
+        # 支持按会话查询的后端（MongoDB）直接走索引排序，无需拉回全部结果
+        get_conversation = getattr(self.short_term, "get_conversation", None)
+        if get_conversation is not None:
+            return await get_conversation(conversation_id, limit)
+        
         memories = await self.short_term.search(
             query=conversation_id,
             top_k=limit
@@ -101,12 +111,18 @@ class MemoryManager:
     
     async def retrieve_memory(self, key: str) -> Optional[Memory]:
         """检索记忆"""
-        # 先查短期，再查长期
-        memory = await self.short_term.retrieve(key)
+        # 短期与长期并发查询，短期优先；短期命中时取消长期查询
+        long_term_task = asyncio.ensure_future(self.long_term.retrieve(key))
+        try:
+            memory = await self.short_term.retrieve(key)
+        except BaseException:
+            long_term_task.cancel()
+            raise
         if memory:
+            long_term_task.cancel()
             return memory
         
-        return await self.long_term.retrieve(key)
+        return await long_term_task
     
     async def search_memories(
         self,
@@ -126,17 +142,27 @@ class MemoryManager:
         return deleted
     
     async def clear_conversation(self, conversation_id: str) -> bool:
-        """清空对话"""
-        await self.short_term.clear(conversation_id)
-        await self.long_term.clear(conversation_id)
+        """清空对话，短期与长期记忆并发清理"""
+        await self._gather_all(
+            self.short_term.clear(conversation_id),
+            self.long_term.clear(conversation_id),
+        )
         return True
     
     async def clear_all(self) -> bool:
-        """清空所有记忆"""
-        await self.short_term.clear()
-        await self.long_term.clear()
+        """清空所有记忆，短期与长期记忆并发清理"""
+        await self._gather_all(self.short_term.clear(), self.long_term.clear())
         return True
     
+    @staticmethod
+    async def _gather_all(*aws) -> List[Any]:
+        """并发执行并等待全部完成，之后再抛出第一个异常"""
+        results = await asyncio.gather(*aws, return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取统计信息"""
         return {
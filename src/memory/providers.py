@@ -1,21 +1,93 @@
 # 记忆模块实现
 
-from typing import Any, Dict, List, Optional
-from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+import asyncio
+import functools
+import heapq
+import inspect
 import json
+import logging
+import string
+
+try:
+    import orjson as _json
+except ImportError:
+    _json = json
 
 from src.memory.interfaces import IMemoryProvider, Memory
 
+logger = logging.getLogger(__name__)
+
+# 分词时将标点替换为空格
+_PUNCTUATION_TABLE = str.maketrans(string.punctuation, " " * len(string.punctuation))
+
+
+def _tokenize(text: str) -> List[str]:
+    """小写并去除标点后按空白切分"""
+    return text.lower().translate(_PUNCTUATION_TABLE).split()
+
+
+@functools.lru_cache(maxsize=256)
+def _query_terms(query: str) -> frozenset:
+    """查询词集合；重试及多个存储对同一查询只分词一次"""
+    return frozenset(_tokenize(query))
+
+
+# 写入时间戳缓存：同一事件循环内1毫秒内的写入复用同一个datetime
+_CLOCK_RESOLUTION = 0.001
+_clock: List[Any] = [None, float("-inf")]  # [datetime, loop.time()]
+
+
+def _utcnow() -> datetime:
+    """当前UTC时间，在事件循环中按毫秒复用缓存值"""
+    try:
+        tick = asyncio.get_running_loop().time()
+    except RuntimeError:
+        return datetime.now(timezone.utc)
+    if tick - _clock[1] >= _CLOCK_RESOLUTION:
+        _clock[0] = datetime.now(timezone.utc)
+        _clock[1] = tick
+    return _clock[0]
+
 
 class InMemoryProvider(IMemoryProvider):
-    """内存记忆存储 - 适用于短期记忆"""
+    """内存记忆存储 - 适用于短期记忆
+    
+    关键词搜索基于倒排索引（词 -> 键集合），查询时只求交各词的倒排表，
+    无需扫描全部记忆。
+    
+    传入 embedder（文本 -> 向量，可为协程函数）后，search 改为向量检索：
+    归一化后的向量按行存放在预分配的 numpy 矩阵中，一次矩阵乘法
+    计算全部余弦相似度。
+    
+    按会话清理通过 conversation_id -> 键集合 的二级索引完成，无需扫描。
+    
+    传入 max_memories 后按LRU淘汰：读写都会刷新键的位置，超出上限时
+    淘汰最久未使用的记忆。
+    """
     
-    def __init__(self):
-        self._storage: Dict[str, Memory] = {}
+    _GROW_ROWS = 1024  # 向量矩阵按块扩容，摊销拷贝开销
+    
+    def __init__(
+        self,
+        embedder: Optional[Callable[[str], Sequence[float]]] = None,
+        max_memories: Optional[int] = None,
+    ):
+        self._storage: OrderedDict[str, Memory] = OrderedDict()
+        self._max_memories = max_memories
+        self._index: Dict[str, set] = {}
+        self._term_counts: Dict[str, Counter] = {}
+        self._by_conv: Dict[str, set] = {}
+        self._embedder = embedder
+        self._keys: List[str] = []
+        self._rows: Dict[str, int] = {}
+        self._matrix = None
     
     async def store(self, key: str, content: Any, metadata: Optional[Dict] = None) -> bool:
         """存储记忆"""
-        now = datetime.utcnow()
+        now = _utcnow()
         
         memory = Memory(
             key=key,
@@ -26,33 +98,187 @@ class InMemoryProvider(IMemoryProvider):
             memory_type="short_term",
         )
         
-        self._storage[key] = memory
+        await self._put(memory)
         return True
     
+    async def _put(self, memory: Memory) -> None:
+        """写入存储并更新倒排索引、会话索引与向量索引"""
+        key = memory.key
+        previous = self._storage.get(key)
+        if previous is not None:
+            self._unindex_text(key)
+            self._unindex_conversation(key, previous)
+        
+        if self._embedder is not None:
+            memory.embedding = await self._embed(memory.content)
+            self._index_embedding(key, memory.embedding)
+        
+        self._storage[key] = memory
+        self._storage.move_to_end(key)
+        self._index_text(key, memory.content)
+        conversation_id = memory.metadata.get("conversation_id")
+        if conversation_id:
+            self._by_conv.setdefault(conversation_id, set()).add(key)
+        
+        if self._max_memories is not None:
+            while len(self._storage) > self._max_memories:
+                self._remove(next(iter(self._storage)))
+    
+    def _remove(self, key: str) -> None:
+        """从存储及全部索引中移除"""
+        memory = self._storage.pop(key)
+        self._unindex_text(key)
+        self._unindex_conversation(key, memory)
+        self._unindex_embedding(key)
+    
+    def _unindex_conversation(self, key: str, memory: Memory) -> None:
+        """从会话索引中移除键，清理空集合"""
+        conversation_id = memory.metadata.get("conversation_id")
+        keys = self._by_conv.get(conversation_id) if conversation_id else None
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_conv[conversation_id]
+    
+    def _index_text(self, key: str, content: str) -> None:
+        """将内容分词写入倒排索引"""
+        term_counts = Counter(_tokenize(content))
+        self._term_counts[key] = term_counts
+        for term in term_counts:
+            self._index.setdefault(term, set()).add(key)
+    
+    def _unindex_text(self, key: str) -> None:
+        """从倒排索引中移除键，清理空的倒排表"""
+        for term in self._term_counts.pop(key, ()):
+            postings = self._index.get(term)
+            if postings is not None:
+                postings.discard(key)
+                if not postings:
+                    del self._index[term]
+    
+    async def _embed(self, text: str) -> List[float]:
+        """调用 embedder，兼容同步与异步实现"""
+        embedding = self._embedder(text)
+        if inspect.isawaitable(embedding):
+            embedding = await embedding
+        return list(embedding)
+    
+    @staticmethod
+    def _normalize(vector: Sequence[float]):
+        """转换为单位向量，点积即余弦相似度"""
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("Please install numpy: pip install numpy")
+        
+        array = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(array)
+        return array / norm if norm else array
+    
+    def _index_embedding(self, key: str, embedding: Sequence[float]) -> None:
+        """写入向量矩阵，已存在的键原地覆盖"""
+        import numpy as np
+        
+        vector = self._normalize(embedding)
+        row = self._rows.get(key)
+        if row is None:
+            row = len(self._keys)
+            if self._matrix is None:
+                self._matrix = np.zeros((self._GROW_ROWS, vector.shape[0]), dtype=np.float32)
+            elif row >= self._matrix.shape[0]:
+                grown = np.zeros(
+                    (self._matrix.shape[0] + self._GROW_ROWS, self._matrix.shape[1]),
+                    dtype=np.float32,
+                )
+                grown[:row] = self._matrix[:row]
+                self._matrix = grown
+            self._keys.append(key)
+            self._rows[key] = row
+        self._matrix[row] = vector
+    
+    def _unindex_embedding(self, key: str) -> None:
+        """从向量矩阵移除，用最后一行填补空位保持紧凑"""
+        row = self._rows.pop(key, None)
+        if row is None:
+            return
+        last = len(self._keys) - 1
+        if row != last:
+            moved = self._keys[last]
+            self._keys[row] = moved
+            self._rows[moved] = row
+            self._matrix[row] = self._matrix[last]
+        self._keys.pop()
+    
+    async def _vector_search(self, query: str, top_k: int) -> List[Dict[str, Any]]:
+        """向量检索：一次矩阵乘法计算相似度，argpartition 选出 top_k"""
+        import numpy as np
+        
+        size = len(self._keys)
+        if size == 0 or top_k <= 0:
+            return []
+        
+        query_vector = self._normalize(await self._embed(query))
+        scores = self._matrix[:size] @ query_vector
+        k = min(top_k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        
+        results = []
+        for row in top:
+            memory = self._storage[self._keys[row]]
+            results.append({
+                "key": memory.key,
+                "content": memory.content,
+                "score": float(scores[row]),
+                "metadata": memory.metadata,
+            })
+        return results
+    
     async def retrieve(self, key: str) -> Optional[Memory]:
         """检索记忆"""
-        return self._storage.get(key)
+        memory = self._storage.get(key)
+        if memory is not None:
+            self._storage.move_to_end(key)
+        return memory
     
     async def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
-        """简单关键词搜索"""
-        results = []
-        query_lower = query.lower()
+        """搜索记忆：配置 embedder 时使用向量检索，否则简单关键词匹配"""
+        if self._embedder is not None:
+            return await self._vector_search(query, top_k)
         
-        for key, memory in self._storage.items():
-            if query_lower in memory.content.lower():
-                results.append({
-                    "key": memory.key,
-                    "content": memory.content,
-                    "score": 1.0,
-                    "metadata": memory.metadata,
-                })
+        terms = _query_terms(query)
+        if not terms or top_k <= 0:
+            return []
         
-        return results[:top_k]
+        # 从最短的倒排表开始求交，尽早缩小候选集
+        postings = sorted((self._index.get(term, set()) for term in terms), key=len)
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates &= posting
+        
+        # 按查询词在内容中的出现次数打分
+        scored = heapq.nlargest(
+            top_k,
+            ((sum(self._term_counts[key][term] for term in terms), key) for key in candidates),
+        )
+        
+        results = []
+        for score, key in scored:
+            memory = self._storage[key]
+            results.append({
+                "key": memory.key,
+                "content": memory.content,
+                "score": float(score),
+                "metadata": memory.metadata,
+            })
+        return results
     
     async def delete(self, key: str) -> bool:
         """删除记忆"""
         if key in self._storage:
-            del self._storage[key]
+            self._remove(key)
             return True
         return False
     
@@ -60,20 +286,50 @@ class InMemoryProvider(IMemoryProvider):
         """清空记忆"""
         if conversation_id:
             # 只删除指定会话的记忆
-            keys_to_delete = [
-                k for k, m in self._storage.items()
-                if m.metadata.get("conversation_id") == conversation_id
-            ]
-            for k in keys_to_delete:
-                del self._storage[k]
+            for k in list(self._by_conv.get(conversation_id, ())):
+                self._remove(k)
         else:
             self._storage.clear()
+            self._index.clear()
+            self._term_counts.clear()
+            self._by_conv.clear()
+            self._keys.clear()
+            self._rows.clear()
+            self._matrix = None
         return True
     
     async def exists(self, key: str) -> bool:
         """检查记忆是否存在"""
         return key in self._storage
     
+    async def store_many(self, items: Dict[str, Any], metadata: Optional[Dict] = None) -> bool:
+        """批量存储记忆"""
+        now = _utcnow()
+        for key, content in items.items():
+            await self._put(Memory(
+                key=key,
+                content=str(content),
+                metadata=dict(metadata or {}),
+                created_at=now,
+                updated_at=now,
+                memory_type="short_term",
+            ))
+        return True
+    
+    async def retrieve_many(self, keys: List[str]) -> List[Optional[Memory]]:
+        """批量检索记忆"""
+        storage = self._storage
+        memories = [storage.get(key) for key in keys]
+        for memory in memories:
+            if memory is not None:
+                storage.move_to_end(memory.key)
+        return memories
+    
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """批量检查记忆是否存在"""
+        storage = self._storage
+        return [key in storage for key in keys]
+    
     def count(self) -> int:
         """获取记忆数量"""
         return len(self._storage)
@@ -83,34 +339,59 @@ class InMemoryProvider(IMemoryProvider):
         return list(self._storage.values())
 
 
+@functools.lru_cache(maxsize=8)
+def _get_motor_client(connection_string: str):
+    """按连接串共享MongoDB客户端及其连接池"""
+    try:
+        from motor.motor_asyncio import AsyncIOMotorClient
+    except ImportError:
+        raise ImportError("Please install motor: pip install motor")
+    return AsyncIOMotorClient(
+        connection_string,
+        maxPoolSize=50,
+        minPoolSize=10,
+        serverSelectionTimeoutMS=2000,
+    )
+
+
 class MongoDBProvider(IMemoryProvider):
     """MongoDB记忆存储 - 适用于长期记忆"""
     
-    def __init__(self, connection_string: str, database: str = "ai_foundation"):
+    def __init__(self, connection_string: str, database: str = "ai_foundation",
+                 batch_size: int = 100, flush_interval: float = 0.05):
         self.connection_string = connection_string
         self.database_name = database
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
         self._client = None
         self._db = None
         self._collection = None
+        # store_buffered 的待写入文档，同一key只保留最新一次
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
     
     async def _get_collection(self):
         """获取MongoDB集合"""
         if self._collection is None:
-            try:
-                from motor.motor_asyncio import AsyncIOMotorClient
-                self._client = AsyncIOMotorClient(self.connection_string)
-                self._db = self._client[self.database_name]
-                self._collection = self._db["memories"]
-            except ImportError:
-                raise ImportError("Please install motor: pip install motor")
+            self._client = _get_motor_client(self.connection_string)
+            self._db = self._client[self.database_name]
+            self._collection = self._db["memories"]
+            # 按key的读写走唯一索引；会话历史按会话过滤、按时间倒序，由复合索引直接支撑
+            await self._collection.create_index("key", unique=True)
+            await self._collection.create_index(
+                [("metadata.conversation_id", 1), ("created_at", -1)]
+            )
         return self._collection
     
-    async def store(self, key: str, content: Any, metadata: Optional[Dict] = None) -> bool:
-        """存储记忆"""
-        collection = await self._get_collection()
-        now = datetime.utcnow()
-        
-        document = {
+    async def _get_flushed_collection(self):
+        """获取集合前先写入缓冲中的文档，保证后续读写能看到之前的写入"""
+        await self.flush()
+        return await self._get_collection()
+    
+    @staticmethod
+    def _build_document(key: str, content: Any, metadata: Optional[Dict], now: datetime) -> Dict[str, Any]:
+        """构建记忆文档"""
+        return {
             "key": key,
             "content": str(content),
             "metadata": metadata or {},
@@ -118,6 +399,57 @@ class MongoDBProvider(IMemoryProvider):
             "updated_at": now,
             "memory_type": "long_term",
         }
+    
+    async def _bulk_upsert(self, documents: List[Dict[str, Any]]) -> None:
+        """一次bulk_write完成所有upsert"""
+        from pymongo import UpdateOne
+        
+        collection = await self._get_collection()
+        await collection.bulk_write(
+            [UpdateOne({"key": doc["key"]}, {"$set": doc}, upsert=True) for doc in documents],
+            ordered=False,
+        )
+    
+    async def store_buffered(self, key: str, content: Any, metadata: Optional[Dict] = None) -> bool:
+        """缓冲写入记忆
+        
+        写入先合并到缓冲区，累计 batch_size 条或经过 flush_interval 秒后
+        通过一次 bulk_write 落盘；任何其他读写操作前也会先落盘。
+        """
+        self._pending[key] = self._build_document(key, content, metadata, _utcnow())
+        if len(self._pending) >= self.batch_size:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later())
+        return True
+    
+    async def _flush_later(self) -> None:
+        """后台定时落盘"""
+        await asyncio.sleep(self.flush_interval)
+        self._flush_task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"MongoDB buffered write failed: {e}")
+    
+    async def flush(self) -> None:
+        """将缓冲中的写入一次性落盘"""
+        if not self._pending:
+            return
+        pending = self._pending
+        self._pending = {}
+        try:
+            await self._bulk_upsert(list(pending.values()))
+        except Exception:
+            # 写入失败时放回缓冲区，等待期间产生的同键新写入优先
+            pending.update(self._pending)
+            self._pending = pending
+            raise
+    
+    async def store(self, key: str, content: Any, metadata: Optional[Dict] = None) -> bool:
+        """存储记忆"""
+        collection = await self._get_flushed_collection()
+        document = self._build_document(key, content, metadata, _utcnow())
         
         await collection.update_one(
             {"key": key},
@@ -128,24 +460,29 @@ class MongoDBProvider(IMemoryProvider):
     
     async def retrieve(self, key: str) -> Optional[Memory]:
         """检索记忆"""
-        collection = await self._get_collection()
+        collection = await self._get_flushed_collection()
         
         doc = await collection.find_one({"key": key})
         
         if doc:
-            return Memory(
-                key=doc["key"],
-                content=doc["content"],
-                metadata=doc.get("metadata", {}),
-                created_at=doc["created_at"],
-                updated_at=doc["updated_at"],
-                memory_type=doc.get("memory_type", "long_term"),
-            )
+            return self._doc_to_memory(doc)
         return None
     
+    @staticmethod
+    def _doc_to_memory(doc: Dict[str, Any]) -> Memory:
+        """将MongoDB文档转换为Memory"""
+        return Memory(
+            key=doc["key"],
+            content=doc["content"],
+            metadata=doc.get("metadata", {}),
+            created_at=doc["created_at"],
+            updated_at=doc["updated_at"],
+            memory_type=doc.get("memory_type", "long_term"),
+        )
+    
     async def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """文本搜索"""
-        collection = await self._get_collection()
+        collection = await self._get_flushed_collection()
         
         cursor = collection.find({
             "$text": {"$search": query}
@@ -162,16 +499,35 @@ class MongoDBProvider(IMemoryProvider):
         
         return results
     
+    async def get_conversation(self, conversation_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取会话记忆，按创建时间倒序，排序与截取都在服务端完成"""
+        collection = await self._get_flushed_collection()
+        
+        cursor = collection.find(
+            {"metadata.conversation_id": conversation_id}
+        ).sort("created_at", -1).limit(limit)
+        
+        results = []
+        async for doc in cursor:
+            results.append({
+                "key": doc["key"],
+                "content": doc["content"],
+                "score": doc.get("score", 0),
+                "metadata": doc.get("metadata", {}),
+            })
+        
+        return results
+    
     async def delete(self, key: str) -> bool:
         """删除记忆"""
-        collection = await self._get_collection()
+        collection = await self._get_flushed_collection()
         
         result = await collection.delete_one({"key": key})
         return result.deleted_count > 0
     
     async def clear(self, conversation_id: Optional[str] = None) -> bool:
         """清空记忆"""
-        collection = await self._get_collection()
+        collection = await self._get_flushed_collection()
         
         if conversation_id:
             await collection.delete_many({"metadata.conversation_id": conversation_id})
@@ -180,25 +536,79 @@ class MongoDBProvider(IMemoryProvider):
         return True
     
     async def exists(self, key: str) -> bool:
-        """检查记忆是否存在"""
-        collection = await self._get_collection()
+        """检查记忆是否存在，只取回_id"""
+        collection = await self._get_flushed_collection()
         
-        doc = await collection.find_one({"key": key})
+        doc = await collection.find_one({"key": key}, projection={"_id": 1})
         return doc is not None
     
+    async def store_many(self, items: Dict[str, Any], metadata: Optional[Dict] = None) -> bool:
+        """批量存储记忆，一次bulk_write完成所有upsert"""
+        if not items:
+            return True
+        
+        await self.flush()
+        now = _utcnow()
+        await self._bulk_upsert([
+            self._build_document(key, content, metadata, now)
+            for key, content in items.items()
+        ])
+        return True
+    
+    async def retrieve_many(self, keys: List[str]) -> List[Optional[Memory]]:
+        """批量检索记忆，一次$in查询"""
+        if not keys:
+            return []
+        
+        collection = await self._get_flushed_collection()
+        
+        found = {}
+        async for doc in collection.find({"key": {"$in": list(keys)}}):
+            found[doc["key"]] = self._doc_to_memory(doc)
+        return [found.get(key) for key in keys]
+    
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """批量检查记忆是否存在，一次$in查询且只返回key字段"""
+        if not keys:
+            return []
+        
+        collection = await self._get_flushed_collection()
+        
+        found = set()
+        async for doc in collection.find({"key": {"$in": list(keys)}}, {"key": 1}):
+            found.add(doc["key"])
+        return [key in found for key in keys]
+    
     async def close(self):
-        """关闭连接"""
-        if self._client:
-            self._client.close()
+        """写入缓冲中的文档并释放集合引用（客户端按连接串共享，不在此关闭）"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        if self._pending:
+            await self.flush()
+        self._client = None
+        self._db = None
+        self._collection = None
 
 
 class RedisProvider(IMemoryProvider):
-    """Redis记忆存储 - 适用于会话缓存"""
+    """Redis记忆存储 - 适用于会话缓存
+    
+    每条记忆存为一个Hash（content/metadata/created_at），
+    只有metadata做一次JSON编码（安装orjson时使用orjson），过期时间通过EXPIRE设置。
+    键名带存储格式版本（prefix + "v2:" + key），与旧版本写入的JSON字符串键互不冲突，
+    旧键按原TTL自然过期，clear 时一并删除。
+    """
+    
+    TTL_SECONDS = 86400  # 24小时过期
+    SCAN_BATCH_SIZE = 500  # clear 时每批扫描与删除的键数
+    KEY_VERSION = "v2:"  # Hash存储格式的键名版本
     
     def __init__(self, connection_string: str = "redis://localhost:6379", 
                  prefix: str = "memory:"):
         self.connection_string = connection_string
         self.prefix = prefix
+        self._key_prefix = f"{prefix}{self.KEY_VERSION}"
         self._client = None
     
     async def _get_client(self):
@@ -206,7 +616,7 @@ class RedisProvider(IMemoryProvider):
         if self._client is None:
             try:
                 import redis.asyncio as redis
-                self._client = redis.from_url(self.connection_string)
+                self._client = redis.from_url(self.connection_string, decode_responses=True)
             except ImportError:
                 raise ImportError("Please install redis: pip install redis")
         return self._client
@@ -215,37 +625,44 @@ class RedisProvider(IMemoryProvider):
         """存储记忆"""
         client = await self._get_client()
         
-        data = {
-            "content": str(content),
-            "metadata": json.dumps(metadata or {}),
-            "created_at": datetime.utcnow().isoformat(),
-        }
-        
-        await client.set(
-            f"{self.prefix}{key}",
-            json.dumps(data),
-            ex=86400  # 24小时过期
-        )
+        pipe = client.pipeline(transaction=False)
+        self._queue_store(pipe, key, content, metadata, _utcnow())
+        await pipe.execute()
         return True
     
     async def retrieve(self, key: str) -> Optional[Memory]:
         """检索记忆"""
         client = await self._get_client()
         
-        data = await client.get(f"{self.prefix}{key}")
+        fields = await client.hgetall(f"{self._key_prefix}{key}")
         
-        if data:
-            parsed = json.loads(data)
-            return Memory(
-                key=key,
-                content=parsed["content"],
-                metadata=json.loads(parsed["metadata"]),
-                created_at=datetime.fromisoformat(parsed["created_at"]),
-                updated_at=datetime.fromisoformat(parsed["created_at"]),
-                memory_type="short_term",
-            )
+        if fields:
+            return self._deserialize(key, fields)
         return None
     
+    def _queue_store(self, pipe, key: str, content: Any, metadata: Optional[Dict], now: datetime) -> None:
+        """在流水线中追加一条记忆的HSET与EXPIRE"""
+        full_key = f"{self._key_prefix}{key}"
+        pipe.hset(full_key, mapping={
+            "content": str(content),
+            "metadata": _json.dumps(metadata or {}),
+            "created_at": now.isoformat(),
+        })
+        pipe.expire(full_key, self.TTL_SECONDS)
+    
+    @staticmethod
+    def _deserialize(key: str, fields: Dict[str, str]) -> Memory:
+        """将Redis Hash字段还原为Memory"""
+        created_at = datetime.fromisoformat(fields["created_at"])
+        return Memory(
+            key=key,
+            content=fields["content"],
+            metadata=_json.loads(fields["metadata"]),
+            created_at=created_at,
+            updated_at=created_at,
+            memory_type="short_term",
+        )
+    
     async def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """简单搜索（Redis不擅长文本搜索，返回空）"""
         return []
@@ -254,25 +671,80 @@ class RedisProvider(IMemoryProvider):
         """删除记忆"""
         client = await self._get_client()
         
-        result = await client.delete(f"{self.prefix}{key}")
+        result = await client.delete(f"{self._key_prefix}{key}")
         return result > 0
     
     async def clear(self, conversation_id: Optional[str] = None) -> bool:
         """清空记忆"""
         client = await self._get_client()
         
+        # SCAN 分批迭代，避免 KEYS 阻塞整个 Redis 实例；每批通过流水线删除
+        # 匹配整个前缀，旧版本格式的键也一并清理
         pattern = f"{self.prefix}*"
-        keys = await client.keys(pattern)
-        
-        if keys:
-            await client.delete(*keys)
+        batch = []
+        async for key in client.scan_iter(match=pattern, count=self.SCAN_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= self.SCAN_BATCH_SIZE:
+                await self._delete_batch(client, batch)
+                batch = []
+        if batch:
+            await self._delete_batch(client, batch)
         return True
     
+    @staticmethod
+    async def _delete_batch(client, keys: List[Any]) -> None:
+        """通过流水线删除一批键"""
+        pipe = client.pipeline(transaction=False)
+        pipe.delete(*keys)
+        await pipe.execute()
+    
     async def exists(self, key: str) -> bool:
         """检查记忆是否存在"""
         client = await self._get_client()
         
-        return await client.exists(f"{self.prefix}{key}") > 0
+        return await client.exists(f"{self._key_prefix}{key}") > 0
+    
+    async def store_many(self, items: Dict[str, Any], metadata: Optional[Dict] = None) -> bool:
+        """批量存储记忆，通过流水线一次往返写入"""
+        if not items:
+            return True
+        
+        client = await self._get_client()
+        now = _utcnow()
+        
+        pipe = client.pipeline(transaction=False)
+        for key, content in items.items():
+            self._queue_store(pipe, key, content, metadata, now)
+        await pipe.execute()
+        return True
+    
+    async def retrieve_many(self, keys: List[str]) -> List[Optional[Memory]]:
+        """批量检索记忆，通过流水线一次往返执行HGETALL"""
+        if not keys:
+            return []
+        
+        client = await self._get_client()
+        
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(f"{self._key_prefix}{key}")
+        values = await pipe.execute()
+        return [
+            self._deserialize(key, fields) if fields else None
+            for key, fields in zip(keys, values)
+        ]
+    
+    async def exists_many(self, keys: List[str]) -> List[bool]:
+        """批量检查记忆是否存在，通过流水线一次往返"""
+        if not keys:
+            return []
+        
+        client = await self._get_client()
+        
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.exists(f"{self._key_prefix}{key}")
+        return [count > 0 for count in await pipe.execute()]
     
     async def close(self):
         """关闭连接"""
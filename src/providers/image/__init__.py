@@ -6,6 +6,7 @@ from src.providers.image.generator import (
     DalleProvider,
     StableDiffusionProvider,
     create_image_generator,
+    register_image_provider,
 )
 
 __all__ = [
@@ -15,4 +16,5 @@ __all__ = [
     "DalleProvider",
     "StableDiffusionProvider",
     "create_image_generator",
+    "register_image_provider",
 ]
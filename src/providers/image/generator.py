@@ -2,13 +2,15 @@
 # 统一图像生成接口
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Type
+import asyncio
 from dataclasses import dataclass
 
 from src.core.interfaces import IImageProvider
 
 
-@dataclass
+@dataclass(slots=True)
 class ImageConfig:
     """图像生成配置"""
     provider: str = "dalle"
@@ -17,11 +19,41 @@ class ImageConfig:
     style: str = "vivid"
 
 
+# 供应商名称 -> 供应商类，由 register_image_provider 装饰器填充
+_PROVIDER_CLASSES: Dict[str, Type["BaseImageProvider"]] = {}
+
+
+def register_image_provider(name: str):
+    """
+    装饰器：注册图像生成供应商类
+    
+    Example:
+        >>> @register_image_provider("myprovider")
+        ... class MyProvider(BaseImageProvider):
+        ...     pass
+    """
+    def decorator(cls):
+        _PROVIDER_CLASSES[name] = cls
+        return cls
+    return decorator
+
+
 class BaseImageProvider(IImageProvider, ABC):
     """图像生成供应商基类"""
     
-    def __init__(self, config: Optional[ImageConfig] = None):
+    MIN_PROMPT_LENGTH = 10  # 子类可覆盖
+    
+    def __init__(self, config: Optional[ImageConfig] = None, session: Any = None):
         self.config = config or ImageConfig()
+        self._session = session
+        # 注册到 ImageGenerator 后由其注入，按需获取共享的HTTP会话
+        self._session_factory: Optional[Callable[[], Awaitable[Any]]] = None
+    
+    async def _get_session(self):
+        """获取HTTP会话（aiohttp.ClientSession），优先使用生成器共享的连接池"""
+        if self._session is None and self._session_factory is not None:
+            return await self._session_factory()
+        return self._session
     
     @abstractmethod
     async def generate_image(self, prompt: str, **kwargs) -> str:
@@ -30,16 +62,18 @@ class BaseImageProvider(IImageProvider, ABC):
     
     def _validate_prompt(self, prompt: str) -> bool:
         """验证提示词"""
-        if not prompt or len(prompt) < 10:
-            raise ValueError("Prompt too short (minimum 10 characters)")
+        if len(prompt or "") < self.MIN_PROMPT_LENGTH:
+            raise ValueError(f"Prompt too short (minimum {self.MIN_PROMPT_LENGTH} characters)")
         return True
 
 
+@register_image_provider("dalle")
 class DalleProvider(BaseImageProvider):
     """DALL-E 图像生成"""
     
-    def __init__(self, api_key: str = "", config: Optional[ImageConfig] = None):
-        super().__init__(config or ImageConfig())
+    def __init__(self, api_key: str = "", config: Optional[ImageConfig] = None,
+                 session: Any = None):
+        super().__init__(config or ImageConfig(), session)
         self.api_key = api_key
     
     async def generate_image(self, prompt: str, **kwargs) -> str:
@@ -59,12 +93,13 @@ class DalleProvider(BaseImageProvider):
         return ["256x256", "512x512", "1024x1024", "1792x1024", "1024x1792"]
 
 
+@register_image_provider("stable_diffusion")
 class StableDiffusionProvider(BaseImageProvider):
     """Stable Diffusion 图像生成"""
     
     def __init__(self, api_url: str = "http://localhost:7860", 
-                 config: Optional[ImageConfig] = None):
-        super().__init__(config)
+                 config: Optional[ImageConfig] = None, session: Any = None):
+        super().__init__(config, session)
         self.api_url = api_url
     
     async def generate_image(self, prompt: str, **kwargs) -> str:
@@ -85,23 +120,66 @@ class StableDiffusionProvider(BaseImageProvider):
 
 
 class ImageGenerator:
-    """图像生成器 - 统一入口"""
+    """图像生成器 - 统一入口
+    
+    持有一个共享的 aiohttp.ClientSession（首次使用时创建），
+    各供应商复用其连接池与keep-alive连接；可用 async with 管理其生命周期。
+    
+    相同供应商、参数与提示词的生成结果缓存在LRU中，重复请求不再调用远程接口。
+    """
+    
+    CACHE_SIZE = 1000
     
     def __init__(self, config: Optional[ImageConfig] = None):
         self.config = config or ImageConfig()
         self._providers: Dict[str, IImageProvider] = {}
+        self._session = None
+        self._cache: OrderedDict = OrderedDict()
+    
+    async def __aenter__(self) -> "ImageGenerator":
+        return self
+    
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+    
+    async def _get_session(self):
+        """获取共享的HTTP会话"""
+        if self._session is None or self._session.closed:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError("Please install aiohttp: pip install aiohttp")
+            
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=100,
+                    limit_per_host=30,
+                    keepalive_timeout=60,
+                ),
+            )
+        return self._session
+    
+    async def close(self) -> None:
+        """关闭共享的HTTP会话"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
     
     def register_provider(self, name: str, provider: IImageProvider):
         """注册供应商"""
+        if isinstance(provider, BaseImageProvider) and provider._session is None:
+            provider._session_factory = self._get_session
         self._providers[name] = provider
+        self._cache.clear()
     
     async def generate(
         self,
         prompt: str,
         provider: Optional[str] = None,
+        use_cache: bool = True,
         **kwargs
     ) -> Dict[str, Any]:
-        """生成图像"""
+        """生成图像，use_cache 为 False 时总是重新生成"""
         provider_name = provider or self.config.provider
         
         if provider_name not in self._providers:
@@ -112,15 +190,42 @@ class ImageGenerator:
         # 获取尺寸
         size = kwargs.get("size", self.config.size)
         
+        cache_key = self._cache_key(provider_name, prompt, kwargs) if use_cache else None
+        if cache_key is not None and cache_key in self._cache:
+            self._cache.move_to_end(cache_key)
+            return dict(self._cache[cache_key])
+        
         # 生成
         image_url = await image_provider.generate_image(prompt, **kwargs)
         
-        return {
+        result = {
             "image_url": image_url,
             "provider": provider_name,
             "size": size,
             "prompt": prompt,
         }
+        
+        if cache_key is not None:
+            self._cache[cache_key] = dict(result)
+            if len(self._cache) > self.CACHE_SIZE:
+                self._cache.popitem(last=False)
+        
+        return result
+    
+    def _cache_key(self, provider_name: str, prompt: str, kwargs: Dict[str, Any]) -> Optional[tuple]:
+        """结果缓存键；参数不可哈希时返回None（不缓存）"""
+        params = {
+            "size": self.config.size,
+            "quality": self.config.quality,
+            "style": self.config.style,
+            **kwargs,
+        }
+        key = (provider_name, prompt, tuple(sorted(params.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
     
     async def generate_multiple(
         self,
@@ -135,13 +240,11 @@ class ImageGenerator:
         if provider_name not in self._providers:
             raise ValueError(f"Unknown provider: {provider_name}")
         
-        # 生成多张
-        results = []
-        for i in range(count):
-            result = await self.generate(prompt, provider_name, **kwargs)
-            results.append(result)
-        
-        return results
+        # 并发生成多张，总耗时约等于单张耗时；每张都需独立生成，不走缓存
+        return list(await asyncio.gather(*(
+            self.generate(prompt, provider_name, use_cache=False, **kwargs)
+            for _ in range(count)
+        )))
     
     def list_providers(self) -> List[Dict[str, Any]]:
         """列出可用供应商"""
@@ -156,15 +259,11 @@ class ImageGenerator:
 
 # 便捷函数
 def create_image_generator(provider: str = "dalle", **kwargs) -> ImageGenerator:
-    """创建图像生成器"""
-    generator = ImageGenerator()
-    
-    if provider == "dalle":
-        generator.register_provider("dalle", DalleProvider(kwargs.get("api_key")))
-    elif provider == "stable_diffusion":
-        generator.register_provider(
-            "stable_diffusion", 
-            StableDiffusionProvider(kwargs.get("api_url"))
-        )
+    """创建图像生成器，kwargs 透传给供应商类的构造函数"""
+    provider_class = _PROVIDER_CLASSES.get(provider)
+    if provider_class is None:
+        raise ValueError(f"Unknown provider: {provider}")
     
+    generator = ImageGenerator()
+    generator.register_provider(provider, provider_class(**kwargs))
     return generator
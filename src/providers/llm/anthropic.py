@@ -1,9 +1,17 @@
 # Anthropic供应商实现
 
+from functools import lru_cache
 from typing import AsyncIterator, Dict, Any, Optional, List
 
-from src.core.interfaces import AIRequest, AIResponse, UsageInfo, Message
-from src.providers.llm.factory import BaseLLMProvider, register_provider
+from src.core.interfaces import AIRequest, AIResponse, Message, StreamChunk, ROLE_VALUES
+from src.providers.llm.factory import BaseLLMProvider, estimate_tokens, register_provider
+
+try:
+    from anthropic import Anthropic, AsyncAnthropic
+    _ANTHROPIC_AVAILABLE = True
+except ImportError:
+    Anthropic = AsyncAnthropic = None
+    _ANTHROPIC_AVAILABLE = False
 
 
 @register_provider("anthropic")
@@ -11,23 +19,25 @@ class AnthropicProvider(BaseLLMProvider):
     """Anthropic Claude供应商实现"""
     
     DEFAULT_BASE_URL = "https://api.anthropic.com"
+    TOKEN_CACHE_SIZE = 4096
     
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
-        self._client = None
         self._async_client = None
+        # 同步客户端只用于count_tokens，创建一次后复用
+        self._client = Anthropic(api_key=self.api_key) if _ANTHROPIC_AVAILABLE else None
+        if not _ANTHROPIC_AVAILABLE:
+            self._logger.warning("Anthropic package not installed")
+        # 重复的系统提示/few-shot前缀不再重复请求计数接口；缓存随实例（即配置）失效
+        self._count_remote = lru_cache(maxsize=self.TOKEN_CACHE_SIZE)(self._count_remote)
     
     async def _get_async_client(self):
         """获取异步客户端"""
-        if self._async_client is None:
-            try:
-                from anthropic import AsyncAnthropic
-                self._async_client = AsyncAnthropic(
-                    api_key=self.api_key,
-                    base_url=self.base_url if self.base_url else None,
-                )
-            except ImportError:
-                self._logger.warning("Anthropic package not installed")
+        if self._async_client is None and _ANTHROPIC_AVAILABLE:
+            self._async_client = AsyncAnthropic(
+                api_key=self.api_key,
+                base_url=self.base_url if self.base_url else None,
+            )
         return self._async_client
     
     async def generate(self, request: AIRequest) -> AIResponse:
@@ -41,6 +51,7 @@ class AnthropicProvider(BaseLLMProvider):
         
         # Anthropic使用max_tokens参数
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
@@ -74,19 +85,13 @@ class AnthropicProvider(BaseLLMProvider):
                         }
                     }]
             
-            content = ""
-            if response.content:
-                for block in response.content:
-                    if block.type == "text":
-                        content += block.text
+            content = "".join(
+                block.text for block in response.content or () if block.type == "text"
+            )
             
             return AIResponse(
                 content=content,
-                usage=UsageInfo(
-                    prompt_tokens=response.usage.input_tokens,
-                    completion_tokens=response.usage.output_tokens,
-                    total_tokens=response.usage.input_tokens + response.usage.output_tokens,
-                ),
+                usage=self._parse_anthropic_usage(response.usage),
                 model=response.model,
                 finish_reason=finish_reason,
                 tool_calls=tool_calls,
@@ -95,7 +100,7 @@ class AnthropicProvider(BaseLLMProvider):
             self._logger.error(f"Anthropic API error: {e}")
             raise
     
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """流式生成"""
         client = await self._get_async_client()
         if client is None:
@@ -104,6 +109,7 @@ class AnthropicProvider(BaseLLMProvider):
         messages = self._convert_messages(request.messages)
         
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
@@ -114,50 +120,44 @@ class AnthropicProvider(BaseLLMProvider):
         try:
             stream = await client.messages.create(**params)
             
-            async for chunk in stream:
-                if chunk.type == "content_block_delta" and chunk.delta.type == "text_delta":
-                    yield chunk.delta.text
+            async for chunk in self._iter_anthropic_stream(stream):
+                yield chunk
         except Exception as e:
             self._logger.error(f"Anthropic streaming error: {e}")
             raise
     
     def count_tokens(self, text: str) -> int:
         """计算Token数"""
-        try:
-            from anthropic import Anthropic
-            client = Anthropic(api_key=self.api_key)
-            response = client.count_tokens(text)
-            return response
-        except ImportError:
+        if self._client is None:
             # 估算
-            return len(text) // 4
+            return estimate_tokens(text)
+        try:
+            return self._count_remote(text)
         except Exception:
-            return len(text) // 4
+            return estimate_tokens(text)
+    
+    def _count_remote(self, text: str) -> int:
+        """调用SDK计数（实例上会被lru_cache包装，异常结果不缓存）"""
+        return self._client.count_tokens(text)
     
     def _convert_messages(self, messages: List[Message]) -> List[Dict[str, Any]]:
         """转换消息格式 - Anthropic要求最后一条必须是user或assistant"""
         result = []
+        last = None
         
         for msg in messages:
-            role = msg.role.value if hasattr(msg.role, 'value') else msg.role
+            role = ROLE_VALUES.get(msg.role, msg.role)
             
-            # Anthropic只支持user和assistant角色
-            if role == "system":
-                # System消息需要特殊处理
-                if result and result[-1]["role"] == "user":
-                    # 将system附加到最后一个user消息
-                    result[-1]["content"] = f"{msg.content}\n\n" + result[-1]["content"]
-                else:
-                    # 添加一个user消息作为system
-                    result.append({
-                        "role": "user",
-                        "content": msg.content,
-                    })
-            else:
-                result.append({
-                    "role": role,
-                    "content": msg.content,
-                })
+            # Anthropic只支持user和assistant角色：system附加到前一个user消息，
+            # 否则作为一个user消息
+            if role == "system" and last is not None and last["role"] == "user":
+                last["content"] = f"{msg.content}\n\n" + last["content"]
+                continue
+            last = {
+                "role": "user" if role == "system" else role,
+                "content": msg.content,
+            }
+            result.append(last)
         
         return result
     
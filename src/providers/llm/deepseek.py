@@ -2,8 +2,8 @@
 
 from typing import AsyncIterator, Dict, Any, List
 
-from src.core.interfaces import AIRequest, AIResponse, UsageInfo, Message
-from src.providers.llm.factory import BaseLLMProvider, register_provider
+from src.core.interfaces import AIRequest, AIResponse, Message, StreamChunk, ROLE_VALUES
+from src.providers.llm.factory import BaseLLMProvider, estimate_tokens, register_provider
 
 
 @register_provider("deepseek")
@@ -38,6 +38,7 @@ class DeepSeekProvider(BaseLLMProvider):
         messages = self._convert_messages(request.messages)
 
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
@@ -54,11 +55,7 @@ class DeepSeekProvider(BaseLLMProvider):
 
             return AIResponse(
                 content=message.content or "",
-                usage=UsageInfo(
-                    prompt_tokens=response.usage.prompt_tokens,
-                    completion_tokens=response.usage.completion_tokens,
-                    total_tokens=response.usage.total_tokens,
-                ),
+                usage=self._parse_openai_usage(response.usage),
                 model=response.model,
                 finish_reason=response.choices[0].finish_reason,
                 reasoning_content=reasoning_content,
@@ -67,7 +64,7 @@ class DeepSeekProvider(BaseLLMProvider):
             self._logger.error(f"DeepSeek API error: {e}")
             raise
     
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """流式生成"""
         client = await self._get_async_client()
         if client is None:
@@ -76,38 +73,33 @@ class DeepSeekProvider(BaseLLMProvider):
         messages = self._convert_messages(request.messages)
         
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
             "max_tokens": request.max_tokens,
             "stream": True,
+            "stream_options": {"include_usage": True},
         }
         
         try:
             stream = await client.chat.completions.create(**params)
             
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            async for chunk in self._iter_openai_stream(stream):
+                yield chunk
         except Exception as e:
             self._logger.error(f"DeepSeek streaming error: {e}")
             raise
     
-    def count_tokens(self, text: str) -> int:
-        """计算Token数"""
-        # 估算
-        return len(text) // 4
+    # 估算Token数，直接绑定模块级函数
+    count_tokens = staticmethod(estimate_tokens)
     
     def _convert_messages(self, messages: List[Message]) -> List[Dict[str, Any]]:
         """转换消息格式"""
-        result = []
-        for msg in messages:
-            role = msg.role.value if hasattr(msg.role, 'value') else msg.role
-            result.append({
-                "role": role,
-                "content": msg.content,
-            })
-        return result
+        return [
+            {"role": ROLE_VALUES.get(msg.role, msg.role), "content": msg.content}
+            for msg in messages
+        ]
     
     def get_provider_name(self) -> str:
         """获取供应商名称"""
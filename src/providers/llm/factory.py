@@ -20,13 +20,45 @@ AI Foundation - LLM供应商工厂模块
 - OpenRouter
 """
 
-from typing import Dict, Any, Optional, Type
+from typing import AsyncIterator, Dict, Any, Optional, Type
 from abc import ABC, abstractmethod
-import json
+from functools import lru_cache
+import importlib
+import sys
 
-from src.core.interfaces import ILLMProvider, AIRequest, AIResponse
+from src.core.interfaces import ILLMProvider, AIRequest, AIResponse, StreamChunk, UsageInfo
 from src.core.abstracts.base_provider import BaseProvider
-from src.config.manager import get_provider_config, get_model
+from src.config.manager import get_config, get_provider_config, get_model
+
+
+def _freeze(value: Any) -> Any:
+    """
+    将配置值转换为可哈希的结构，用作实例缓存键
+    
+    dict 转为按键排序的元组，list/tuple 逐项转换，
+    其他不可哈希的值退化为 repr。
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    try:
+        hash(value)
+    except TypeError:
+        return repr(value)
+    return value
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算Token数：平均1个Token约4个字符"""
+    return len(text) >> 2
+
+
+@lru_cache(maxsize=1)
+def _openai_compatible_class() -> Type[ILLMProvider]:
+    """通用OpenAI兼容接口的实现类（custom/compatible），只导入一次"""
+    from .openai import OpenAIProvider
+    return OpenAIProvider
 
 
 class LLMProviderFactory:
@@ -39,6 +71,7 @@ class LLMProviderFactory:
     Attributes:
         _instance: 单例实例
         _providers: 已注册的供应商类字典
+        _resolved: 名称到供应商类的解析缓存
         _provider_instances: 已创建的供应商实例字典
     
     Example:
@@ -49,6 +82,8 @@ class LLMProviderFactory:
     
     _instance: Optional['LLMProviderFactory'] = None
     _providers: Dict[str, Type[ILLMProvider]] = {}
+    _resolved: Dict[str, Type[ILLMProvider]] = {}
+    _provider_instances: Dict[tuple, ILLMProvider] = {}
     
     def __new__(cls):
         """
@@ -59,7 +94,6 @@ class LLMProviderFactory:
         """
         if cls._instance is None:
             cls._instance = super().__new__(cls)
-            cls._instance._provider_instances = {}
         return cls._instance
     
     @classmethod
@@ -79,7 +113,9 @@ class LLMProviderFactory:
             ...     pass
             >>> LLMProviderFactory.register("myprovider", MyProvider)
         """
-        cls._providers[name.lower()] = provider_class
+        name = sys.intern(name.lower())
+        cls._providers[name] = provider_class
+        cls._resolved.pop(name, None)
     
     @classmethod
     def get_provider(cls, name: str, 
@@ -100,39 +136,47 @@ class LLMProviderFactory:
             ValueError: 未知供应商名称
             ImportError: 缺少必要的依赖包
         """
-        name = name.lower()
-        
-        if name not in cls._providers:
-            # 尝试使用通用OpenAI兼容接口
-            if name in ["custom", "compatible"]:
-                from .openai import OpenAIProvider
-                provider_class = OpenAIProvider
-            else:
-                raise ValueError(
-                    f"Unknown LLM provider: '{name}'. "
-                    f"Available: {cls.list_providers()}"
-                )
-        else:
-            provider_class = cls._providers[name]
+        # 解析缓存的键均为小写，命中时名称已是规范形式，无需再转换
+        provider_class = cls._resolved.get(name)
+        if provider_class is None:
+            name = name.lower()
+            provider_class = cls._resolved.get(name) or cls._resolve(name)
         
         # 使用配置或默认配置
         if config is None:
             config = {}
         
         # 检查缓存
-        cache_key = f"{name}_{hash(json.dumps(config, sort_keys=True))}"
-        # 确保实例存在
-        if cls._instance is None:
-            cls()
-        if cache_key in cls._instance._provider_instances:
-            return cls._instance._provider_instances[cache_key]
-        
-        # 创建新实例
-        instance = provider_class(config)
-        cls._instance._provider_instances[cache_key] = instance
+        cache_key = (name, _freeze(config))
+        instance = cls._provider_instances.get(cache_key)
+        if instance is None:
+            # 创建新实例
+            instance = provider_class(config)
+            cls._provider_instances[cache_key] = instance
         
         return instance
     
+    @classmethod
+    def _resolve(cls, name: str) -> Type[ILLMProvider]:
+        """
+        解析供应商名称对应的类并缓存
+        
+        Raises:
+            ValueError: 未知供应商名称
+        """
+        if name in cls._providers:
+            provider_class = cls._providers[name]
+        elif name in ("custom", "compatible"):
+            # 尝试使用通用OpenAI兼容接口
+            provider_class = _openai_compatible_class()
+        else:
+            raise ValueError(
+                f"Unknown LLM provider: '{name}'. "
+                f"Available: {cls.list_providers()}"
+            )
+        cls._resolved[name] = provider_class
+        return provider_class
+    
     @classmethod
     def list_providers(cls) -> list:
         """
@@ -159,8 +203,14 @@ class LLMProviderFactory:
         Raises:
             ValueError: 配置不存在或供应商未启用
         """
-        provider_config = get_provider_config(provider_name)
-        
+        return cls._create_from_provider_config(
+            provider_name, get_provider_config(provider_name)
+        )
+    
+    @classmethod
+    def _create_from_provider_config(cls, provider_name: str,
+                                     provider_config: Any) -> ILLMProvider:
+        """根据已取得的供应商配置创建实例"""
         if provider_config is None:
             raise ValueError(
                 f"Provider '{provider_name}' not found in configuration"
@@ -190,15 +240,22 @@ class LLMProviderFactory:
         Returns:
             list: 可用的供应商名称列表
         """
+        # 一次取出供应商配置表，避免逐个按名称查找
+        providers_config = get_config().providers
         available = []
         for name in cls.list_providers():
+            provider_config = getattr(providers_config, name, None)
+            # 配置缺失、未启用或没有API密钥时无需创建实例
+            if (provider_config is None or not provider_config.enabled
+                    or not provider_config.api_key):
+                continue
             try:
-                provider = cls.create_from_config(name)
-                if provider.is_available():
-                    available.append(name)
-            except (ValueError, ImportError):
-                # 配置缺失或依赖缺失，跳过
+                provider = cls._create_from_provider_config(name, provider_config)
+            except ImportError:
+                # 依赖缺失，跳过
                 continue
+            if provider.is_available():
+                available.append(name)
         return available
 
 
@@ -256,7 +313,7 @@ class BaseLLMProvider(BaseProvider, ILLMProvider, ABC):
             request: AI请求对象
             
         Returns:
-            AsyncIterator[str]: 异步生成器
+            AsyncIterator[StreamChunk]: 异步生成器，最后一块携带真实用量
         """
         pass
     
@@ -273,6 +330,123 @@ class BaseLLMProvider(BaseProvider, ILLMProvider, ABC):
         """
         pass
     
+    @staticmethod
+    def _parse_openai_usage(usage: Any) -> UsageInfo:
+        """
+        解析OpenAI协议的usage字段
+        
+        兼容 `prompt_tokens_details.cached_tokens`（OpenAI）与
+        `prompt_cache_hit_tokens`（DeepSeek）两种缓存命中字段。
+        
+        Args:
+            usage: SDK返回的usage对象
+            
+        Returns:
+            UsageInfo: Token使用统计
+        """
+        prompt_details = getattr(usage, "prompt_tokens_details", None)
+        completion_details = getattr(usage, "completion_tokens_details", None)
+        cached_tokens = (
+            getattr(prompt_details, "cached_tokens", None)
+            or getattr(usage, "prompt_cache_hit_tokens", None)
+            or 0
+        )
+        return UsageInfo(
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            total_tokens=usage.total_tokens,
+            cached_tokens=cached_tokens,
+            reasoning_tokens=getattr(completion_details, "reasoning_tokens", None) or 0,
+        )
+    
+    @staticmethod
+    def _parse_anthropic_usage(usage: Any) -> UsageInfo:
+        """
+        解析Anthropic协议的usage字段
+        
+        Args:
+            usage: SDK返回的usage对象
+            
+        Returns:
+            UsageInfo: Token使用统计，缓存命中取 `cache_read_input_tokens`
+        """
+        return UsageInfo(
+            prompt_tokens=usage.input_tokens,
+            completion_tokens=usage.output_tokens,
+            total_tokens=usage.input_tokens + usage.output_tokens,
+            cached_tokens=getattr(usage, "cache_read_input_tokens", None) or 0,
+        )
+    
+    async def _iter_openai_stream(self, stream: Any) -> AsyncIterator[StreamChunk]:
+        """
+        将OpenAI协议的流式响应转换为StreamChunk
+        
+        需在请求中开启 `stream_options={"include_usage": True}`，
+        供应商会在最后一个（choices为空的）数据块中返回usage。
+        
+        Args:
+            stream: SDK返回的异步流
+            
+        Yields:
+            StreamChunk: 文本增量块，流结束时追加一个携带usage的空文本块
+        """
+        usage = None
+        finish_reason = None
+        async for chunk in stream:
+            if chunk.choices:
+                choice = chunk.choices[0]
+                if content := choice.delta.content:
+                    yield StreamChunk(text=content)
+                finish_reason = choice.finish_reason or finish_reason
+            if chunk_usage := getattr(chunk, "usage", None):
+                usage = self._parse_openai_usage(chunk_usage)
+        if usage is not None or finish_reason is not None:
+            yield StreamChunk(text="", usage=usage, finish_reason=finish_reason)
+    
+    async def _iter_anthropic_stream(self, stream: Any) -> AsyncIterator[StreamChunk]:
+        """
+        将Anthropic协议的流式事件转换为StreamChunk
+        
+        输入Token在 `message_start` 中返回，输出Token与stop_reason在
+        `message_delta` 中返回，流结束时合并为最后一块的usage。
+        
+        Args:
+            stream: SDK返回的异步事件流
+            
+        Yields:
+            StreamChunk: 文本增量块，流结束时追加一个携带usage的空文本块
+        """
+        input_usage = None
+        output_tokens = None
+        finish_reason = None
+        async for chunk in stream:
+            if chunk.type == "content_block_delta" and chunk.delta.type == "text_delta":
+                yield StreamChunk(text=chunk.delta.text)
+            elif chunk.type == "message_start":
+                input_usage = getattr(chunk.message, "usage", None)
+            elif chunk.type == "message_delta":
+                output_tokens = getattr(chunk.usage, "output_tokens", None)
+                finish_reason = getattr(chunk.delta, "stop_reason", None)
+        
+        if input_usage is None and output_tokens is None and finish_reason is None:
+            return
+        if finish_reason == "end_turn":
+            finish_reason = "stop"
+        elif finish_reason == "max_tokens":
+            finish_reason = "length"
+        prompt_tokens = getattr(input_usage, "input_tokens", None) or 0
+        completion_tokens = output_tokens or 0
+        yield StreamChunk(
+            text="",
+            usage=UsageInfo(
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+                cached_tokens=getattr(input_usage, "cache_read_input_tokens", None) or 0,
+            ),
+            finish_reason=finish_reason,
+        )
+    
     def get_model(self, model_type: str = "default") -> str:
         """
         获取指定类型的模型名称
@@ -336,11 +510,32 @@ def register_provider(name: str):
     return decorator
 
 
+@lru_cache(maxsize=None)
+def load_sdk(module: str, attr: str) -> Optional[Any]:
+    """
+    导入供应商SDK中的对象并缓存
+    
+    导入失败同样缓存为None，缺少依赖时不会在每次请求时重复尝试导入。
+    
+    Args:
+        module: 模块路径，如 "openai"
+        attr: 模块中的对象名，如 "AsyncOpenAI"
+        
+    Returns:
+        对象本身，SDK未安装时返回None
+    """
+    try:
+        return getattr(importlib.import_module(module), attr)
+    except ImportError:
+        return None
+
+
 def get_llm_provider(provider_name: str) -> ILLMProvider:
     """
     便捷函数：获取LLM供应商实例
     
-    从配置创建供应商实例的快捷方式。
+    从配置创建供应商实例的快捷方式。实例由工厂按名称和配置缓存，
+    重复调用复用已建立的HTTP客户端与连接池。
     
     Args:
         provider_name: 供应商名称
@@ -1,25 +1,44 @@
 # Google Gemini供应商实现
 
+from functools import lru_cache
 from typing import AsyncIterator, Dict, Any, Optional, List
 
-from src.core.interfaces import AIRequest, AIResponse, UsageInfo, Message
-from src.providers.llm.factory import BaseLLMProvider, register_provider
+from src.core.interfaces import AIRequest, AIResponse, UsageInfo, Message, StreamChunk, ROLE_VALUES
+from src.providers.llm.factory import BaseLLMProvider, estimate_tokens, load_sdk, register_provider
+
+
+# UsageInfo不可变，无用量统计时共享同一个空实例
+_EMPTY_USAGE = UsageInfo()
+
+
+@lru_cache(maxsize=8)
+def _google_client(api_key: str):
+    """按API密钥共享genai.Client，同一密钥的实例复用同一套传输与凭证"""
+    client_class = load_sdk("google.genai", "Client")
+    if client_class is None:
+        raise ImportError("Google GenAI package not installed")
+    return client_class(api_key=api_key)
 
 
 @register_provider("google")
 class GoogleProvider(BaseLLMProvider):
     """Google Gemini供应商实现"""
     
+    TOKEN_CACHE_SIZE = 4096
+    # 提示中各角色的前缀，其他角色不加前缀
+    _ROLE_PREFIXES = {"system": "System: ", "user": "User: ", "assistant": "Assistant: "}
+    
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self._client = None
+        # 重复文本的计数结果按实例缓存，避免重复的远程调用
+        self._count_remote = lru_cache(maxsize=self.TOKEN_CACHE_SIZE)(self._count_remote)
     
     async def _get_client(self):
         """获取客户端"""
         if self._client is None:
             try:
-                from google import genai
-                self._client = genai.Client(api_key=self.api_key)
+                self._client = _google_client(self.api_key)
             except ImportError as e:
                 self._logger.error(f"Google GenAI package import failed: {e}")
             except Exception as e:
@@ -41,36 +60,25 @@ class GoogleProvider(BaseLLMProvider):
                 model=request.model,
                 contents=prompt,
                 config={
+                    **request._provider_kwargs,
                     "temperature": request.temperature,
                     "max_output_tokens": request.max_tokens,
                 }
             )
             
-            # 解析响应
-            content = ""
-            usage = UsageInfo()
-            
-            if response.text:
-                content = response.text
-            
             # 获取使用统计
-            if hasattr(response, 'usage_metadata'):
-                usage = UsageInfo(
-                    prompt_tokens=response.usage_metadata.prompt_token_count,
-                    completion_tokens=response.usage_metadata.candidates_token_count,
-                    total_tokens=(
-                        response.usage_metadata.prompt_token_count +
-                        response.usage_metadata.candidates_token_count
-                    ),
-                )
+            usage_metadata = getattr(response, 'usage_metadata', None)
+            usage = self._parse_usage_metadata(usage_metadata) if usage_metadata is not None else _EMPTY_USAGE
             
             finish_reason = "stop"
-            if hasattr(response, 'candidates') and response.candidates:
-                if hasattr(response.candidates[0], 'finish_reason'):
-                    finish_reason = str(response.candidates[0].finish_reason)
+            candidates = getattr(response, 'candidates', None)
+            if candidates:
+                candidate_reason = getattr(candidates[0], 'finish_reason', None)
+                if candidate_reason is not None:
+                    finish_reason = str(candidate_reason)
             
             return AIResponse(
-                content=content,
+                content=response.text or "",
                 usage=usage,
                 model=request.model,
                 finish_reason=finish_reason,
@@ -79,7 +87,7 @@ class GoogleProvider(BaseLLMProvider):
             self._logger.error(f"Google Gemini API error: {e}")
             raise
     
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """流式生成"""
         client = await self._get_client()
         if client is None:
@@ -92,51 +100,66 @@ class GoogleProvider(BaseLLMProvider):
                 model=request.model,
                 contents=prompt,
                 config={
+                    **request._provider_kwargs,
                     "temperature": request.temperature,
                     "max_output_tokens": request.max_tokens,
                 }
             )
             
+            usage_metadata = None
             for chunk in stream:
                 if hasattr(chunk, 'text') and chunk.text:
-                    yield chunk.text
+                    yield StreamChunk(text=chunk.text)
+                # 用量统计随数据块累计，以最后一块为准
+                usage_metadata = getattr(chunk, 'usage_metadata', None) or usage_metadata
+            
+            if usage_metadata is not None:
+                yield StreamChunk(text="", usage=self._parse_usage_metadata(usage_metadata))
         except Exception as e:
             self._logger.error(f"Google Gemini streaming error: {e}")
             raise
     
+    @staticmethod
+    def _parse_usage_metadata(usage_metadata: Any) -> UsageInfo:
+        """解析Gemini的usage_metadata"""
+        prompt_tokens = usage_metadata.prompt_token_count or 0
+        completion_tokens = usage_metadata.candidates_token_count or 0
+        return UsageInfo(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            cached_tokens=getattr(usage_metadata, "cached_content_token_count", None) or 0,
+            reasoning_tokens=getattr(usage_metadata, "thoughts_token_count", None) or 0,
+        )
+    
     def count_tokens(self, text: str) -> int:
         """计算Token数"""
         # Google的tokenizer实现
         try:
-            from google import genai
-            client = genai.Client(api_key=self.api_key)
-            response = client.models.count_tokens(
-                model=self.models.get("default", "gemini-1.5-pro"),
-                contents=text,
-            )
-            return response.total_tokens
+            return self._count_remote(text)
         except ImportError:
-            return len(text) // 4
+            return estimate_tokens(text)
         except Exception:
-            return len(text) // 4
+            return estimate_tokens(text)
+    
+    def _count_remote(self, text: str) -> int:
+        """调用count_tokens接口（实例上会被lru_cache包装，异常结果不缓存）"""
+        if self._client is None:
+            self._client = _google_client(self.api_key)
+        response = self._client.models.count_tokens(
+            model=self.models.get("default", "gemini-1.5-pro"),
+            contents=text,
+        )
+        return response.total_tokens
     
     def _build_prompt(self, messages: List[Message]) -> str:
         """构建提示 - Gemini使用不同的消息格式"""
-        parts = []
-        
-        for msg in messages:
-            role = msg.role.value if hasattr(msg.role, 'value') else msg.role
-            
-            if role == "system":
-                parts.append(f"System: {msg.content}")
-            elif role == "user":
-                parts.append(f"User: {msg.content}")
-            elif role == "assistant":
-                parts.append(f"Assistant: {msg.content}")
-            else:
-                parts.append(msg.content)
-        
-        return "\n\n".join(parts)
+        prefixes = self._ROLE_PREFIXES
+        # 列表推导式一次构建全部片段，str.join 可先算出总长度再一次分配
+        return "\n\n".join([
+            prefixes.get(ROLE_VALUES.get(msg.role, msg.role), "") + msg.content
+            for msg in messages
+        ])
     
     def get_provider_name(self) -> str:
         """获取供应商名称"""
@@ -5,8 +5,8 @@
 from collections.abc import AsyncIterator
 from typing import Any
 
-from src.core.interfaces import AIRequest, AIResponse, Message, UsageInfo
-from src.providers.llm.factory import BaseLLMProvider, register_provider
+from src.core.interfaces import AIRequest, AIResponse, Message, StreamChunk
+from src.providers.llm.factory import BaseLLMProvider, estimate_tokens, load_sdk, register_provider
 
 
 @register_provider("minimax")
@@ -29,16 +29,15 @@ class MinimaxProvider(BaseLLMProvider):
                 raise ValueError(
                     "Minimax API key is missing. Set MINIMAX_API_KEY or providers.minimax.api_key."
                 )
-            try:
-                from anthropic import AsyncAnthropic
-
-                self._async_client = AsyncAnthropic(
+            client_class = load_sdk("anthropic", "AsyncAnthropic")
+            if client_class is None:
+                self._logger.warning("Anthropic package not installed")
+            else:
+                self._async_client = client_class(
                     api_key=api_key,
                     auth_token=api_key,
                     base_url=self.base_url if self.base_url else None,
                 )
-            except ImportError:
-                self._logger.warning("Anthropic package not installed")
         return self._async_client
 
     async def generate(self, request: AIRequest) -> AIResponse:
@@ -47,16 +46,19 @@ class MinimaxProvider(BaseLLMProvider):
         if client is None:
             raise ImportError("Anthropic package not installed")
 
-        messages = self._convert_messages(request.messages)
+        system, messages = self._convert_messages(request.messages)
+        if request.json_mode:
+            system = "\n\n".join(filter(None, (system, "You must respond in valid JSON.")))
 
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
             "max_tokens": request.max_tokens or 4096,
         }
-        if request.json_mode:
-            params["system"] = "You must respond in valid JSON."
+        if system:
+            params["system"] = system
 
         try:
             response = await client.messages.create(**params)
@@ -67,19 +69,13 @@ class MinimaxProvider(BaseLLMProvider):
             elif finish_reason == "max_tokens":
                 finish_reason = "length"
 
-            content = ""
-            if response.content:
-                for block in response.content:
-                    if block.type == "text":
-                        content += block.text
+            content = "".join(
+                block.text for block in response.content or () if block.type == "text"
+            )
 
             return AIResponse(
                 content=content,
-                usage=UsageInfo(
-                    prompt_tokens=response.usage.input_tokens,
-                    completion_tokens=response.usage.output_tokens,
-                    total_tokens=response.usage.input_tokens + response.usage.output_tokens,
-                ),
+                usage=self._parse_anthropic_usage(response.usage),
                 model=response.model,
                 finish_reason=finish_reason,
             )
@@ -87,47 +83,52 @@ class MinimaxProvider(BaseLLMProvider):
             self._logger.error(f"Minimax API error: {error}")
             raise
 
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """流式生成"""
         client = await self._get_async_client()
         if client is None:
             raise ImportError("Anthropic package not installed")
 
-        messages = self._convert_messages(request.messages)
+        system, messages = self._convert_messages(request.messages)
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
             "max_tokens": request.max_tokens or 4096,
             "stream": True,
         }
+        if system:
+            params["system"] = system
 
         try:
             stream = await client.messages.create(**params)
-            async for chunk in stream:
-                if chunk.type == "content_block_delta" and chunk.delta.type == "text_delta":
-                    yield chunk.delta.text
+            async for chunk in self._iter_anthropic_stream(stream):
+                yield chunk
         except Exception as error:
             self._logger.error(f"Minimax streaming error: {error}")
             raise
 
-    def count_tokens(self, text: str) -> int:
-        """计算Token数"""
-        return len(text) // 4
+    # 估算Token数，直接绑定模块级函数
+    count_tokens = staticmethod(estimate_tokens)
+
+    def _convert_messages(self, messages: list[Message]) -> tuple[str, list[dict[str, Any]]]:
+        """转换消息格式（兼容 anthropic 角色约束）
+
+        system 消息合并为 anthropic 的 system 参数，其余消息原样保留。
 
-    def _convert_messages(self, messages: list[Message]) -> list[dict[str, Any]]:
-        """转换消息格式（兼容 anthropic 角色约束）"""
+        Returns:
+            (system 文本, 消息列表)
+        """
+        system_parts = []
         result = []
         for message in messages:
-            role = message.role.value if hasattr(message.role, "value") else message.role
+            role = getattr(message.role, "value", message.role)
             if role == "system":
-                if result and result[-1]["role"] == "user":
-                    result[-1]["content"] = f"{message.content}\n\n{result[-1]['content']}"
-                else:
-                    result.append({"role": "user", "content": message.content})
+                system_parts.append(message.content)
             else:
                 result.append({"role": role, "content": message.content})
-        return result
+        return "\n\n".join(system_parts), result
 
     def get_provider_name(self) -> str:
         """获取供应商名称"""
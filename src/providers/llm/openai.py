@@ -2,16 +2,57 @@
 # 展示如何实现一个完整的LLM供应商
 
 import asyncio
+from functools import lru_cache
 from typing import AsyncIterator, Dict, Any, Optional, List
 
-from src.core.interfaces import AIRequest, AIResponse, UsageInfo, Message
-from src.providers.llm.factory import BaseLLMProvider, register_provider
+from src.core.interfaces import AIRequest, AIResponse, Message, StreamChunk, ROLE_VALUES
+from src.providers.llm.factory import BaseLLMProvider, estimate_tokens, load_sdk, register_provider
+
+
+@lru_cache(maxsize=4)
+def _get_encoding(model: str):
+    """获取并缓存模型的tiktoken编码器，不可用时返回None"""
+    try:
+        import tiktoken
+        return tiktoken.encoding_for_model(model)
+    except Exception:
+        return None
+
+
+@lru_cache(maxsize=32)
+def _shared_http_client(base_url: str):
+    """按API地址共享httpx连接池，不同配置的实例复用同一组keep-alive连接"""
+    client_class = load_sdk("httpx", "AsyncClient")
+    limits_class = load_sdk("httpx", "Limits")
+    if client_class is None:
+        return None
+    return client_class(
+        limits=limits_class(max_connections=100, max_keepalive_connections=50),
+    )
+
+
+def _build_tool_calls(tool_calls) -> List[Dict[str, Any]]:
+    """将SDK返回的工具调用转换为字典"""
+    return [
+        {
+            "id": tc.id,
+            "type": tc.type,
+            "function": {
+                "name": tc.function.name,
+                "arguments": tc.function.arguments,
+            }
+        }
+        for tc in tool_calls
+    ]
 
 
 @register_provider("openai")
 class OpenAIProvider(BaseLLMProvider):
     """OpenAI供应商实现"""
     
+    # 仅在有值时才随消息发送的字段
+    _OPTIONAL_FIELDS = ("name", "tool_calls", "tool_call_id")
+    
     # 兼容的API列表
     COMPATIBLE_APIS = [
         "openai",
@@ -30,27 +71,28 @@ class OpenAIProvider(BaseLLMProvider):
     async def _get_client(self):
         """获取同步客户端"""
         if self._client is None:
-            try:
-                from openai import OpenAI
-                self._client = OpenAI(
+            client_class = load_sdk("openai", "OpenAI")
+            if client_class is None:
+                self._logger.warning("OpenAI package not installed")
+            else:
+                self._client = client_class(
                     api_key=self.api_key,
                     base_url=self.base_url if self.base_url else None,
                 )
-            except ImportError:
-                self._logger.warning("OpenAI package not installed")
         return self._client
     
     async def _get_async_client(self):
         """获取异步客户端"""
         if self._async_client is None:
-            try:
-                from openai import AsyncOpenAI
-                self._async_client = AsyncOpenAI(
+            client_class = load_sdk("openai", "AsyncOpenAI")
+            if client_class is None:
+                self._logger.warning("OpenAI package not installed")
+            else:
+                self._async_client = client_class(
                     api_key=self.api_key,
                     base_url=self.base_url if self.base_url else None,
+                    http_client=_shared_http_client(self.base_url or ""),
                 )
-            except ImportError:
-                self._logger.warning("OpenAI package not installed")
         return self._async_client
     
     async def generate(self, request: AIRequest) -> AIResponse:
@@ -64,6 +106,7 @@ class OpenAIProvider(BaseLLMProvider):
         
         # 构建请求参数
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
@@ -80,33 +123,22 @@ class OpenAIProvider(BaseLLMProvider):
         
         try:
             response = await client.chat.completions.create(**params)
+            choice = response.choices[0]
+            # 常见路径没有工具调用，直接为None，不构建空列表
+            raw_tool_calls = choice.message.tool_calls
             
             return AIResponse(
-                content=response.choices[0].message.content or "",
-                usage=UsageInfo(
-                    prompt_tokens=response.usage.prompt_tokens,
-                    completion_tokens=response.usage.completion_tokens,
-                    total_tokens=response.usage.total_tokens,
-                ),
+                content=choice.message.content or "",
+                usage=self._parse_openai_usage(response.usage),
                 model=response.model,
-                finish_reason=response.choices[0].finish_reason,
-                tool_calls=[
-                    {
-                        "id": tc.id,
-                        "type": tc.type,
-                        "function": {
-                            "name": tc.function.name,
-                            "arguments": tc.function.arguments,
-                        }
-                    }
-                    for tc in response.choices[0].message.tool_calls or []
-                ],
+                finish_reason=choice.finish_reason,
+                tool_calls=_build_tool_calls(raw_tool_calls) if raw_tool_calls else None,
             )
         except Exception as e:
             self._logger.error(f"OpenAI API error: {e}")
             raise
     
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """流式生成"""
         client = await self._get_async_client()
         if client is None:
@@ -115,11 +147,13 @@ class OpenAIProvider(BaseLLMProvider):
         messages = self._convert_messages(request.messages)
         
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
             "max_tokens": request.max_tokens,
             "stream": True,
+            "stream_options": {"include_usage": True},
         }
         
         if request.json_mode:
@@ -128,63 +162,54 @@ class OpenAIProvider(BaseLLMProvider):
         try:
             stream = await client.chat.completions.create(**params)
             
-            async for chunk in stream:
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            async for chunk in self._iter_openai_stream(stream):
+                yield chunk
         except Exception as e:
             self._logger.error(f"OpenAI streaming error: {e}")
             raise
     
     def count_tokens(self, text: str) -> int:
         """计算Token数 - 使用tiktoken"""
-        try:
-            import tiktoken
-            encoding = tiktoken.encoding_for_model("gpt-4")
-            return len.encode(text).n_tokens
-        except ImportError:
+        encoding = _get_encoding("gpt-4")
+        if encoding is None:
             # 估算: 平均1个Token约4个字符
-            return len(text) // 4
-        except Exception:
-            return len(text) // 4
+            return estimate_tokens(text)
+        return len(encoding.encode(text))
     
     def count_messages_tokens(self, messages: List[Message]) -> int:
         """计算消息列表的Token数"""
-        try:
-            import tiktoken
-            encoding = tiktoken.encoding_for_model("gpt-4")
-            total = 0
-            
-            for msg in messages:
-                # 加上角色和内容格式化的开销
-                content = f"{msg.role}: {msg.content}"
-                total += len.encode(content).n_tokens
-                total += 4  # 每条消息的固定开销
-            
-            return total
-        except ImportError:
-            return sum(self.count_tokens(msg.content) for msg in messages)
+        encoding = _get_encoding("gpt-4")
+        if encoding is None:
+            return estimate_tokens("".join([msg.content for msg in messages]))
+        
+        # 加上角色和内容格式化的开销
+        contents = [
+            f"{ROLE_VALUES.get(msg.role, msg.role)}: {msg.content}" for msg in messages
+        ]
+        # 每条消息另有4个Token的固定开销
+        return sum(len(tokens) + 4 for tokens in encoding.encode_batch(contents))
     
     def _convert_messages(self, messages: List[Message]) -> List[Dict[str, Any]]:
         """转换消息格式"""
-        result = []
-        for msg in messages:
-            msg_dict = {
-                "role": msg.role.value if hasattr(msg.role, 'value') else msg.role,
-                "content": msg.content,
-            }
-            
-            if msg.name:
-                msg_dict["name"] = msg.name
-            
-            if msg.tool_calls:
-                msg_dict["tool_calls"] = msg.tool_calls
-            
-            if msg.tool_call_id:
-                msg_dict["tool_call_id"] = msg.tool_call_id
-            
-            result.append(msg_dict)
-        
-        return result
+        # 绝大多数消息只有role与content，一次构建完成；带可选字段的消息单独处理
+        return [
+            self._convert_message_with_extras(msg)
+            if msg.name or msg.tool_calls or msg.tool_call_id
+            else {"role": ROLE_VALUES.get(msg.role, msg.role), "content": msg.content}
+            for msg in messages
+        ]
+    
+    def _convert_message_with_extras(self, msg: Message) -> Dict[str, Any]:
+        """转换带name/tool_calls/tool_call_id的消息"""
+        msg_dict = {
+            "role": ROLE_VALUES.get(msg.role, msg.role),
+            "content": msg.content,
+        }
+        for field_name in self._OPTIONAL_FIELDS:
+            value = getattr(msg, field_name)
+            if value:
+                msg_dict[field_name] = value
+        return msg_dict
     
     def get_provider_name(self) -> str:
         """获取供应商名称"""
@@ -3,11 +3,43 @@
 # [Pos] LLM provider 层智谱实现，兼容新旧 SDK 客户端差异。
 
 import asyncio
+import importlib
+import threading
 from collections.abc import AsyncIterator
 from typing import Any
 
-from src.core.interfaces import AIRequest, AIResponse, Message, UsageInfo
-from src.providers.llm.factory import BaseLLMProvider, register_provider
+from src.core.interfaces import AIRequest, AIResponse, Message, StreamChunk, ROLE_VALUES
+from src.providers.llm.factory import BaseLLMProvider, estimate_tokens, register_provider
+
+
+# (客户端类, 是否异步)，首次成功导入后缓存
+_zhipu_client_class: tuple[type, bool] | None = None
+_zhipu_import_lock = asyncio.Lock()
+
+# 同步流回退时，读取线程最多领先消费方的数据块数
+_SYNC_STREAM_BUFFER = 32
+
+
+def _import_zhipu_client_class() -> tuple[type, bool]:
+    """导入 zhipuai，优先异步客户端；新版 SDK 移除了 AsyncZhipuAI 时回退到同步客户端"""
+    zhipuai = importlib.import_module("zhipuai")
+    async_class = getattr(zhipuai, "AsyncZhipuAI", None)
+    if async_class is not None:
+        return async_class, True
+    sync_class = getattr(zhipuai, "ZhipuAI", None)
+    if sync_class is None:
+        raise ImportError("cannot import name 'ZhipuAI' from 'zhipuai'")
+    return sync_class, False
+
+
+async def _get_zhipu_client_class() -> tuple[type, bool]:
+    """在线程中完成 SDK 导入，避免阻塞事件循环；并发的首次调用只导入一次"""
+    global _zhipu_client_class
+    if _zhipu_client_class is None:
+        async with _zhipu_import_lock:
+            if _zhipu_client_class is None:
+                _zhipu_client_class = await asyncio.to_thread(_import_zhipu_client_class)
+    return _zhipu_client_class
 
 
 @register_provider("zhipu")
@@ -20,40 +52,36 @@ class ZhipuProvider(BaseLLMProvider):
         super().__init__(config)
         self._async_client = None
         self._client_init_error = None
+        # 客户端的 create 是否为协程函数，创建客户端时判断一次
+        self._create_is_coro = False
+        # (原消息列表, 长度, 转换结果)，同一请求重试或先后调用生成/流式时复用
+        self._convert_cache: tuple[list, int, list[dict[str, Any]]] | None = None
 
     async def _get_async_client(self):
         """获取客户端，优先异步实现，回退到同步实现"""
         if self._async_client is None:
             try:
-                from zhipuai import AsyncZhipuAI
-
-                self._async_client = AsyncZhipuAI(
-                    api_key=self.api_key,
-                    base_url=self.base_url if self.base_url else None,
-                )
-            except ImportError as async_import_error:
-                try:
-                    from zhipuai import ZhipuAI
-
-                    self._async_client = ZhipuAI(
-                        api_key=self.api_key,
-                        base_url=self.base_url if self.base_url else None,
-                    )
-                    # 新版 zhipuai 移除了 AsyncZhipuAI，使用同步客户端回退
-                    self._logger.debug(
-                        f"AsyncZhipuAI unavailable, fallback to ZhipuAI: {async_import_error}"
-                    )
-                except ImportError as sync_import_error:
-                    self._client_init_error = sync_import_error
-                    self._logger.warning(
-                        f"ZhipuAI package import failed: {sync_import_error}"
-                    )
+                client_class, is_async = await _get_zhipu_client_class()
+            except ImportError as import_error:
+                self._client_init_error = import_error
+                self._logger.warning(f"ZhipuAI package import failed: {import_error}")
+                return None
+            if not is_async:
+                # 新版 zhipuai 移除了 AsyncZhipuAI，使用同步客户端回退
+                self._logger.debug("AsyncZhipuAI unavailable, fallback to ZhipuAI")
+            self._async_client = client_class(
+                api_key=self.api_key,
+                base_url=self.base_url if self.base_url else None,
+            )
+            self._create_is_coro = asyncio.iscoroutinefunction(
+                self._async_client.chat.completions.create
+            )
         return self._async_client
 
     async def _create_completion(self, client, params: dict[str, Any]):
         """统一调用 create，兼容同步/异步客户端"""
         create_fn = client.chat.completions.create
-        if asyncio.iscoroutinefunction(create_fn):
+        if self._create_is_coro:
             return await create_fn(**params)
         return await asyncio.to_thread(create_fn, **params)
 
@@ -74,6 +102,7 @@ class ZhipuProvider(BaseLLMProvider):
         messages = self._convert_messages(request.messages)
 
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
@@ -85,11 +114,7 @@ class ZhipuProvider(BaseLLMProvider):
 
             return AIResponse(
                 content=response.choices[0].message.content or "",
-                usage=UsageInfo(
-                    prompt_tokens=response.usage.prompt_tokens,
-                    completion_tokens=response.usage.completion_tokens,
-                    total_tokens=response.usage.total_tokens,
-                ),
+                usage=self._parse_openai_usage(response.usage),
                 model=response.model,
                 finish_reason=response.choices[0].finish_reason,
             )
@@ -97,7 +122,7 @@ class ZhipuProvider(BaseLLMProvider):
             self._logger.error(f"Zhipu API error: {e}")
             raise
 
-    async def stream_generate(self, request: AIRequest) -> AsyncIterator[str]:
+    async def stream_generate(self, request: AIRequest) -> AsyncIterator[StreamChunk]:
         """流式生成"""
         client = await self._get_async_client()
         if client is None:
@@ -106,6 +131,7 @@ class ZhipuProvider(BaseLLMProvider):
         messages = self._convert_messages(request.messages)
 
         params = {
+            **request._provider_kwargs,
             "model": request.model,
             "messages": messages,
             "temperature": request.temperature,
@@ -116,45 +142,73 @@ class ZhipuProvider(BaseLLMProvider):
         try:
             stream = await self._create_completion(client, params)
 
-            if hasattr(stream, "__aiter__"):
-                async for chunk in stream:
-                    if chunk.choices[0].delta.content:
-                        yield chunk.choices[0].delta.content
-                return
-
-            iterator = iter(stream)
-            sentinel = object()
+            if not hasattr(stream, "__aiter__"):
+                stream = self._iter_sync_stream(stream)
 
-            def _next_chunk():
-                # 避免 StopIteration 直接进入 Future 引发异常
-                return next(iterator, sentinel)
-            while True:
-                chunk = await asyncio.to_thread(_next_chunk)
-                if chunk is sentinel:
-                    break
-                if chunk.choices[0].delta.content:
-                    yield chunk.choices[0].delta.content
+            # 智谱在最后一个数据块中返回usage，与OpenAI协议一致
+            async for chunk in self._iter_openai_stream(stream):
+                yield chunk
         except Exception as e:
             self._logger.error(f"Zhipu streaming error: {e}")
             raise
 
-    def count_tokens(self, text: str) -> int:
-        """计算Token数"""
-        # 估算
-        return len(text) // 4
+    @staticmethod
+    async def _iter_sync_stream(stream):
+        """由单个后台线程读取同步流并投递到队列，避免每个数据块一次线程池往返"""
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        # 消费过慢时读取线程阻塞，限制缓冲的数据块数量
+        slots = threading.Semaphore(_SYNC_STREAM_BUFFER)
+        stopped = threading.Event()
+        done = object()
+
+        def _pump():
+            try:
+                for chunk in stream:
+                    slots.acquire()
+                    if stopped.is_set():
+                        return
+                    loop.call_soon_threadsafe(queue.put_nowait, chunk)
+                item = done
+            except BaseException as e:
+                # 读取异常交给消费方抛出
+                item = e
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # 事件循环已关闭
+                pass
+
+        threading.Thread(target=_pump, daemon=True).start()
+        try:
+            while True:
+                item = await queue.get()
+                if item is done:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                slots.release()
+                yield item
+        finally:
+            # 提前结束时通知读取线程退出
+            stopped.set()
+            slots.release()
+
+    # 估算Token数，直接绑定模块级函数
+    count_tokens = staticmethod(estimate_tokens)
 
     def _convert_messages(self, messages: list[Message]) -> list[dict[str, Any]]:
         """转换消息格式"""
-        result = []
-        for msg in messages:
-            role = msg.role.value if hasattr(msg.role, "value") else msg.role
-            result.append(
-                {
-                    "role": role,
-                    "content": msg.content,
-                }
-            )
-        return result
+        cached = self._convert_cache
+        # 持有原列表引用，按身份比较，避免列表回收后 id 被复用误命中
+        if cached is not None and cached[0] is messages and cached[1] == len(messages):
+            return cached[2]
+        converted = [
+            {"role": ROLE_VALUES.get(msg.role, msg.role), "content": msg.content}
+            for msg in messages
+        ]
+        self._convert_cache = (messages, len(messages), converted)
+        return converted
 
     def get_provider_name(self) -> str:
         """获取供应商名称"""
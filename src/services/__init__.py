@@ -4,8 +4,10 @@ from src.services.logging_service import (
     SimpleLogger,
     LoggingService,
     LangfuseConfig,
+    iso_ts,
 )
 from src.services.token_service import (
+    CachedTokenCounter,
     TokenCounter,
     TokenConfig,
     MODEL_PRICING,
@@ -24,7 +26,9 @@ __all__ = [
     "SimpleLogger",
     "LoggingService",
     "LangfuseConfig",
+    "iso_ts",
     # Token
+    "CachedTokenCounter",
     "TokenCounter",
     "TokenConfig",
     "MODEL_PRICING",
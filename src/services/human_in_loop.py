@@ -1,11 +1,14 @@
 # 人在回路服务
 # Human-in-the-Loop 服务
 
-from typing import Any, Callable, Dict, List, Optional
+from typing import Any, Callable, Dict, FrozenSet, List, NamedTuple, Optional
+from collections import OrderedDict
 from dataclasses import dataclass
 from enum import Enum
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 import asyncio
+import itertools
+import secrets
 
 
 class HumanAction(Enum):
@@ -35,9 +38,30 @@ class HumanReview:
 class HumanInLoop:
     """人在回路服务"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        max_pending: int = 10000,
+        max_recent: int = 1024,
+        review_ttl: float = 3600.0
+    ):
+        """
+        Args:
+            max_pending: 待处理审查上限，超出时拒绝新请求
+            max_recent: 保留供 get_review 查询的已完成审查数量
+            review_ttl: 待处理审查的最长保留时间（秒），过期后清理
+        """
         self._pending_reviews: Dict[str, HumanReview] = {}
         self._callbacks: Dict[str, Callable] = {}
+        # 每个审查一个事件，提交或取消时唤醒等待方
+        self._events: Dict[str, asyncio.Event] = {}
+        # 最近完成的审查，LRU淘汰
+        self._recent: OrderedDict = OrderedDict()
+        self._max_pending = max_pending
+        self._max_recent = max_recent
+        self._review_ttl = timedelta(seconds=review_ttl)
+        # 审查ID = 实例随机前缀 + 自增序号，无需每次生成UUID且不会冲突
+        self._id_prefix = secrets.token_hex(4)
+        self._id_counter = itertools.count(1)
         self._enabled = True
     
     def enable(self):
@@ -61,15 +85,20 @@ class HumanInLoop:
         callback: Optional[Callable] = None
     ) -> HumanReview:
         """请求人工审查"""
-        import uuid
+        now = datetime.now(timezone.utc)
+        self._sweep_expired(now)
+        if len(self._pending_reviews) >= self._max_pending:
+            raise RuntimeError(
+                f"Too many pending reviews (max_pending={self._max_pending})"
+            )
         
         review = HumanReview(
-            review_id=str(uuid.uuid4())[:8],
+            review_id=f"{self._id_prefix}-{next(self._id_counter):08x}",
             agent_name=agent_name,
             task=task,
             current_output=current_output,
             context=context or {},
-            created_at=datetime.utcnow(),
+            created_at=now,
         )
         
         self._pending_reviews[review.review_id] = review
@@ -80,34 +109,60 @@ class HumanInLoop:
         # 模拟等待人工响应
         # 在实际实现中，这里会暂停执行并等待人工输入
         if self._enabled:
-            review = await self._wait_for_human(review)
+            # 只有需要等待时才创建唤醒事件
+            self._events[review.review_id] = asyncio.Event()
+            try:
+                review = await self._wait_for_human(review)
+            finally:
+                # 等待结束后结果已交给调用方，从待处理中移除
+                self._complete(review.review_id)
         
         return review
     
+    def _complete(self, review_id: str) -> None:
+        """移除已结束的审查，保留到最近完成列表"""
+        self._callbacks.pop(review_id, None)
+        self._events.pop(review_id, None)
+        review = self._pending_reviews.pop(review_id, None)
+        if review is None:
+            return
+        self._recent[review_id] = review
+        self._recent.move_to_end(review_id)
+        if len(self._recent) > self._max_recent:
+            self._recent.popitem(last=False)
+    
+    def _sweep_expired(self, now: datetime) -> None:
+        """清理超过保留时间的待处理审查（按创建顺序，遇到未过期即停止）"""
+        cutoff = now - self._review_ttl
+        expired = []
+        for review_id, review in self._pending_reviews.items():
+            if review.created_at > cutoff:
+                break
+            expired.append(review_id)
+        for review_id in expired:
+            self._notify(review_id)
+            self._complete(review_id)
+    
     async def _wait_for_human(self, review: HumanReview) -> HumanReview:
         """等待人工响应"""
         # 在实际系统中，这里会发送通知并等待
         # 简化版本：使用超时或模拟
         
         # 模拟：如果5秒内没有人工响应，自动继续
+        event = self._events.get(review.review_id)
         try:
-            await asyncio.wait_for(
-                self._check_for_response(review.review_id),
-                timeout=5.0
-            )
+            if event is not None:
+                await asyncio.wait_for(event.wait(), timeout=5.0)
         except asyncio.TimeoutError:
             # 超时：自动批准继续
             review.status = "approved"
             review.human_action = HumanAction.CONTINUE
             review.human_comment = "Timeout - auto approved"
+        finally:
+            self._events.pop(review.review_id, None)
         
         return review
     
-    async def _check_for_response(self, review_id: str):
-        """检查是否有响应"""
-        while review_id in self._pending_reviews:
-            await asyncio.sleep(0.5)
-    
     def submit_review(
         self,
         review_id: str,
@@ -131,8 +186,15 @@ class HumanInLoop:
             callback(review)
             del self._callbacks[review_id]
         
+        self._notify(review_id)
         return True
     
+    def _notify(self, review_id: str) -> None:
+        """唤醒等待该审查的协程"""
+        event = self._events.get(review_id)
+        if event is not None:
+            event.set()
+    
     def approve(self, review_id: str, comment: Optional[str] = None) -> bool:
         """批准"""
         return self.submit_review(review_id, HumanAction.APPROVE, comment)
@@ -164,7 +226,10 @@ class HumanInLoop:
     
     def get_review(self, review_id: str) -> Optional[HumanReview]:
         """获取审查详情"""
-        return self._pending_reviews.get(review_id)
+        review = self._pending_reviews.get(review_id)
+        if review is None:
+            review = self._recent.get(review_id)
+        return review
     
     def cancel_review(self, review_id: str) -> bool:
         """取消审查"""
@@ -172,6 +237,8 @@ class HumanInLoop:
             del self._pending_reviews[review_id]
             if review_id in self._callbacks:
                 del self._callbacks[review_id]
+            self._notify(review_id)
+            self._events.pop(review_id, None)
             return True
         return False
 
@@ -184,16 +251,38 @@ class ApprovalLevel(Enum):
     HIGH_RISK = 3
 
 
+class _RiskRule(NamedTuple):
+    """风险规则：按 priority 升序执行，缺少 required_keys 时跳过"""
+    priority: int
+    required_keys: FrozenSet[str]
+    rule: Callable[[Dict], ApprovalLevel]
+
+
 class ApprovalManager:
     """审批管理器 - 基于风险级别的审批流程"""
     
     def __init__(self, human_in_loop: Optional[HumanInLoop] = None):
         self.human_in_loop = human_in_loop or HumanInLoop()
-        self._risk_rules: List[Callable] = []
+        self._rules_sorted: List[_RiskRule] = []
     
-    def add_risk_rule(self, rule: Callable[[Dict], ApprovalLevel]):
-        """添加风险评估规则"""
-        self._risk_rules.append(rule)
+    def add_risk_rule(
+        self,
+        rule: Callable[[Dict], ApprovalLevel],
+        *,
+        priority: int = 0,
+        required_keys: FrozenSet[str] = frozenset()
+    ):
+        """
+        添加风险评估规则
+        
+        Args:
+            rule: 评估函数，返回风险级别
+            priority: 执行顺序，数值小的先执行（开销小的规则应设置较小值）
+            required_keys: 规则依赖的上下文键，缺少任一键时跳过该规则
+        """
+        self._rules_sorted.append(_RiskRule(priority, frozenset(required_keys), rule))
+        # 稳定排序，同优先级保持添加顺序
+        self._rules_sorted.sort(key=lambda r: r.priority)
     
     async def check_approval(
         self,
@@ -204,10 +293,15 @@ class ApprovalManager:
         """检查是否需要审批"""
         # 评估风险级别
         max_level = ApprovalLevel.NONE
-        for rule in self._risk_rules:
-            level = rule(context)
+        for r in self._rules_sorted:
+            if r.required_keys and not r.required_keys <= context.keys():
+                continue
+            level = r.rule(context)
             if level.value > max_level.value:
                 max_level = level
+                # 已是最高级别，后续规则不会改变结果
+                if level is ApprovalLevel.HIGH_RISK:
+                    break
         
         # 根据风险级别决定
         if max_level == ApprovalLevel.NONE:
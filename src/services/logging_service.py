@@ -2,13 +2,36 @@
 # 可观测性平台集成
 
 import asyncio
+import json
+import os
+import time
 from typing import Any, Dict, List, Optional
 from dataclasses import dataclass
-from datetime import datetime
+from datetime import datetime, timezone
+
+try:
+    import orjson as _json
+except ImportError:
+    _json = json
 
 from src.core.interfaces import ILoggingService, AIRequest, AIResponse
 
 
+if _json is json:
+    def _dumps_line(entry: Dict[str, Any]) -> bytes:
+        """序列化为一行JSON（bytes）"""
+        return (json.dumps(entry) + "\n").encode("utf-8")
+else:
+    def _dumps_line(entry: Dict[str, Any]) -> bytes:
+        """序列化为一行JSON（bytes），orjson直接输出bytes"""
+        return _json.dumps(entry, option=_json.OPT_APPEND_NEWLINE)
+
+
+def iso_ts(ns: int) -> str:
+    """将日志中的 ts_ns（time.time_ns()）转换为ISO格式的UTC时间"""
+    return datetime.fromtimestamp(ns / 1e9, timezone.utc).isoformat()
+
+
 @dataclass
 class LangfuseConfig:
     """Langfuse配置"""
@@ -59,7 +82,8 @@ class LangfuseLogger(ILoggingService):
             return
         
         try:
-            generation = self._client.generation(
+            # 创建时直接带上结束时间，省去 generation.end() 的第二个事件
+            self._client.generation(
                 name=kwargs.get("name", "ai_call"),
                 input=self._format_messages(request.messages),
                 output=response.content,
@@ -72,11 +96,10 @@ class LangfuseLogger(ILoggingService):
                         "total": response.usage.total_tokens,
                     },
                     "finish_reason": response.finish_reason,
-                }
+                },
+                end_time=datetime.now(timezone.utc),
             )
             
-            generation.end()
-            
         except Exception as e:
             print(f"Langfuse logging error: {e}")
     
@@ -120,8 +143,132 @@ class LangfuseLogger(ILoggingService):
 class SimpleLogger(ILoggingService):
     """简单日志服务 - 不依赖Langfuse"""
     
+    # 单次写入合并的最大条目数
+    MAX_BATCH = 256
+    # 统计扫描时每次读取的字节数
+    READ_CHUNK = 1 << 20
+    
     def __init__(self, log_file: str = "ai_calls.log"):
         self.log_file = log_file
+        # 队列和写入任务在首次记录时创建，绑定到当前事件循环
+        self._queue: Optional[asyncio.Queue] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        # 后台写入失败的异常，在下一次 flush / 记录时抛出
+        self._write_error: Optional[BaseException] = None
+        # 增量统计：已扫描到的文件偏移，以及按秒聚合的 [调用数, Token数, 错误数]
+        self._last_offset = 0
+        self._buckets: Dict[int, List[int]] = {}
+        self._stats_lock = asyncio.Lock()
+    
+    async def _ensure_writer(self) -> asyncio.Queue:
+        """确保后台写入任务在运行"""
+        if self._drain_task is None or self._drain_task.done():
+            self._collect_drain_error()
+            self._queue = asyncio.Queue()
+            self._drain_task = asyncio.create_task(self._drain(self._queue))
+            # 让写入任务先进入循环，事件循环关闭时取消它也能写完剩余条目
+            await asyncio.sleep(0)
+        return self._queue
+    
+    async def _enqueue(self, log_entry: Dict[str, Any]) -> None:
+        """将日志条目放入写入队列"""
+        queue = await self._ensure_writer()
+        self._raise_write_error()
+        await queue.put(_dumps_line(log_entry))
+    
+    async def _drain(self, queue: asyncio.Queue) -> None:
+        """后台写入：批量取出队列中的条目，每批在线程中一次写入"""
+        # 无缓冲二进制模式，每批对应一次 write 系统调用
+        with open(self.log_file, "ab", buffering=0) as f:
+            loop = asyncio.get_running_loop()
+            batch: List[bytes] = []
+            writing = None
+            try:
+                while True:
+                    batch = [await queue.get()]
+                    while len(batch) < self.MAX_BATCH and not queue.empty():
+                        batch.append(queue.get_nowait())
+                    # 用 run_in_executor 的 Future 而非 Task，事件循环关闭时不会被一并取消
+                    writing = loop.run_in_executor(None, f.write, b"".join(batch))
+                    try:
+                        # shield：取消时不中断正在进行的写入
+                        await asyncio.shield(writing)
+                    except Exception as e:
+                        # 写入失败不终止任务，记录异常并继续处理后续条目
+                        self._write_error = e
+                    writing = None
+                    self._task_done(queue, batch)
+            except asyncio.CancelledError:
+                if writing is not None:
+                    try:
+                        await writing
+                    except Exception as e:
+                        self._write_error = e
+                    self._task_done(queue, batch)
+                # 取消时写完队列中剩余的条目
+                batch = []
+                while not queue.empty():
+                    batch.append(queue.get_nowait())
+                try:
+                    if batch:
+                        f.write(b"".join(batch))
+                except Exception as e:
+                    self._write_error = e
+                finally:
+                    self._task_done(queue, batch)
+                raise
+    
+    @staticmethod
+    def _task_done(queue: asyncio.Queue, batch: List[bytes]) -> None:
+        for _ in batch:
+            queue.task_done()
+    
+    def _collect_drain_error(self) -> None:
+        """写入任务异常退出（如无法打开日志文件）时取出其异常"""
+        task = self._drain_task
+        if task is not None and task.done() and not task.cancelled():
+            if task.exception() is not None:
+                self._write_error = task.exception()
+            self._drain_task = None
+            self._queue = None
+    
+    def _raise_write_error(self) -> None:
+        """抛出并清除记录的写入异常"""
+        error, self._write_error = self._write_error, None
+        if error is not None:
+            raise error
+    
+    async def flush(self) -> None:
+        """
+        等待队列中的日志全部写入文件
+        
+        Raises:
+            OSError: 后台写入失败
+        """
+        task, queue = self._drain_task, self._queue
+        if task is not None and queue is not None and not task.done():
+            # 同时等待写入任务，任务异常退出时不会永远阻塞在 join 上
+            joined = asyncio.ensure_future(queue.join())
+            try:
+                await asyncio.wait((joined, task), return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                joined.cancel()
+        self._collect_drain_error()
+        self._raise_write_error()
+    
+    async def close(self) -> None:
+        """写完剩余日志并停止后台写入任务"""
+        try:
+            await self.flush()
+        finally:
+            if self._drain_task is not None:
+                self._drain_task.cancel()
+                try:
+                    await self._drain_task
+                except asyncio.CancelledError:
+                    pass
+                self._drain_task = None
+                self._queue = None
     
     async def log_call(
         self,
@@ -131,7 +278,7 @@ class SimpleLogger(ILoggingService):
     ) -> None:
         """记录API调用到文件"""
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "ts_ns": time.time_ns(),
             "model": request.model,
             "tokens": {
                 "prompt": response.usage.prompt_tokens,
@@ -142,42 +289,88 @@ class SimpleLogger(ILoggingService):
             "output": response.content[:200] + "...",
         }
         
-        with open(self.log_file, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        await self._enqueue(log_entry)
     
     async def log_error(self, error: Exception, context: Dict[str, Any]) -> None:
         """记录错误"""
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat(),
+            "ts_ns": time.time_ns(),
             "type": "error",
             "error": str(error),
             "context": context,
         }
         
-        with open(self.log_file, "a") as f:
-            f.write(json.dumps(log_entry) + "\n")
+        await self._enqueue(log_entry)
     
     async def get_stats(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
         """从日志文件获取统计"""
+        await self.flush()
+        async with self._stats_lock:
+            # 在线程中只解析上次之后新增的日志，不阻塞事件循环
+            await asyncio.to_thread(self._scan_log)
+        
+        start = self._epoch_second(start_time)
+        end = self._epoch_second(end_time)
         stats = {
             "total_calls": 0,
             "total_tokens": 0,
             "errors": 0,
         }
+        for second, (calls, tokens, errors) in self._buckets.items():
+            if start <= second <= end:
+                stats["total_calls"] += calls
+                stats["total_tokens"] += tokens
+                stats["errors"] += errors
         
+        return stats
+    
+    @staticmethod
+    def _epoch_second(value: datetime) -> int:
+        """转换为Unix时间戳（秒），无时区的时间按UTC处理"""
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=timezone.utc)
+        return int(value.timestamp())
+    
+    def _scan_log(self) -> None:
+        """从上次的偏移处增量解析日志文件，累加到按秒聚合的统计中"""
         try:
-            with open(self.log_file, "r") as f:
-                for line in f:
-                    entry = json.loads(line)
-                    if entry.get("type") == "error":
-                        stats["errors"] += 1
-                    else:
-                        stats["total_calls"] += 1
-                        stats["total_tokens"] += entry.get("tokens", {}).get("total", 0)
+            size = os.path.getsize(self.log_file)
         except FileNotFoundError:
-            pass
+            return
+        if size < self._last_offset:
+            # 文件被截断或轮转，重新统计
+            self._last_offset = 0
+            self._buckets.clear()
         
-        return stats
+        buckets = self._buckets
+        with open(self.log_file, "rb") as f:
+            f.seek(self._last_offset)
+            while True:
+                lines = f.readlines(self.READ_CHUNK)
+                if not lines:
+                    break
+                if not lines[-1].endswith(b"\n"):
+                    # 末行尚未写完，留到下次扫描
+                    lines.pop()
+                    if not lines:
+                        break
+                for line in lines:
+                    self._last_offset += len(line)
+                    entry = _json.loads(line)
+                    ts_ns = entry.get("ts_ns")
+                    if ts_ns is not None:
+                        second = ts_ns // 1_000_000_000
+                    else:
+                        # 兼容旧格式的ISO时间戳
+                        second = self._epoch_second(datetime.fromisoformat(entry["timestamp"]))
+                    bucket = buckets.get(second)
+                    if bucket is None:
+                        bucket = buckets[second] = [0, 0, 0]
+                    if entry.get("type") == "error":
+                        bucket[2] += 1
+                    else:
+                        bucket[0] += 1
+                        bucket[1] += entry.get("tokens", {}).get("total", 0)
     
     def _format_messages(self, messages: List) -> str:
         """格式化消息"""
@@ -187,22 +380,66 @@ class SimpleLogger(ILoggingService):
         ])
 
 
+class _NullLogger(ILoggingService):
+    """空日志服务 - 未启用任何日志后端时使用，所有操作为空操作"""
+    
+    async def log_call(
+        self,
+        request: AIRequest,
+        response: AIResponse,
+        **kwargs
+    ) -> None:
+        pass
+    
+    async def log_error(self, error: Exception, context: Dict[str, Any]) -> None:
+        pass
+    
+    async def get_stats(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
+        return {}
+    
+    async def flush(self) -> None:
+        pass
+
+
 class LoggingService:
-    """日志服务管理器"""
+    """
+    日志服务管理器
     
-    def __init__(self, config: Optional[LangfuseConfig] = None):
-        self._logger = None
+    初始化后 `_logger` 总是一个可用的日志后端（Langfuse、文件日志或空实现），
+    `log_call`/`log_error` 直接绑定到后端方法，调用时无需判空和转发。
+    """
+    
+    def __init__(
+        self,
+        config: Optional[LangfuseConfig] = None,
+        log_file: Optional[str] = None
+    ):
+        """
+        Args:
+            config: Langfuse配置
+            log_file: Langfuse不可用时回退写入的日志文件，为None时不记录
+        """
         self._config = config
+        self._log_file = log_file
+        self._use(_NullLogger())
+    
+    def _use(self, logger: ILoggingService) -> None:
+        """切换日志后端并绑定热路径方法"""
+        self._logger = logger
+        self.log_call = logger.log_call
+        self.log_error = logger.log_error
     
     async def initialize(self) -> bool:
         """初始化日志服务"""
         # 尝试使用Langfuse
-        self._logger = LangfuseLogger(self._config)
-        success = await self._logger.initialize()
-        
-        if not success:
+        logger = LangfuseLogger(self._config)
+        if await logger.initialize():
+            self._use(logger)
+        elif self._log_file:
             # 回退到简单日志
-            self._logger = SimpleLogger()
+            self._use(SimpleLogger(self._log_file))
+        else:
+            self._use(_NullLogger())
         
         return True
     
@@ -213,19 +450,16 @@ class LoggingService:
         **kwargs
     ) -> None:
         """记录API调用"""
-        if self._logger:
-            await self._logger.log_call(request, response, **kwargs)
+        await self._logger.log_call(request, response, **kwargs)
     
     async def log_error(self, error: Exception, context: Dict[str, Any]) -> None:
         """记录错误"""
-        if self._logger:
-            await self._logger.log_error(error, context)
+        await self._logger.log_error(error, context)
     
     async def get_stats(self, start_time: datetime, end_time: datetime) -> Dict[str, Any]:
         """获取统计"""
-        if self._logger:
-            return await self._logger.get_stats(start_time, end_time)
-        return {}
-
-
-import json
+        return await self._logger.get_stats(start_time, end_time)
+    
+    async def flush(self) -> None:
+        """刷新日志"""
+        await self._logger.flush()
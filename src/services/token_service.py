@@ -1,35 +1,131 @@
 # Token计数服务
 
-from typing import Dict, Any, List, Optional
+import os
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
 from dataclasses import dataclass
 
 from src.core.interfaces import ITokenCounter, Message
 
 
+@lru_cache(maxsize=4)
+def _encoding_for(name: str):
+    """获取并缓存tiktoken编码器，不可用时返回None"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(name)
+    except ImportError:
+        return None
+
+
+# encode_batch 使用的编码线程数
+_BATCH_THREADS = min(8, os.cpu_count() or 1)
+
+
+# 定价常量（每1K Token美元价格）
+_RAW_MODEL_PRICING = {
+    "gpt-4": {"prompt": 0.03, "completion": 0.06},
+    "gpt-4o": {"prompt": 0.005, "completion": 0.015},
+    "gpt-4o-mini": {"prompt": 0.00015, "completion": 0.0006},
+    "gpt-3.5-turbo": {"prompt": 0.001, "completion": 0.002},
+    "gpt-3.5-turbo-16k": {"prompt": 0.003, "completion": 0.004},
+    "claude-3-opus-20240229": {"prompt": 0.015, "completion": 0.075},
+    "claude-3-sonnet-20240229": {"prompt": 0.003, "completion": 0.015},
+    "claude-3-haiku-20240307": {"prompt": 0.00025, "completion": 0.00125},
+    "claude-3-opus": {"prompt": 0.015, "completion": 0.075},
+    "claude-3-sonnet": {"prompt": 0.003, "completion": 0.015},
+    "gemini-1.5-pro": {"prompt": 0.00035, "completion": 0.00105},
+    "gemini-1.5-flash": {"prompt": 0.000035, "completion": 0.000105},
+    "gemini-pro": {"prompt": 0.0005, "completion": 0.0015},
+    "deepseek-chat": {"prompt": 0.00014, "completion": 0.00028},
+    "glm-4-plus": {"prompt": 0.001, "completion": 0.001},
+}
+
+# 键预先转为小写，查询时只需对模型名做一次 lower()
+MODEL_PRICING = {name.lower(): price for name, price in _RAW_MODEL_PRICING.items()}
+
+_DEFAULT_PRICING = MODEL_PRICING["gpt-3.5-turbo"]
+
+
 @dataclass
 class TokenConfig:
     """Token配置"""
     default_encoding: str = "cl100k_base"  # GPT-4 encoding
 
 
-class TokenCounter(ITokenCounter):
+class CachedTokenCounter(ITokenCounter, ABC):
+    """
+    带缓存的Token计数基类
+    
+    系统提示、few-shot 示例等固定前缀每轮都会重复计数，
+    按文本哈希缓存计数结果，避免重复分词。
+    子类实现 `_count_uncached` 与 `_count_messages_uncached`。
+    """
+    
+    cache_size: int = 4096
+    
+    def __init__(self):
+        self._count_cache: OrderedDict = OrderedDict()
+    
+    def _cache_lookup(self, key: int, compute, *args) -> int:
+        """LRU缓存查询，未命中时计算并写入"""
+        cache = self._count_cache
+        cached = cache.get(key)
+        if cached is not None:
+            cache.move_to_end(key)
+            return cached
+        
+        result = compute(*args)
+        self._cache_store(key, result)
+        return result
+    
+    def _cache_store(self, key: int, value: int) -> None:
+        """写入缓存并淘汰最久未使用的条目"""
+        cache = self._count_cache
+        cache[key] = value
+        if len(cache) > self.cache_size:
+            cache.popitem(last=False)
+    
+    def count(self, text: str) -> int:
+        """计算文本Token数（带缓存）"""
+        return self._cache_lookup(hash(("text", text)), self._count_uncached, text)
+    
+    def count_messages(self, messages: List[Message]) -> int:
+        """计算消息列表Token数（带缓存）"""
+        key = hash(("messages", tuple((m.role, m.content) for m in messages)))
+        return self._cache_lookup(key, self._count_messages_uncached, messages)
+    
+    def clear_cache(self) -> None:
+        """清空计数缓存"""
+        self._count_cache.clear()
+    
+    @abstractmethod
+    def _count_uncached(self, text: str) -> int:
+        """实际计算文本Token数"""
+        pass
+    
+    @abstractmethod
+    def _count_messages_uncached(self, messages: List[Message]) -> int:
+        """实际计算消息列表Token数"""
+        pass
+
+
+class TokenCounter(CachedTokenCounter):
     """Token计数服务"""
     
     def __init__(self, config: Optional[TokenConfig] = None):
+        super().__init__()
         self.config = config or TokenConfig()
-        self._encoding = None
+        # 角色前缀 "role: " 的Token数，每种角色只编码一次
+        self._role_prefix_tokens: Dict[Any, int] = {}
     
     def _get_encoding(self):
         """获取编码器"""
-        if self._encoding is None:
-            try:
-                import tiktoken
-                self._encoding = tiktoken.get_encoding(self.config.default_encoding)
-            except ImportError:
-                self._encoding = None
-        return self._encoding
+        return _encoding_for(self.config.default_encoding)
     
-    def count(self, text: str) -> int:
+    def _count_uncached(self, text: str) -> int:
         """计算文本Token数"""
         encoding = self._get_encoding()
         
@@ -39,23 +135,25 @@ class TokenCounter(ITokenCounter):
         # 估算: 平均1 token ≈ 4字符
         return max(1, len(text) // 4)
     
-    def count_messages(self, messages: List[Message]) -> int:
+    def _count_messages_uncached(self, messages: List[Message]) -> int:
         """计算消息列表Token数"""
         encoding = self._get_encoding()
         
         total = 0
         
+        if encoding:
+            prefix_tokens = self._role_prefix_tokens
+            for msg in messages:
+                role = msg.role
+                prefix = prefix_tokens.get(role)
+                if prefix is None:
+                    prefix = prefix_tokens[role] = len(encoding.encode(f"{role}: "))
+                # 前缀已缓存，只编码消息内容；4为role标记 + 内容分隔符的固定开销
+                total += prefix + len(encoding.encode(msg.content)) + 4
+            return total
+        
         for msg in messages:
-            # 格式化消息内容
-            content = f"{msg.role}: {msg.content}"
-            
-            if encoding:
-                total += len(encoding.encode(content))
-            else:
-                total += self.count(content)
-            
-            # 添加每条消息的固定开销
-            total += 4  # role标记 + 内容分隔符
+            total += self.count(f"{msg.role}: {msg.content}") + 4
         
         return total
     
@@ -66,24 +164,27 @@ class TokenCounter(ITokenCounter):
         model: str
     ) -> float:
         """估算成本（基于常见定价）"""
-        pricing = {
-            "gpt-4": {"prompt": 0.03, "completion": 0.06},
-            "gpt-4o": {"prompt": 0.005, "completion": 0.015},
-            "gpt-3.5-turbo": {"prompt": 0.001, "completion": 0.002},
-            "claude-3-opus": {"prompt": 0.015, "completion": 0.075},
-            "claude-3-sonnet": {"prompt": 0.003, "completion": 0.015},
-            "gemini-pro": {"prompt": 0.0005, "completion": 0.0015},
-            "deepseek-chat": {"prompt": 0.00014, "completion": 0.00028},
-        }
-        
-        # 获取模型定价
-        model_pricing = pricing.get(model.lower(), pricing["gpt-3.5-turbo"])
+        # 获取模型定价，未知模型按 gpt-3.5-turbo 计价
+        model_pricing = MODEL_PRICING.get(model.lower(), _DEFAULT_PRICING)
         
         prompt_cost = prompt_tokens / 1000 * model_pricing["prompt"]
         completion_cost = completion_tokens / 1000 * model_pricing["completion"]
         
         return prompt_cost + completion_cost
     
+    def estimate_cost_batch(self, rows: List[Tuple[int, int, str]]) -> List[float]:
+        """批量估算成本，rows 为 (prompt_tokens, completion_tokens, model) 列表"""
+        pricing = MODEL_PRICING
+        default = _DEFAULT_PRICING
+        costs = []
+        for prompt_tokens, completion_tokens, model in rows:
+            model_pricing = pricing.get(model.lower(), default)
+            costs.append(
+                prompt_tokens / 1000 * model_pricing["prompt"]
+                + completion_tokens / 1000 * model_pricing["completion"]
+            )
+        return costs
+    
     def truncate_text(self, text: str, max_tokens: int) -> str:
         """截断文本以符合Token限制"""
         encoding = self._get_encoding()
@@ -102,24 +203,33 @@ class TokenCounter(ITokenCounter):
     
     def count_batch(self, texts: List[str]) -> List[int]:
         """批量计算Token数"""
-        return [self.count(text) for text in texts]
-
-
-# 定价常量
-MODEL_PRICING = {
-    "gpt-4": {"prompt": 0.03, "completion": 0.06},
-    "gpt-4o": {"prompt": 0.005, "completion": 0.015},
-    "gpt-4o-mini": {"prompt": 0.00015, "completion": 0.0006},
-    "gpt-3.5-turbo": {"prompt": 0.001, "completion": 0.002},
-    "gpt-3.5-turbo-16k": {"prompt": 0.003, "completion": 0.004},
-    "claude-3-opus-20240229": {"prompt": 0.015, "completion": 0.075},
-    "claude-3-sonnet-20240229": {"prompt": 0.003, "completion": 0.015},
-    "claude-3-haiku-20240307": {"prompt": 0.00025, "completion": 0.00125},
-    "gemini-1.5-pro": {"prompt": 0.00035, "completion": 0.00105},
-    "gemini-1.5-flash": {"prompt": 0.000035, "completion": 0.000105},
-    "deepseek-chat": {"prompt": 0.00014, "completion": 0.00028},
-    "glm-4-plus": {"prompt": 0.001, "completion": 0.001},
-}
-
-
-from typing import Optional
+        encoding = self._get_encoding()
+        if not encoding:
+            # 估算比查缓存更快，直接计算
+            return [max(1, len(text) // 4) for text in texts]
+        
+        # 命中缓存的直接返回，其余通过 encode_batch 一次性编码
+        cache = self._count_cache
+        results: List[Optional[int]] = []
+        missing: Dict[str, List[int]] = {}
+        for i, text in enumerate(texts):
+            key = hash(("text", text))
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+                results.append(cached)
+            else:
+                results.append(None)
+                missing.setdefault(text, []).append(i)
+        
+        if missing:
+            pending = list(missing)
+            # encode_batch 在Rust线程池中并行编码，一次调用处理全部文本
+            encoded = encoding.encode_batch(pending, num_threads=_BATCH_THREADS)
+            for text, tokens in zip(pending, encoded):
+                count = len(tokens)
+                self._cache_store(hash(("text", text)), count)
+                for i in missing[text]:
+                    results[i] = count
+        
+        return results
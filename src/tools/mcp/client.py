@@ -3,7 +3,8 @@
 
 import asyncio
 import json
-from typing import Any, Dict, List, Optional
+import time
+from typing import Any, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
 from src.core.interfaces import IMCPClient
@@ -19,13 +20,25 @@ class MCPServerConfig:
 
 
 class MCPClient(IMCPClient):
-    """MCP客户端"""
+    """
+    MCP客户端
+    
+    每个客户端持有一个 aiohttp.ClientSession（首次调用时创建），
+    所有工具调用复用同一连接池，并通过信号量限制对该服务器的并发数。
+    """
+    
+    # 对单个服务器的最大并发调用数
+    MAX_CONCURRENT_CALLS = 10
     
     def __init__(self, config: Optional[MCPServerConfig] = None):
         self.config = config
         self._connected = False
+        # 工具索引只含名称与一行描述，完整schema按需获取并缓存
         self._tools: List[Dict[str, Any]] = []
+        self._schemas: Dict[str, Dict[str, Any]] = {}
         self._session = None
+        self._api_key: Optional[str] = None
+        self._semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_CALLS)
     
     async def connect(self, server_url: str, api_key: Optional[str] = None) -> bool:
         """连接MCP服务器"""
@@ -34,47 +47,102 @@ class MCPClient(IMCPClient):
             # 这里实现MCP WebSocket连接
             self._connected = True
             self._server_url = server_url
+            self._api_key = api_key
             
-            # 获取工具列表
-            self._tools = await self._fetch_tools()
+            # 只获取轻量的工具索引
+            self._tools = await self._fetch_tool_index()
             
             return True
         except Exception as e:
             print(f"MCP connection error: {e}")
             return False
     
-    async def _fetch_tools(self) -> List[Dict[str, Any]]:
-        """获取工具列表"""
-        # 从MCP服务器获取可用工具
+    async def _fetch_tool_index(self) -> List[Dict[str, Any]]:
+        """获取工具索引（名称与描述）"""
+        # 从MCP服务器获取可用工具名称
         return [
             {
                 "name": "example_tool",
                 "description": "Example tool from MCP server",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "input": {"type": "string"}
-                    }
-                }
             }
         ]
     
+    async def _fetch_tool_schema(self, tool_name: str) -> Dict[str, Any]:
+        """获取单个工具的完整定义"""
+        # 从MCP服务器获取工具参数定义
+        description = next(
+            (t["description"] for t in self._tools if t["name"] == tool_name), ""
+        )
+        return {
+            "name": tool_name,
+            "description": description,
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "input": {"type": "string"}
+                }
+            }
+        }
+    
+    async def _get_session(self):
+        """获取HTTP会话（aiohttp.ClientSession），首次使用时创建"""
+        if self._session is None or self._session.closed:
+            try:
+                import aiohttp
+            except ImportError:
+                raise ImportError("Please install aiohttp: pip install aiohttp")
+            headers = {"Authorization": f"Bearer {self._api_key}"} if self._api_key else None
+            self._session = aiohttp.ClientSession(
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=30),
+                connector=aiohttp.TCPConnector(limit=100, keepalive_timeout=60),
+            )
+        return self._session
+    
     async def disconnect(self) -> None:
         """断开连接"""
         self._connected = False
         self._tools = []
+        self._schemas.clear()
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
     
-    async def list_tools(self) -> List[Dict[str, Any]]:
-        """列出MCP服务器上的工具"""
+    def list_tool_names(self) -> List[Dict[str, Any]]:
+        """列出工具索引（不含参数定义）"""
         return self._tools
     
+    async def describe_tool(self, tool_name: str, refresh: bool = False) -> Dict[str, Any]:
+        """获取工具完整定义，首次访问时从服务器获取并缓存"""
+        schema = self._schemas.get(tool_name)
+        if schema is None or refresh:
+            schema = await self._fetch_tool_schema(tool_name)
+            self._schemas[tool_name] = schema
+        return schema
+    
+    async def list_tools(self) -> List[Dict[str, Any]]:
+        """列出MCP服务器上的工具（含完整定义）"""
+        return list(await asyncio.gather(
+            *(self.describe_tool(tool["name"]) for tool in self._tools)
+        ))
+    
     async def call_tool(self, tool_name: str, **params) -> Any:
         """调用MCP工具"""
         if not self._connected:
             raise ConnectionError("Not connected to MCP server")
         
-        # MCP工具调用
-        return {"result": f"Called {tool_name} with params: {params}"}
+        async with self._semaphore:
+            if self._server_url.startswith(("http://", "https://")):
+                session = await self._get_session()
+                async with session.post(
+                    f"{self._server_url.rstrip('/')}/tools/{tool_name}",
+                    json=params,
+                ) as response:
+                    response.raise_for_status()
+                    return await response.json()
+            
+            # MCP工具调用（WebSocket传输尚未实现，返回模拟结果）
+            return {"result": f"Called {tool_name} with params: {params}"}
     
     def is_connected(self) -> bool:
         """检查连接状态"""
@@ -92,9 +160,16 @@ class MCPClient(IMCPClient):
 class MCPClientManager:
     """MCP客户端管理器 - 管理多个MCP服务器连接"""
     
+    # 工具schema缓存有效期（秒），过期后先返回旧值并在后台刷新
+    SCHEMA_TTL = 300.0
+    # 批量添加服务器时的最大并发连接数
+    MAX_CONCURRENT_CONNECTS = 8
+    
     def __init__(self):
         self._clients: Dict[str, MCPClient] = {}
         self._tool_registry: Dict[str, Dict[str, Any]] = {}
+        # 进行中的schema获取任务，避免同一工具并发重复获取
+        self._schema_tasks: Dict[str, asyncio.Task] = {}
     
     async def add_server(self, config: MCPServerConfig) -> bool:
         """添加MCP服务器"""
@@ -106,15 +181,38 @@ class MCPClientManager:
         
         if success:
             self._clients[config.name] = client
-            # 注册工具
-            for tool in await client.list_tools():
+            # 注册工具索引，schema在首次使用时获取
+            for tool in client.list_tool_names():
                 self._tool_registry[tool["name"]] = {
-                    "tool": tool,
                     "server": config.name,
+                    "description": tool.get("description", ""),
+                    "schema": None,
+                    "fetched_at": 0.0,
                 }
         
         return success
     
+    async def add_servers(self, configs: List[MCPServerConfig]) -> List[Any]:
+        """
+        并发添加多个MCP服务器
+        
+        Args:
+            configs: 服务器配置列表
+            
+        Returns:
+            与 configs 顺序一致的结果列表（是否成功，或连接时抛出的异常）
+        """
+        semaphore = asyncio.Semaphore(self.MAX_CONCURRENT_CONNECTS)
+        
+        async def _add(config: MCPServerConfig) -> bool:
+            async with semaphore:
+                return await self.add_server(config)
+        
+        return await asyncio.gather(
+            *(_add(config) for config in configs),
+            return_exceptions=True,
+        )
+    
     async def remove_server(self, name: str) -> bool:
         """移除MCP服务器"""
         if name in self._clients:
@@ -142,17 +240,96 @@ class MCPClientManager:
         
         return await client.call_tool(tool_name, **params)
     
+    async def call_tools_batch(
+        self,
+        calls: List[Tuple[str, Dict[str, Any]]]
+    ) -> List[Any]:
+        """
+        并发调用多个工具
+        
+        Args:
+            calls: (工具名, 参数) 列表
+            
+        Returns:
+            与 calls 顺序一致的结果列表，调用失败的位置为对应异常
+        """
+        return await asyncio.gather(
+            *(self.call_tool(tool_name, **params) for tool_name, params in calls),
+            return_exceptions=True,
+        )
+    
+    async def _resolve_schema(self, tool_name: str) -> Dict[str, Any]:
+        """获取工具schema：首次访问时获取，过期时返回旧值并后台刷新"""
+        entry = self._tool_registry.get(tool_name)
+        if entry is None:
+            raise ValueError(f"Unknown tool: {tool_name}")
+        
+        task = self._schema_tasks.get(tool_name)
+        if entry["schema"] is None:
+            if task is None:
+                task = self._start_schema_fetch(tool_name, entry)
+            return await task
+        
+        if task is None and time.monotonic() - entry["fetched_at"] > self.SCHEMA_TTL:
+            self._start_schema_fetch(tool_name, entry, refresh=True)
+        return entry["schema"]
+    
+    def _start_schema_fetch(
+        self,
+        tool_name: str,
+        entry: Dict[str, Any],
+        refresh: bool = False
+    ) -> asyncio.Task:
+        """启动schema获取任务，完成后从进行中列表移除"""
+        task = asyncio.create_task(self._fetch_schema(tool_name, entry, refresh))
+        self._schema_tasks[tool_name] = task
+        task.add_done_callback(lambda _: self._schema_tasks.pop(tool_name, None))
+        return task
+    
+    async def _fetch_schema(
+        self,
+        tool_name: str,
+        entry: Dict[str, Any],
+        refresh: bool
+    ) -> Optional[Dict[str, Any]]:
+        """从所属服务器获取schema并写入注册表"""
+        client = self._clients[entry["server"]]
+        try:
+            schema = await client.describe_tool(tool_name, refresh=refresh)
+        except Exception as e:
+            if not refresh:
+                raise
+            # 后台刷新失败时保留旧schema
+            print(f"MCP schema refresh error: {e}")
+            return entry["schema"]
+        entry["schema"] = schema
+        entry["fetched_at"] = time.monotonic()
+        return schema
+    
     def list_all_tools(self) -> List[Dict[str, Any]]:
-        """列出所有工具"""
+        """列出所有工具（名称、描述与所属服务器）"""
         return [
             {
                 "name": name,
-                **tool_info["tool"],
+                "description": tool_info["description"],
                 "server": tool_info["server"],
             }
             for name, tool_info in self._tool_registry.items()
         ]
     
+    async def describe_all_tools(self) -> List[Dict[str, Any]]:
+        """列出所有工具的完整定义（并发获取未缓存的schema）"""
+        names = list(self._tool_registry)
+        schemas = await asyncio.gather(*(self._resolve_schema(name) for name in names))
+        return [
+            {
+                **schema,
+                "name": name,
+                "server": self._tool_registry[name]["server"],
+            }
+            for name, schema in zip(names, schemas)
+        ]
+    
     def list_servers(self) -> List[Dict[str, Any]]:
         """列出所有服务器"""
         return [
@@ -165,7 +342,8 @@ class MCPClientManager:
     
     async def disconnect_all(self) -> None:
         """断开所有连接"""
-        for client in self._clients.values():
-            await client.disconnect()
+        await asyncio.gather(*(client.disconnect() for client in self._clients.values()))
+        for task in self._schema_tasks.values():
+            task.cancel()
         self._clients.clear()
         self._tool_registry.clear()
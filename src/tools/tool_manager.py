@@ -17,16 +17,161 @@ AI Foundation - 工具管理模块
 - get_datetime: 日期时间
 """
 
+import ast
 import asyncio
 import inspect
-from typing import Any, Callable, Dict, List, Optional
-from dataclasses import dataclass
+import operator
+import os
+import threading
+from functools import lru_cache, partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from dataclasses import dataclass, field
 from abc import ABC, abstractmethod
 
 from src.core.interfaces import IToolManager
 
 
-@dataclass
+# Python类型注解到JSON Schema类型的映射
+_JSON_TYPES = {
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    list: "array",
+    dict: "object",
+    str: "string",
+}
+
+# file_reader 默认允许读取的最大字节数
+_MAX_READ_SIZE = 10 * 1024 * 1024
+
+# 推断参数时忽略的参数名
+_SKIP_PARAMS = frozenset(("self", "cls"))
+
+
+@lru_cache(maxsize=1024)
+def _cached_signature(func: Callable) -> inspect.Signature:
+    """缓存函数签名，重复注册同一函数时避免重新解析"""
+    return inspect.signature(func)
+
+
+@lru_cache(maxsize=256)
+def _cached_is_coro(func: Callable) -> bool:
+    """缓存异步函数判断，装饰器/partial包装较深时避免重复展开"""
+    return asyncio.iscoroutinefunction(func)
+
+
+def _is_coroutine_function(func: Callable) -> bool:
+    """判断是否为异步函数，不可哈希的可调用对象不缓存"""
+    try:
+        return _cached_is_coro(func)
+    except TypeError:
+        return asyncio.iscoroutinefunction(func)
+
+
+def _build_parameters(func: Callable) -> Dict[str, Any]:
+    """从函数签名生成JSON Schema格式的参数定义"""
+    try:
+        sig = _cached_signature(func)
+    except TypeError:
+        sig = inspect.signature(func)
+    parameters = {
+        "type": "object",
+        "properties": {},
+        "required": [],
+    }
+    
+    for param_name, param in sig.parameters.items():
+        # 跳过self和cls
+        if param_name in _SKIP_PARAMS:
+            continue
+        
+        # 确定参数类型（无注解时为 Parameter.empty，同样回退到string）
+        param_info = {"type": _JSON_TYPES.get(param.annotation, "string")}
+        
+        # 添加描述（如果有默认值）
+        if param.default is not inspect.Parameter.empty:
+            param_info["description"] = str(param.default)
+        
+        parameters["properties"][param_name] = param_info
+        
+        # 必填参数
+        if param.default is inspect.Parameter.empty:
+            parameters["required"].append(param_name)
+    
+    return parameters
+
+
+@lru_cache(maxsize=1024)
+def _cached_infer(func: Callable) -> Dict[str, Any]:
+    """缓存推断出的参数定义（只读，返回前需复制）"""
+    return _build_parameters(func)
+
+
+# 计算器允许的运算符
+_CALC_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+_CALC_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+# 整数运算结果的位数上限（约4200位十进制数，不超过 int 转字符串的默认长度限制），
+# 防止 9**9**9、(10**10000)**2000 之类的表达式长时间占用CPU并阻塞事件循环
+_CALC_MAX_BITS = 14000
+
+
+def _check_result_size(op: ast.operator, left: Any, right: Any) -> None:
+    """在计算前估算整数乘方/乘法结果的位数，超过上限时拒绝"""
+    if type(left) is not int or type(right) is not int:
+        # 浮点运算耗时固定，溢出时直接抛出 OverflowError
+        return
+    if isinstance(op, ast.Pow):
+        bits = abs(left).bit_length() * right if right > 0 else 0
+    elif isinstance(op, ast.Mult):
+        bits = abs(left).bit_length() + abs(right).bit_length()
+    else:
+        return
+    if bits > _CALC_MAX_BITS:
+        raise ValueError("Result too large")
+
+
+def _eval_node(node: ast.AST) -> Any:
+    """递归计算表达式节点，只允许数字常量和算术运算"""
+    if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _CALC_BINARY_OPS:
+        left = _eval_node(node.left)
+        right = _eval_node(node.right)
+        _check_result_size(node.op, left, right)
+        return _CALC_BINARY_OPS[type(node.op)](left, right)
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _CALC_UNARY_OPS:
+        return _CALC_UNARY_OPS[type(node.op)](_eval_node(node.operand))
+    raise ValueError(f"Unsupported expression: {type(node).__name__}")
+
+
+@lru_cache(maxsize=4096)
+def _evaluate_expression(expression: str) -> Any:
+    """安全计算数学表达式，结果按表达式缓存"""
+    return _eval_node(ast.parse(expression, mode="eval").body)
+
+
+@lru_cache(maxsize=1)
+def _langchain_tool_class():
+    """导入并缓存LangChain的Tool类，未安装时返回None（只尝试一次）"""
+    try:
+        from langchain.agents import Tool
+        return Tool
+    except ImportError:
+        return None
+
+
+@dataclass(slots=True, frozen=True)
 class ToolInfo:
     """
     工具信息数据类
@@ -37,12 +182,25 @@ class ToolInfo:
         parameters: JSON Schema格式的参数定义
         function: 可调用的函数对象
         is_async: 是否为异步函数
+        definition: 函数调用格式的工具定义（注册时生成，只读）
     """
     name: str
     description: str
     parameters: Dict[str, Any]
     function: Callable
     is_async: bool = False
+    definition: Dict[str, Any] = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        # 工具信息注册后不变，定义只需构建一次
+        object.__setattr__(self, "definition", {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.description,
+                "parameters": self.parameters,
+            }
+        })
 
 
 class BaseTool(ABC):
@@ -97,7 +255,6 @@ class ToolManager(IToolManager):
     
     Attributes:
         _tools: 工具信息字典
-        _functions: 工具函数字典
         _langchain_tools: LangChain工具字典
     
     Example:
@@ -111,11 +268,21 @@ class ToolManager(IToolManager):
         >>> 3
     """
     
+    # 同步调用异步工具时使用的后台事件循环（进程内共享，首次使用时创建）
+    _bg_loop: Optional[asyncio.AbstractEventLoop] = None
+    _bg_thread: Optional[threading.Thread] = None
+    _bg_lock = threading.Lock()
+    
     def __init__(self):
         """初始化工具管理器"""
         self._tools: Dict[str, ToolInfo] = {}
-        self._functions: Dict[str, Callable] = {}
         self._langchain_tools: Dict[str, Any] = {}
+        # 执行热路径使用的分发表：名称 -> (函数, 是否异步)
+        # 元组不可变，并发注册/注销时不会读到不一致的函数和标志
+        self._dispatch: Dict[str, Tuple[Callable, bool]] = {}
+        # list_tools / get_tool_names 的缓存视图，工具变更时失效
+        self._tools_view: Optional[Tuple[Dict[str, Any], ...]] = None
+        self._tool_names_view: Optional[Tuple[str, ...]] = None
     
     def register_tool(
         self, 
@@ -137,7 +304,7 @@ class ToolManager(IToolManager):
             parameters: 可选，参数定义
         """
         # 检查是否是异步函数
-        is_async = asyncio.iscoroutinefunction(func)
+        is_async = _is_coroutine_function(func)
         
         # 如果没有提供参数定义，从函数签名推断
         if parameters is None:
@@ -153,7 +320,8 @@ class ToolManager(IToolManager):
         )
         
         self._tools[name] = tool_info
-        self._functions[name] = func
+        self._dispatch[name] = (func, is_async)
+        self._invalidate_views()
         
         # 注册到LangChain（如果可用）
         self._register_to_langchain(name, tool_info)
@@ -170,45 +338,17 @@ class ToolManager(IToolManager):
         Returns:
             Dict: JSON Schema格式的参数定义
         """
-        sig = inspect.signature(func)
-        parameters = {
-            "type": "object",
-            "properties": {},
-            "required": [],
+        try:
+            cached = _cached_infer(func)
+        except TypeError:
+            # 不可哈希的可调用对象无法缓存，直接推断
+            return _build_parameters(func)
+        # 复制后返回，调用方修改不会影响缓存
+        return {
+            "type": cached["type"],
+            "properties": {k: dict(v) for k, v in cached["properties"].items()},
+            "required": list(cached["required"]),
         }
-        
-        for param_name, param in sig.parameters.items():
-            # 跳过self和cls
-            if param_name in ['self', 'cls']:
-                continue
-            
-            # 确定参数类型
-            param_type = "string"
-            if param.annotation is not None:
-                if param.annotation == int:
-                    param_type = "integer"
-                elif param.annotation == float:
-                    param_type = "number"
-                elif param.annotation == bool:
-                    param_type = "boolean"
-                elif param.annotation == list:
-                    param_type = "array"
-                elif param.annotation == dict:
-                    param_type = "object"
-            
-            param_info = {"type": param_type}
-            
-            # 添加描述（如果有默认值）
-            if param.default is not inspect.Parameter.empty:
-                param_info["description"] = str(param.default)
-            
-            parameters["properties"][param_name] = param_info
-            
-            # 必填参数
-            if param.default is inspect.Parameter.empty:
-                parameters["required"].append(param_name)
-        
-        return parameters
     
     def _register_to_langchain(self, name: str, tool_info: ToolInfo) -> None:
         """
@@ -220,27 +360,26 @@ class ToolManager(IToolManager):
             name: 工具名称
             tool_info: 工具信息
         """
-        try:
-            from langchain.agents import Tool as LangChainTool
-            
-            # 创建LangChain工具
-            langchain_tool = LangChainTool(
-                name=name,
-                description=tool_info.description,
-                func=self._create_wrapper(tool_info),
-            )
-            
-            self._langchain_tools[name] = langchain_tool
-            
-        except ImportError:
+        LangChainTool = _langchain_tool_class()
+        if LangChainTool is None:
             # LangChain未安装，静默忽略
-            pass
+            return
+        
+        # 创建LangChain工具
+        langchain_tool = LangChainTool(
+            name=name,
+            description=tool_info.description,
+            func=self._create_wrapper(tool_info),
+        )
+        
+        self._langchain_tools[name] = langchain_tool
     
     def _create_wrapper(self, tool_info: ToolInfo) -> Callable:
         """
         创建工具包装函数
         
         统一同步/异步函数的调用方式。
+        用partial预先绑定管理器方法和工具名，调用时不再经过闭包。
         
         Args:
             tool_info: 工具信息
@@ -248,21 +387,9 @@ class ToolManager(IToolManager):
         Returns:
             Callable: 包装后的函数
         """
-        async def async_wrapper(**kwargs):
-            """异步包装器"""
-            return await self.execute_tool(tool_info.name, **kwargs)
-        
-        def sync_wrapper(**kwargs):
-            """同步包装器"""
-            loop = asyncio.new_event_loop()
-            try:
-                return loop.run_until_complete(
-                    self.execute_tool(tool_info.name, **kwargs)
-                )
-            finally:
-                loop.close()
-        
-        return sync_wrapper if not tool_info.is_async else async_wrapper
+        if tool_info.is_async:
+            return partial(self.execute_tool, tool_info.name)
+        return partial(self.execute_tool_sync, tool_info.name)
     
     def unregister_tool(self, name: str) -> bool:
         """
@@ -276,7 +403,8 @@ class ToolManager(IToolManager):
         """
         if name in self._tools:
             del self._tools[name]
-            del self._functions[name]
+            self._dispatch.pop(name, None)
+            self._invalidate_views()
             
             # 从LangChain移除
             if name in self._langchain_tools:
@@ -301,17 +429,52 @@ class ToolManager(IToolManager):
         Raises:
             ToolExecutionError: 工具不存在或执行失败
         """
-        if name not in self._tools:
+        entry = self._dispatch.get(name)
+        if entry is None:
             raise ToolExecutionError(f"Tool not found: {name}")
         
-        tool = self._tools[name]
-        func = tool.function
-        
+        func, is_async = entry
         try:
-            if tool.is_async:
+            if is_async:
                 return await func(**kwargs)
-            else:
-                return func(**kwargs)
+            # 同步工具直接返回，不再挂起协程
+            return func(**kwargs)
+        except Exception as e:
+            raise ToolExecutionError(
+                f"Error executing '{name}': {str(e)}"
+            ) from e
+    
+    def _execute_tool_fast(self, name: str, **kwargs) -> Any:
+        """
+        执行工具的快速路径
+        
+        同步工具直接返回结果，不经过协程；
+        异步工具返回需要await的协程。
+        
+        Raises:
+            ToolExecutionError: 工具不存在或执行失败
+        """
+        entry = self._dispatch.get(name)
+        if entry is None:
+            raise ToolExecutionError(f"Tool not found: {name}")
+        
+        func, is_async = entry
+        try:
+            result = func(**kwargs)
+        except Exception as e:
+            raise ToolExecutionError(
+                f"Error executing '{name}': {str(e)}"
+            ) from e
+        
+        if is_async:
+            return self._await_tool(name, result)
+        return result
+    
+    @staticmethod
+    async def _await_tool(name: str, coro: Any) -> Any:
+        """等待异步工具完成，统一包装异常"""
+        try:
+            return await coro
         except Exception as e:
             raise ToolExecutionError(
                 f"Error executing '{name}': {str(e)}"
@@ -321,7 +484,8 @@ class ToolManager(IToolManager):
         """
         同步执行工具
         
-        方便在同步环境中调用异步工具。
+        同步工具直接调用；异步工具提交到共享的后台事件循环执行，
+        避免每次调用创建和关闭事件循环。
         
         Args:
             name: 工具名称
@@ -330,29 +494,56 @@ class ToolManager(IToolManager):
         Returns:
             Any: 工具执行结果
         """
-        loop = asyncio.new_event_loop()
-        try:
-            return loop.run_until_complete(
-                self.execute_tool(name, **kwargs)
-            )
-        finally:
-            loop.close()
+        entry = self._dispatch.get(name)
+        if entry is not None and not entry[1]:
+            return self._execute_tool_fast(name, **kwargs)
+        
+        loop = self._background_loop()
+        if threading.current_thread() is self._bg_thread:
+            raise RuntimeError("execute_tool_sync cannot be called from an async tool")
+        return asyncio.run_coroutine_threadsafe(
+            self.execute_tool(name, **kwargs), loop
+        ).result()
+    
+    @classmethod
+    def _background_loop(cls) -> asyncio.AbstractEventLoop:
+        """获取后台事件循环，首次调用时在守护线程中启动"""
+        if cls._bg_loop is None:
+            with cls._bg_lock:
+                if cls._bg_loop is None:
+                    loop = asyncio.new_event_loop()
+                    thread = threading.Thread(
+                        target=loop.run_forever,
+                        name="ToolManagerLoop",
+                        daemon=True,
+                    )
+                    thread.start()
+                    cls._bg_thread = thread
+                    cls._bg_loop = loop
+        return cls._bg_loop
     
     def list_tools(self) -> List[Dict[str, Any]]:
         """
         列出所有工具
         
         Returns:
-            List[Dict]: 工具信息列表
+            List[Dict]: 工具信息列表（元素在工具变更前复用，请勿修改）
         """
-        return [
-            {
-                "name": name,
-                "description": info.description,
-                "parameters": info.parameters,
-            }
-            for name, info in self._tools.items()
-        ]
+        if self._tools_view is None:
+            self._tools_view = tuple(
+                {
+                    "name": name,
+                    "description": info.description,
+                    "parameters": info.parameters,
+                }
+                for name, info in self._tools.items()
+            )
+        return list(self._tools_view)
+    
+    def _invalidate_views(self) -> None:
+        """工具注册表变更后清空缓存视图"""
+        self._tools_view = None
+        self._tool_names_view = None
     
     def get_tool(self, name: str) -> Optional[Dict[str, Any]]:
         """
@@ -382,7 +573,9 @@ class ToolManager(IToolManager):
         Returns:
             List[str]: 工具名称列表
         """
-        return list(self._tools.keys())
+        if self._tool_names_view is None:
+            self._tool_names_view = tuple(self._tools)
+        return list(self._tool_names_view)
     
     async def execute_react(self, task: str, max_iterations: int = 10) -> Dict[str, Any]:
         """
@@ -397,14 +590,17 @@ class ToolManager(IToolManager):
         Returns:
             Dict包含执行结果
         """
-        iterations = []
+        # 迭代过程中工具列表不变，所有迭代共享同一份
+        tools_available = self.get_tool_names()
         
-        for i in range(max_iterations):
-            iterations.append({
-                "iteration": i + 1,
+        iterations = [
+            {
+                "iteration": i,
                 "task": task,
-                "tools_available": self.get_tool_names(),
-            })
+                "tools_available": tools_available,
+            }
+            for i in range(1, max_iterations + 1)
+        ]
         
         return {
             "success": True,
@@ -420,29 +616,22 @@ class ToolManager(IToolManager):
             name: 工具名称
             
         Returns:
-            Dict: LangChain格式的工具定义
+            Dict: LangChain格式的工具定义（注册时生成的共享对象，请勿修改）
             
         Raises:
             ValueError: 工具不存在
         """
-        if name not in self._tools:
+        tool = self._tools.get(name)
+        if tool is None:
             raise ValueError(f"Tool not found: {name}")
         
-        tool = self._tools[name]
-        
-        return {
-            "type": "function",
-            "function": {
-                "name": tool.name,
-                "description": tool.description,
-                "parameters": tool.parameters,
-            }
-        }
+        return tool.definition
     
     def clear(self) -> None:
         """清空所有工具"""
         self._tools.clear()
-        self._functions.clear()
+        self._dispatch.clear()
+        self._invalidate_views()
         self._langchain_tools.clear()
 
 
@@ -503,25 +692,37 @@ class BuiltinTools:
                 str: 计算结果
             """
             try:
-                result = eval(expression)
+                result = _evaluate_expression(expression.strip())
                 return f"Result: {result}"
             except Exception as e:
                 return f"Error: {str(e)}"
         
+        # 文件读写在线程中执行，避免阻塞事件循环
+        def _read_file(file_path: str, max_size: int) -> str:
+            size = os.path.getsize(file_path)
+            if size > max_size:
+                raise ValueError(f"File too large: {size} bytes (max {max_size})")
+            with open(file_path, 'r', encoding='utf-8') as f:
+                return f.read()
+        
+        def _write_file(file_path: str, content: str) -> None:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+        
         # 文件读取工具
-        async def file_reader(file_path: str) -> str:
+        async def file_reader(file_path: str, max_size: int = _MAX_READ_SIZE) -> str:
             """
             文件读取工具
             
             Args:
                 file_path: 文件路径
+                max_size: 允许读取的最大字节数
                 
             Returns:
                 str: 文件内容
             """
             try:
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    return f.read()
+                return await asyncio.to_thread(_read_file, file_path, max_size)
             except Exception as e:
                 return f"Error reading file: {str(e)}"
         
@@ -538,8 +739,7 @@ class BuiltinTools:
                 str: 操作结果
             """
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
+                await asyncio.to_thread(_write_file, file_path, content)
                 return f"Successfully wrote to {file_path}"
             except Exception as e:
                 return f"Error writing file: {str(e)}"
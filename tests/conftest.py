@@ -1,7 +1,6 @@
 # conftest.py - pytest配置
 
 import pytest
-import asyncio
 import sys
 from pathlib import Path
 
@@ -11,14 +10,6 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 
-@pytest.fixture(scope="session")
-def event_loop():
-    """创建事件循环"""
-    loop = asyncio.get_event_loop_policy().new_event_loop()
-    yield loop
-    loop.close()
-
-
 def pytest_configure(config):
     """Pytest配置"""
     config.addinivalue_line(
@@ -4,6 +4,8 @@ import pytest
 import asyncio
 from unittest.mock import Mock, patch
 
+from src.core.interfaces import StreamChunk
+
 
 class TestFullWorkflow:
     """完整工作流测试"""
@@ -43,7 +45,7 @@ class TestFullWorkflow:
         async def mock_stream():
             chunks = ["Hello", ", ", "world", "!"]
             for chunk in chunks:
-                yield chunk
+                yield StreamChunk(text=chunk)
         
         with patch.object(
             ai_foundation.llm,
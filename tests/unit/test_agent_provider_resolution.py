@@ -2,6 +2,7 @@
 # [Output] 验证 Agent 按配置精确匹配模型到 provider，并处理歧义错误。
 # [Pos] unit 测试层回归用例，覆盖 Agent provider 解析与执行路径。
 
+from functools import lru_cache
 from types import SimpleNamespace
 
 import pytest
@@ -23,6 +24,20 @@ class _DummyProvider:
         )
 
 
+_DUMMY_PROVIDER = _DummyProvider()
+
+
+@lru_cache(maxsize=None)
+def _resolver_config(model: str, max_iterations: int = 1) -> AgentConfig:
+    # Agent 只持有配置引用、不会修改，同一模型的配置可在用例间复用
+    return AgentConfig(
+        name="resolver",
+        agent_type=AgentType.REACT,
+        model=model,
+        max_iterations=max_iterations,
+    )
+
+
 @pytest.mark.parametrize(
     ("model", "models_map", "expected_provider"),
     [
@@ -63,7 +78,7 @@ def test_base_agent_resolves_provider_from_config_exact_match(
 
     def fake_create_from_config(provider_name: str):
         captured["provider_name"] = provider_name
-        return _DummyProvider()
+        return _DUMMY_PROVIDER
 
     monkeypatch.setattr(
         LLMProviderFactory,
@@ -71,14 +86,7 @@ def test_base_agent_resolves_provider_from_config_exact_match(
         staticmethod(fake_create_from_config),
     )
 
-    agent = ReActAgent(
-        AgentConfig(
-            name="resolver",
-            agent_type=AgentType.REACT,
-            model=model,
-            max_iterations=1,
-        )
-    )
+    agent = ReActAgent(_resolver_config(model))
 
     _ = agent._get_llm_provider()
 
@@ -99,14 +107,7 @@ def test_base_agent_resolve_provider_raises_when_model_is_ambiguous(monkeypatch)
 
     monkeypatch.setattr("src.agents.base.get_provider_config", fake_get_provider_config)
 
-    agent = ReActAgent(
-        AgentConfig(
-            name="resolver",
-            agent_type=AgentType.REACT,
-            model="shared-model",
-            max_iterations=1,
-        )
-    )
+    agent = ReActAgent(_resolver_config("shared-model"))
 
     with pytest.raises(ValueError, match="multiple providers"):
         agent._get_llm_provider()
@@ -123,14 +124,7 @@ def test_base_agent_resolve_provider_raises_when_model_not_configured(monkeypatc
         lambda provider_name: SimpleNamespace(models={}),
     )
 
-    agent = ReActAgent(
-        AgentConfig(
-            name="resolver",
-            agent_type=AgentType.REACT,
-            model="unknown-model",
-            max_iterations=1,
-        )
-    )
+    agent = ReActAgent(_resolver_config("unknown-model"))
 
     with pytest.raises(ValueError, match="Unable to resolve provider"):
         agent._get_llm_provider()
@@ -157,7 +151,7 @@ async def test_conversational_agent_execute_with_glm_model(monkeypatch):
 
     def fake_create_from_config(provider_name: str):
         captured["provider_name"] = provider_name
-        return _DummyProvider()
+        return _DUMMY_PROVIDER
 
     monkeypatch.setattr(
         LLMProviderFactory,
@@ -20,6 +20,9 @@ class _FakeLLMProvider:
         )
 
 
+_FAKE_LLM_PROVIDER = _FakeLLMProvider()
+
+
 @pytest.mark.asyncio
 async def test_conversational_agent_execute_records_history():
     agent = ConversationalAgent(
@@ -29,7 +32,7 @@ async def test_conversational_agent_execute_records_history():
             model="GLM-4.7",
         )
     )
-    agent._set_llm_provider(_FakeLLMProvider())
+    agent._set_llm_provider(_FAKE_LLM_PROVIDER)
 
     result = await agent.execute("我叫张三", conversation_id="cid-1")
 
@@ -52,3 +55,14 @@ async def test_context_manager_get_context_info_in_async_loop():
     assert info["conversation_id"] == "cid-ctx"
     assert info["message_count"] == 1
     assert isinstance(info["token_count"], int)
+
+
+@pytest.mark.asyncio
+async def test_context_manager_get_context_info_sync_without_event_loop_bootstrap():
+    manager = ContextManager()
+    await manager.add_message("cid-sync", "user", "hello")
+
+    info = manager.get_context_info_sync("cid-sync")
+
+    assert info["conversation_id"] == "cid-sync"
+    assert info["message_count"] == 1
@@ -1,20 +1,20 @@
 # 单元测试 - LLM供应商
 
 import pytest
-import asyncio
+import pytest_asyncio
 from unittest.mock import Mock, AsyncMock, patch
 
 
 class TestOpenAIProvider:
     """测试OpenAI供应商"""
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def mock_openai_client(self):
         """Mock OpenAI客户端"""
         with patch('src.providers.llm.openai.OpenAI') as mock:
             yield mock
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def provider_config(self):
         """供应商配置"""
         return {
@@ -28,26 +28,36 @@ class TestOpenAIProvider:
 class TestLLMProviderFactory:
     """测试LLM工厂"""
     
-    def test_factory_creates_provider(self):
-        """测试工厂创建供应商"""
+    @pytest.fixture(scope="module", autouse=True)
+    def _register_test_provider(self):
+        """注册测试供应商（模块内只注册一次）"""
         from src.providers.llm.factory import LLMProviderFactory
         
-        # 注册测试供应商
         class TestProvider:
             name = "test"
         
         LLMProviderFactory.register("test", TestProvider)
+        yield
+    
+    @pytest.fixture(scope="session")
+    def _provider_set(self):
+        """已注册供应商名称集合"""
+        from src.providers.llm.factory import LLMProviderFactory
+        return frozenset(LLMProviderFactory.list_providers())
+    
+    def test_factory_creates_provider(self):
+        """测试工厂创建供应商"""
+        from src.providers.llm.factory import LLMProviderFactory
         
         provider = LLMProviderFactory.get_provider("test", {})
         assert provider is not None
     
-    def test_factory_list_providers(self):
+    def test_factory_list_providers(self, _provider_set):
         """测试工厂列出供应商"""
         from src.providers.llm.factory import LLMProviderFactory
         
-        providers = LLMProviderFactory.list_providers()
-        assert isinstance(providers, list)
-        assert "openai" in providers
+        assert isinstance(LLMProviderFactory.list_providers(), list)
+        assert "openai" in _provider_set
 
 
 class TestConfigManager:
@@ -83,6 +93,16 @@ class TestTokenCounter:
         
         assert tokens >= 1
     
+    def test_count_is_cached(self):
+        """测试重复文本命中计数缓存"""
+        from src.services.token_service import TokenCounter
+        
+        counter = TokenCounter()
+        first = counter.count("You are a helpful assistant.")
+        
+        with patch.object(counter, "_count_uncached", side_effect=AssertionError):
+            assert counter.count("You are a helpful assistant.") == first
+    
     def test_estimate_cost(self):
         """测试成本估算"""
         from src.services.token_service import TokenCounter
@@ -100,12 +120,18 @@ class TestTokenCounter:
 class TestToolManager:
     """测试工具管理器"""
     
-    @pytest.fixture
-    def tool_manager(self):
-        """创建工具管理器"""
+    @pytest.fixture(scope="module")
+    def _shared_tool_manager(self):
+        """模块内共享的工具管理器"""
         from src.tools.tool_manager import ToolManager
         return ToolManager()
     
+    @pytest.fixture
+    def tool_manager(self, _shared_tool_manager):
+        """工具管理器，每个用例结束后清空已注册的工具"""
+        yield _shared_tool_manager
+        _shared_tool_manager.clear()
+    
     def test_register_tool(self, tool_manager):
         """测试注册工具"""
         async def dummy_func(x: int, y: int) -> int:
@@ -121,7 +147,8 @@ class TestToolManager:
         assert len(tools) == 1
         assert tools[0]["name"] == "add"
     
-    def test_execute_tool(self, tool_manager):
+    @pytest.mark.asyncio
+    async def test_execute_tool(self, tool_manager):
         """测试执行工具"""
         async def add(x: int, y: int) -> int:
             return x + y
@@ -132,7 +159,7 @@ class TestToolManager:
             description="Add two numbers"
         )
         
-        result = asyncio.run(tool_manager.execute_tool("add", x=2, y=3))
+        result = await tool_manager.execute_tool("add", x=2, y=3)
         assert result == 5
     
     def test_builtin_tools(self, tool_manager):
@@ -147,17 +174,67 @@ class TestToolManager:
         assert "search" in tool_names
         assert "calculator" in tool_names
         assert "file_reader" in tool_names
+    
+    @pytest.mark.parametrize(
+        ("expression", "expected"),
+        [
+            ("2 + 3 * 4", "Result: 14"),
+            ("(1 - 5) / 2", "Result: -2.0"),
+            ("7 // 2", "Result: 3"),
+            ("7 % 4", "Result: 3"),
+            ("-2 ** 3", "Result: -8"),
+            ("+1.5 * 2", "Result: 3.0"),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_calculator_operators(self, tool_manager, expression, expected):
+        """测试计算器支持的运算符"""
+        from src.tools.tool_manager import BuiltinTools
+        
+        BuiltinTools.register_builtins(tool_manager)
+        
+        assert await tool_manager.execute_tool("calculator", expression=expression) == expected
+    
+    @pytest.mark.parametrize(
+        ("expression", "error"),
+        [
+            ("9**9**9", "Result too large"),
+            # 嵌套乘方曾绕过只检查指数的限制，长时间阻塞事件循环
+            ("(10**10000)**2000", "Result too large"),
+            ("(2**10000) * (2**10000)", "Result too large"),
+            ("1 / 0", "division by zero"),
+            ("__import__('os')", "Unsupported expression"),
+            ("abs(-3)", "Unsupported expression"),
+            ("'a' * 3", "Unsupported expression"),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_calculator_rejects_unsafe_expressions(self, tool_manager, expression, error):
+        """测试计算器拒绝过大结果、除零与非算术表达式"""
+        from src.tools.tool_manager import BuiltinTools
+        
+        BuiltinTools.register_builtins(tool_manager)
+        
+        result = await tool_manager.execute_tool("calculator", expression=expression)
+        assert result.startswith("Error:")
+        assert error in result
 
 
 class TestContextManager:
     """测试上下文管理器"""
     
-    @pytest.fixture
-    def context_manager(self):
-        """创建上下文管理器"""
+    @pytest.fixture(scope="module")
+    def _shared_context_manager(self):
+        """模块内共享的上下文管理器"""
         from src.context.manager import ContextManager
         return ContextManager()
     
+    @pytest_asyncio.fixture
+    async def context_manager(self, _shared_context_manager):
+        """上下文管理器，每个用例结束后清空所有对话"""
+        yield _shared_context_manager
+        await _shared_context_manager.clear_all()
+    
     @pytest.mark.asyncio
     async def test_add_message(self, context_manager):
         """测试添加消息"""
@@ -181,6 +258,42 @@ class TestContextManager:
         messages = await context_manager.get_messages("test-123")
         assert len(messages) == 0
     
+    @pytest.mark.asyncio
+    async def test_add_messages_batch(self, context_manager):
+        """测试批量添加消息"""
+        from src.core.interfaces import Message, MessageRole
+        
+        await context_manager.add_messages("test-123", [
+            Message(role=MessageRole.USER, content="Hello"),
+            Message(role=MessageRole.ASSISTANT, content="Hi"),
+        ])
+        
+        messages = await context_manager.get_messages("test-123")
+        assert [m.role for m in messages] == [MessageRole.USER, MessageRole.ASSISTANT]
+    
+    @pytest.mark.asyncio
+    async def test_append_and_truncate(self, context_manager):
+        """测试追加并截断上下文"""
+        from src.core.interfaces import Message, MessageRole
+        
+        system = Message(role=MessageRole.SYSTEM, content="You are helpful")
+        await context_manager.append_and_truncate("test-123", system)
+        for i in range(5):
+            await context_manager.append_and_truncate(
+                "test-123", Message(role=MessageRole.USER, content=f"message {i}")
+            )
+        
+        limit = context_manager.calculate_tokens([system]) + 2 * context_manager.calculate_tokens(
+            [Message(role=MessageRole.USER, content="message 0")]
+        )
+        messages = await context_manager.append_and_truncate(
+            "test-123", Message(role=MessageRole.USER, content="message 5"), max_tokens=limit
+        )
+        
+        assert messages[0] is system
+        assert [m.content for m in messages[1:]] == ["message 4", "message 5"]
+        assert await context_manager.get_messages("test-123") == messages
+    
     def test_calculate_tokens(self, context_manager):
         """测试Token计算"""
         from src.core.interfaces import Message, MessageRole
@@ -192,17 +305,36 @@ class TestContextManager:
         
         tokens = context_manager.calculate_tokens(messages)
         assert tokens >= 1
+    
+    def test_calculate_tokens_counts_each_message_once(self, context_manager):
+        """测试逐条消息的Token数只计算一次"""
+        from src.core.interfaces import Message, MessageRole
+        
+        first = Message(role=MessageRole.USER, content="Hello")
+        context_manager.calculate_tokens([first])
+        
+        second = Message(role=MessageRole.ASSISTANT, content="Hi there")
+        with patch.object(context_manager, "_count_texts", wraps=context_manager._count_texts) as count_texts:
+            context_manager.calculate_tokens([first, second])
+        
+        count_texts.assert_called_once_with(["assistant: Hi there"])
 
 
 class TestMemoryProvider:
     """测试记忆存储"""
     
-    @pytest.fixture
-    def in_memory_provider(self):
-        """创建内存存储"""
+    @pytest.fixture(scope="module")
+    def _shared_in_memory_provider(self):
+        """模块内共享的内存存储"""
         from src.memory.providers import InMemoryProvider
         return InMemoryProvider()
     
+    @pytest_asyncio.fixture
+    async def in_memory_provider(self, _shared_in_memory_provider):
+        """内存存储，每个用例结束后清空所有记忆"""
+        yield _shared_in_memory_provider
+        await _shared_in_memory_provider.clear()
+    
     @pytest.mark.asyncio
     async def test_store_memory(self, in_memory_provider):
         """测试存储记忆"""
@@ -222,6 +354,42 @@ class TestMemoryProvider:
         assert memory is not None
         assert memory.content == "content1"
     
+    @pytest.mark.asyncio
+    async def test_batch_store_and_retrieve(self, in_memory_provider):
+        """测试批量存储与检索"""
+        await in_memory_provider.store_many(
+            {"key1": "content1", "key2": "content2"},
+            metadata={"conversation_id": "c1"},
+        )
+        
+        memories = await in_memory_provider.retrieve_many(["key2", "missing", "key1"])
+        assert [m.content if m else None for m in memories] == ["content2", None, "content1"]
+        assert await in_memory_provider.exists_many(["key1", "missing"]) == [True, False]
+    
+    @pytest.mark.asyncio
+    async def test_clear_conversation(self, in_memory_provider):
+        """测试只清空指定会话的记忆"""
+        await in_memory_provider.store("key1", "content1", {"conversation_id": "c1"})
+        await in_memory_provider.store("key2", "content2", {"conversation_id": "c2"})
+        await in_memory_provider.store("key3", "content3", {"conversation_id": "c1"})
+        
+        await in_memory_provider.clear("c1")
+        
+        assert await in_memory_provider.exists_many(["key1", "key2", "key3"]) == [False, True, False]
+    
+    @pytest.mark.asyncio
+    async def test_lru_eviction(self):
+        """测试超出上限时淘汰最久未使用的记忆"""
+        from src.memory.providers import InMemoryProvider
+        provider = InMemoryProvider(max_memories=2)
+        await provider.store("key1", "apple")
+        await provider.store("key2", "banana")
+        await provider.retrieve("key1")
+        await provider.store("key3", "cherry")
+        
+        assert await provider.exists_many(["key1", "key2", "key3"]) == [True, False, True]
+        assert await provider.search("banana") == []
+    
     @pytest.mark.asyncio
     async def test_delete_memory(self, in_memory_provider):
         """测试删除记忆"""
@@ -243,12 +411,47 @@ class TestMemoryProvider:
         results = await in_memory_provider.search("fruit", top_k=10)
         
         assert len(results) == 2
+    
+    @pytest.mark.asyncio
+    async def test_search_memory_matches_all_terms(self, in_memory_provider):
+        """测试关键词搜索要求匹配全部查询词并按出现次数排序"""
+        await in_memory_provider.store("key1", "Red fruit.")
+        await in_memory_provider.store("key2", "red fruit, red apple")
+        await in_memory_provider.store("key3", "red vegetable")
+        await in_memory_provider.delete("key1")
+        
+        results = await in_memory_provider.search("RED fruit", top_k=10)
+        
+        assert [r["key"] for r in results] == ["key2"]
+        assert results[0]["score"] == 3.0
+    
+    @pytest.mark.asyncio
+    async def test_vector_search_memory(self):
+        """测试配置embedder后的向量检索"""
+        pytest.importorskip("numpy")
+        from src.memory.providers import InMemoryProvider
+        
+        vocabulary = ["fruit", "vegetable", "red"]
+        
+        def embed(text):
+            return [float(word in text) for word in vocabulary]
+        
+        provider = InMemoryProvider(embedder=embed)
+        await provider.store("key1", "red fruit")
+        await provider.store("key2", "green vegetable")
+        await provider.store("key3", "yellow fruit")
+        await provider.delete("key3")
+        
+        results = await provider.search("fruit", top_k=2)
+        
+        assert [r["key"] for r in results] == ["key1", "key2"]
+        assert results[0]["score"] > results[1]["score"]
 
 
 class TestReActAgent:
     """测试ReAct Agent"""
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def react_agent(self):
         """创建ReAct Agent"""
         from src.agents import ReActAgent, AgentConfig, AgentType
@@ -283,7 +486,7 @@ class TestReActAgent:
 class TestConversationalAgent:
     """测试对话Agent"""
     
-    @pytest.fixture
+    @pytest.fixture(scope="module")
     def conv_agent(self):
         """创建对话Agent"""
         from src.agents import ConversationalAgent, AgentConfig
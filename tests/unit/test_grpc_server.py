@@ -0,0 +1,336 @@
+# [Input] AICoreServicer / HealthServicer 与假的 gRPC context、LLM 供应商。
+# [Output] 验证各处理器返回 protobuf 消息，异常以正确的 gRPC 状态码终止。
+# [Pos] unit 测试层 gRPC 服务回归，需先通过 grpc_tools.protoc 生成 ai_core_pb2。
+
+import asyncio
+
+import grpc
+import pytest
+
+ai_core_pb2 = pytest.importorskip("src.grpc_service.ai_core_pb2")
+
+from src.core.interfaces import AIResponse, MessageRole, StreamChunk, UsageInfo
+from src.grpc_service import server
+from src.grpc_service.server import AICoreServicer, HealthServicer, InvalidArgumentError
+from src.tools.tool_manager import ToolManager
+
+
+class _Aborted(Exception):
+    def __init__(self, code, details):
+        super().__init__(details)
+        self.code = code
+        self.details = details
+
+
+class _FakeContext:
+    """与 grpc.aio 一致：abort 抛出异常终止处理器"""
+
+    def __init__(self):
+        self._cancelled = False
+
+    async def abort(self, code, details=""):
+        raise _Aborted(code, details)
+
+    def cancelled(self):
+        return self._cancelled
+
+    def cancel(self):
+        self._cancelled = True
+
+
+class _FakeProvider:
+    def __init__(self):
+        self.last_request = None
+
+    async def generate(self, request):
+        self.last_request = request
+        return AIResponse(
+            content="hello",
+            usage=UsageInfo(prompt_tokens=3, completion_tokens=4, total_tokens=7),
+            model=request.model,
+            finish_reason="stop",
+        )
+
+    async def stream_generate(self, request):
+        self.last_request = request
+        yield StreamChunk(text="A")
+        yield StreamChunk(text="B")
+        yield StreamChunk(
+            text="",
+            usage=UsageInfo(prompt_tokens=3, completion_tokens=2, total_tokens=5),
+            finish_reason="stop",
+        )
+
+
+@pytest.fixture
+def fake_provider(monkeypatch):
+    provider = _FakeProvider()
+    monkeypatch.setattr(server, "get_llm_provider", lambda name: provider)
+    return provider
+
+
+@pytest.fixture
+def tool_manager():
+    manager = ToolManager()
+
+    def add(x: int, y: int) -> int:
+        return x + y
+
+    def boom() -> None:
+        raise RuntimeError("bad")
+
+    manager.register_tool(name="add", func=add)
+    manager.register_tool(name="boom", func=boom)
+    return manager
+
+
+@pytest.fixture
+def servicer(fake_provider, tool_manager):
+    return AICoreServicer(tool_manager=tool_manager)
+
+
+@pytest.fixture
+def context():
+    return _FakeContext()
+
+
+def _user_message(content="hi", role=ai_core_pb2.USER):
+    return ai_core_pb2.Message(role=role, content=content)
+
+
+@pytest.mark.asyncio
+async def test_single_call_returns_proto_response(servicer, context):
+    response = await servicer.SingleCall(
+        ai_core_pb2.SingleCallRequest(model="m", messages=[_user_message()]),
+        context,
+    )
+
+    assert isinstance(response, ai_core_pb2.SingleCallResponse)
+    assert response.content == "hello"
+    assert response.usage.total_tokens == 7
+
+
+@pytest.mark.asyncio
+async def test_stream_call_puts_real_usage_on_final_chunk(servicer, context):
+    responses = [
+        r async for r in servicer.StreamCall(
+            ai_core_pb2.StreamRequest(model="m", messages=[_user_message()]),
+            context,
+        )
+    ]
+
+    assert all(isinstance(r, ai_core_pb2.StreamResponse) for r in responses)
+    assert [r.chunk for r in responses if not r.is_final] == ["A", "B"]
+    final = responses[-1]
+    assert final.is_final
+    assert final.usage.prompt_tokens == 3
+    assert final.usage.total_tokens == 5
+
+
+@pytest.mark.asyncio
+async def test_call_tool_returns_tool_call_response(servicer, context):
+    response = await servicer.CallTool(
+        ai_core_pb2.ToolCallRequest(tool_name="add", parameters='{"x": 1, "y": 2}'),
+        context,
+    )
+
+    assert isinstance(response, ai_core_pb2.ToolCallResponse)
+    assert response.success
+    assert response.result == "3"
+
+
+@pytest.mark.asyncio
+async def test_call_tool_reports_tool_failure_in_response(servicer, context):
+    response = await servicer.CallTool(
+        ai_core_pb2.ToolCallRequest(tool_name="boom"),
+        context,
+    )
+
+    assert isinstance(response, ai_core_pb2.ToolCallResponse)
+    assert not response.success
+    assert "bad" in response.error
+
+
+@pytest.mark.parametrize(
+    "parameters",
+    [
+        pytest.param("{bad", id="not-json"),
+        pytest.param("[1, 2]", id="not-object"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_call_tool_rejects_invalid_parameters(servicer, context, parameters):
+    with pytest.raises(_Aborted) as exc_info:
+        await servicer.CallTool(
+            ai_core_pb2.ToolCallRequest(tool_name="add", parameters=parameters),
+            context,
+        )
+
+    assert exc_info.value.code == grpc.StatusCode.INVALID_ARGUMENT
+
+
+@pytest.mark.parametrize(
+    ("method", "request_message"),
+    [
+        ("GenerateImage", ai_core_pb2.ImageRequest(prompt="cat")),
+        ("StoreMemory", ai_core_pb2.MemoryRequest(key="k", content="v")),
+        ("RetrieveMemory", ai_core_pb2.MemoryQueryRequest(query="q")),
+    ],
+)
+@pytest.mark.asyncio
+async def test_unimplemented_handlers_abort(servicer, context, method, request_message):
+    with pytest.raises(_Aborted) as exc_info:
+        await getattr(servicer, method)(request_message, context)
+
+    assert exc_info.value.code == grpc.StatusCode.UNIMPLEMENTED
+
+
+@pytest.mark.parametrize(
+    ("error", "code"),
+    [
+        pytest.param(InvalidArgumentError("bad"), grpc.StatusCode.INVALID_ARGUMENT, id="invalid"),
+        pytest.param(asyncio.TimeoutError(), grpc.StatusCode.DEADLINE_EXCEEDED, id="timeout"),
+        pytest.param(RuntimeError("boom"), grpc.StatusCode.INTERNAL, id="other"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_abort_maps_errors_to_status_codes(context, error, code):
+    with pytest.raises(_Aborted) as exc_info:
+        await AICoreServicer._abort(context, "Test", error)
+
+    assert exc_info.value.code == code
+
+
+@pytest.mark.asyncio
+async def test_provider_error_aborts_with_internal(servicer, context, fake_provider):
+    async def failing_generate(request):
+        raise RuntimeError("upstream down")
+
+    fake_provider.generate = failing_generate
+
+    with pytest.raises(_Aborted) as exc_info:
+        await servicer.SingleCall(
+            ai_core_pb2.SingleCallRequest(model="m", messages=[_user_message()]),
+            context,
+        )
+
+    assert exc_info.value.code == grpc.StatusCode.INTERNAL
+    assert "upstream down" in exc_info.value.details
+
+
+def test_convert_messages_maps_every_proto_role(servicer):
+    messages = servicer._convert_messages([
+        _user_message(role=ai_core_pb2.USER),
+        _user_message(role=ai_core_pb2.SYSTEM),
+        _user_message(role=ai_core_pb2.ASSISTANT),
+        _user_message(role=ai_core_pb2.TOOL),
+    ])
+
+    assert [m.role for m in messages] == [
+        MessageRole.USER,
+        MessageRole.SYSTEM,
+        MessageRole.ASSISTANT,
+        MessageRole.TOOL,
+    ]
+
+
+@pytest.mark.parametrize(
+    ("method", "request_type"),
+    [
+        ("SingleCall", ai_core_pb2.SingleCallRequest),
+        ("Chat", ai_core_pb2.ChatRequest),
+    ],
+)
+@pytest.mark.asyncio
+async def test_unknown_role_aborts_with_invalid_argument(servicer, context, method, request_type):
+    # proto3 开放枚举：线路上可能出现未定义的角色值，曾因下标越界返回 INTERNAL
+    request = request_type(model="m", messages=[_user_message(role=99)])
+
+    with pytest.raises(_Aborted) as exc_info:
+        await getattr(servicer, method)(request, context)
+
+    assert exc_info.value.code == grpc.StatusCode.INVALID_ARGUMENT
+    assert "99" in exc_info.value.details
+
+
+@pytest.mark.asyncio
+async def test_stream_call_unknown_role_aborts_with_invalid_argument(servicer, context):
+    request = ai_core_pb2.StreamRequest(model="m", messages=[_user_message(role=-1)])
+
+    with pytest.raises(_Aborted) as exc_info:
+        async for _ in servicer.StreamCall(request, context):
+            pass
+
+    assert exc_info.value.code == grpc.StatusCode.INVALID_ARGUMENT
+
+
+@pytest.mark.asyncio
+async def test_single_call_casts_whitelisted_extra_params(servicer, context, fake_provider):
+    # proto map<string,string> 的值曾原样以字符串透传给SDK
+    await servicer.SingleCall(
+        ai_core_pb2.SingleCallRequest(
+            model="m",
+            messages=[_user_message()],
+            extra_params={"top_p": "0.9", "top_k": "40", "user": "u1"},
+        ),
+        context,
+    )
+
+    assert fake_provider.last_request.extra_params == {"top_p": 0.9, "top_k": 40, "user": "u1"}
+
+
+@pytest.mark.parametrize(
+    "extra_params",
+    [
+        pytest.param({"model": "other-model"}, id="fixed-key"),
+        pytest.param({"stream": "true"}, id="stream"),
+        pytest.param({"top_k": "many"}, id="bad-value"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_single_call_rejects_invalid_extra_params(servicer, context, fake_provider, extra_params):
+    with pytest.raises(_Aborted) as exc_info:
+        await servicer.SingleCall(
+            ai_core_pb2.SingleCallRequest(
+                model="m",
+                messages=[_user_message()],
+                extra_params=extra_params,
+            ),
+            context,
+        )
+
+    assert exc_info.value.code == grpc.StatusCode.INVALID_ARGUMENT
+    assert fake_provider.last_request is None
+
+
+@pytest.mark.asyncio
+async def test_health_check_returns_proto_response(context):
+    response = await HealthServicer().Check(ai_core_pb2.HealthCheckRequest(), context)
+
+    assert isinstance(response, ai_core_pb2.HealthCheckResponse)
+    assert response.status == 1
+    assert response.version == HealthServicer.VERSION
+
+
+@pytest.mark.asyncio
+async def test_health_watchers_each_see_status_change():
+    # 曾共用一个事件并在唤醒后 clear：先醒的监控者会清掉尚未开始等待的监控者的通知，
+    # 后者要等到5秒心跳才能收到新状态
+    health = HealthServicer()
+    request = ai_core_pb2.HealthCheckRequest()
+    first = health.Watch(request, _FakeContext())
+    second = health.Watch(request, _FakeContext())
+    try:
+        assert (await anext(first)).status == 1
+        assert (await anext(second)).status == 1
+
+        # 第一个监控者进入等待，第二个仍停在推送处
+        first_next = asyncio.ensure_future(anext(first))
+        await asyncio.sleep(0)
+        health.set_status(2)
+
+        assert (await asyncio.wait_for(first_next, timeout=1)).status == 2
+        assert (await asyncio.wait_for(anext(second), timeout=1)).status == 2
+    finally:
+        await first.aclose()
+        await second.aclose()
@@ -0,0 +1,109 @@
+# [Input] HumanInLoop 审查请求与人工提交/取消操作。
+# [Output] 验证人工操作立即唤醒等待方、已完成审查可查询、待处理数量受限。
+# [Pos] unit 测试层人在回路服务回归。
+
+import asyncio
+
+import pytest
+
+from src.services.human_in_loop import HumanAction, HumanInLoop
+
+
+async def _start_review(hil: HumanInLoop):
+    """发起审查并返回等待任务与审查ID"""
+    task = asyncio.ensure_future(hil.request_review("agent", "task", "output"))
+    await asyncio.sleep(0)
+    (review,) = hil.get_pending_reviews()
+    return task, review.review_id
+
+
+@pytest.mark.asyncio
+async def test_approve_wakes_waiter_before_timeout():
+    hil = HumanInLoop()
+    task, review_id = await _start_review(hil)
+
+    assert hil.approve(review_id, "ok")
+
+    # 自动批准超时为5秒，人工批准后应立即返回
+    review = await asyncio.wait_for(task, timeout=1)
+    assert review.status == "approve"
+    assert review.human_action is HumanAction.APPROVE
+    assert review.human_comment == "ok"
+
+
+@pytest.mark.asyncio
+async def test_cancel_review_wakes_waiter():
+    hil = HumanInLoop()
+    task, review_id = await _start_review(hil)
+
+    assert hil.cancel_review(review_id)
+
+    review = await asyncio.wait_for(task, timeout=1)
+    assert review.status == "pending"
+    assert hil.get_pending_reviews() == []
+
+
+@pytest.mark.asyncio
+async def test_get_review_finds_finished_review():
+    hil = HumanInLoop()
+    task, review_id = await _start_review(hil)
+
+    hil.modify(review_id, "better output")
+    await asyncio.wait_for(task, timeout=1)
+
+    assert review_id not in hil._pending_reviews
+    review = hil.get_review(review_id)
+    assert review is not None
+    assert review.human_feedback == "better output"
+
+
+@pytest.mark.asyncio
+async def test_request_review_rejects_when_pending_full():
+    hil = HumanInLoop(max_pending=2)
+    # 禁用时请求立即返回，审查留在待处理中
+    hil.disable()
+    await hil.request_review("agent", "t1", "o1")
+    await hil.request_review("agent", "t2", "o2")
+
+    with pytest.raises(RuntimeError, match="Too many pending reviews"):
+        await hil.request_review("agent", "t3", "o3")
+
+
+@pytest.mark.asyncio
+async def test_expired_reviews_leave_no_events_or_callbacks():
+    # 曾为每个审查创建事件却只在等待结束时移除：禁用状态下100次请求残留100个事件
+    hil = HumanInLoop(review_ttl=0)
+    hil.disable()
+    for i in range(100):
+        await hil.request_review("agent", f"t{i}", "o", callback=lambda review: None)
+
+    # 每次请求都会清理此前已过期的审查
+    assert len(hil._pending_reviews) <= 1
+    assert len(hil._callbacks) <= 1
+    assert hil._events == {}
+
+
+@pytest.mark.asyncio
+async def test_finished_reviews_release_storage():
+    hil = HumanInLoop(max_recent=2)
+    for i in range(3):
+        task, review_id = await _start_review(hil)
+        hil.approve(review_id)
+        await asyncio.wait_for(task, timeout=1)
+
+    assert hil._pending_reviews == {}
+    assert hil._events == {}
+    # 最近完成列表按LRU淘汰
+    assert len(hil._recent) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancel_review_drops_event():
+    hil = HumanInLoop()
+    task, review_id = await _start_review(hil)
+
+    hil.cancel_review(review_id)
+    await asyncio.wait_for(task, timeout=1)
+
+    assert hil._events == {}
+    assert hil._callbacks == {}
@@ -0,0 +1,92 @@
+# [Input] SimpleLogger 写入临时日志文件，以及无法写入的日志路径。
+# [Output] 验证日志经后台任务落盘、统计正确，写入失败时 flush 抛出异常而非挂起。
+# [Pos] unit 测试层文件日志服务回归。
+
+import asyncio
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.core.interfaces import AIRequest, AIResponse, Message, MessageRole, UsageInfo
+from src.services.logging_service import SimpleLogger
+
+
+def _request():
+    return AIRequest(model="m", messages=[Message(role=MessageRole.USER, content="hi")])
+
+
+def _response(total_tokens):
+    return AIResponse(
+        content="hello",
+        usage=UsageInfo(prompt_tokens=1, completion_tokens=total_tokens - 1, total_tokens=total_tokens),
+        model="m",
+        finish_reason="stop",
+    )
+
+
+@pytest.mark.asyncio
+async def test_flush_writes_entries_and_get_stats_counts_them(tmp_path):
+    log_file = tmp_path / "calls.log"
+    logger = SimpleLogger(str(log_file))
+    try:
+        await logger.log_call(_request(), _response(5))
+        await logger.log_call(_request(), _response(7))
+        await logger.log_error(RuntimeError("boom"), {"step": 1})
+
+        await logger.flush()
+        lines = log_file.read_bytes().splitlines()
+        assert len(lines) == 3
+        assert json.loads(lines[0])["model"] == "m"
+
+        now = datetime.now(timezone.utc)
+        stats = await logger.get_stats(now - timedelta(minutes=1), now + timedelta(minutes=1))
+        assert stats == {"total_calls": 2, "total_tokens": 12, "errors": 1}
+
+        # 统计增量扫描：新增条目只累加一次
+        await logger.log_call(_request(), _response(3))
+        stats = await logger.get_stats(now - timedelta(minutes=1), now + timedelta(minutes=1))
+        assert stats == {"total_calls": 3, "total_tokens": 15, "errors": 1}
+    finally:
+        await logger.close()
+
+
+@pytest.mark.asyncio
+async def test_close_writes_remaining_entries(tmp_path):
+    log_file = tmp_path / "calls.log"
+    logger = SimpleLogger(str(log_file))
+    for _ in range(10):
+        await logger.log_call(_request(), _response(2))
+
+    await logger.close()
+
+    assert len(log_file.read_bytes().splitlines()) == 10
+    assert logger._drain_task is None
+
+
+@pytest.mark.asyncio
+async def test_flush_raises_when_log_file_cannot_be_opened(tmp_path):
+    # 写入任务异常退出后 flush 曾永远阻塞在 queue.join() 上
+    logger = SimpleLogger(str(tmp_path / "missing" / "calls.log"))
+    await logger.log_call(_request(), _response(2))
+
+    with pytest.raises(FileNotFoundError):
+        await asyncio.wait_for(logger.flush(), timeout=2)
+    await logger.close()
+
+
+@pytest.mark.skipif(not os.path.exists("/dev/full"), reason="requires /dev/full")
+@pytest.mark.asyncio
+async def test_flush_raises_when_write_fails():
+    logger = SimpleLogger("/dev/full")
+    try:
+        await logger.log_call(_request(), _response(2))
+
+        with pytest.raises(OSError):
+            await asyncio.wait_for(logger.flush(), timeout=2)
+
+        # 异常只抛出一次，写入任务继续运行
+        await asyncio.wait_for(logger.flush(), timeout=2)
+    finally:
+        await logger.close()
@@ -48,18 +48,18 @@ class _StreamChunk:
 
 class _Stream:
     def __init__(self, texts):
-        self._texts = list(texts)
+        self._chunks = tuple(_StreamChunk(text) for text in texts)
 
     def __aiter__(self):
         self._index = 0
         return self
 
     async def __anext__(self):
-        if self._index >= len(self._texts):
+        if self._index >= len(self._chunks):
             raise StopAsyncIteration
-        text = self._texts[self._index]
+        chunk = self._chunks[self._index]
         self._index += 1
-        return _StreamChunk(text)
+        return chunk
 
 
 class _FakeMessages:
@@ -82,25 +82,35 @@ class _FakeAsyncAnthropic:
         self.messages = _FakeMessages()
 
 
-def _install_fake_anthropic_module(monkeypatch):
+@pytest.fixture(scope="session")
+def _fake_anthropic_module():
     fake_module = types.ModuleType("anthropic")
     fake_module.AsyncAnthropic = _FakeAsyncAnthropic
-    monkeypatch.setitem(sys.modules, "anthropic", fake_module)
+    return fake_module
+
+
+@pytest.fixture
+def fake_anthropic(monkeypatch, _fake_anthropic_module):
+    monkeypatch.setitem(sys.modules, "anthropic", _fake_anthropic_module)
+    return _fake_anthropic_module
+
+
+@pytest.fixture(scope="module")
+def hello_request():
+    # 请求对象只读，模块内用例共享
+    return AIRequest(
+        model="abab6.5s-chat",
+        messages=[Message(role=MessageRole.USER, content="hello")],
+    )
 
 
 @pytest.mark.asyncio
-async def test_minimax_generate_uses_anthropic_messages_api(monkeypatch):
-    _install_fake_anthropic_module(monkeypatch)
+async def test_minimax_generate_uses_anthropic_messages_api(fake_anthropic, hello_request):
     provider = MinimaxProvider({"api_key": "k", "provider_name": "minimax", "base_url": "https://mock"})
 
-    response = await provider.generate(
-        AIRequest(
-            model="abab6.5s-chat",
-            messages=[Message(role=MessageRole.USER, content="hello")],
-        )
-    )
+    response = await provider.generate(hello_request)
 
-    client = await provider._get_async_client()
+    client = provider._async_client
     assert response.content == "hello from minimax"
     assert response.finish_reason == "stop"
     assert response.usage.total_tokens == 7
@@ -111,48 +121,91 @@ async def test_minimax_generate_uses_anthropic_messages_api(monkeypatch):
 
 
 @pytest.mark.asyncio
-async def test_minimax_stream_generate_uses_anthropic_stream(monkeypatch):
-    _install_fake_anthropic_module(monkeypatch)
+async def test_minimax_generate_forwards_extra_params(fake_anthropic):
     provider = MinimaxProvider({"api_key": "k", "provider_name": "minimax", "base_url": "https://mock"})
 
-    chunks = []
-    async for chunk in provider.stream_generate(
+    await provider.generate(
         AIRequest(
             model="abab6.5s-chat",
             messages=[Message(role=MessageRole.USER, content="hello")],
-            stream=True,
+            extra_params={"top_p": 0.9, "top_k": None},
         )
-    ):
-        chunks.append(chunk)
+    )
 
-    assert chunks == ["A", "B"]
+    client = provider._async_client
+    assert client.messages.last_kwargs["top_p"] == 0.9
+    assert "top_k" not in client.messages.last_kwargs
 
 
 @pytest.mark.asyncio
-async def test_minimax_generate_raises_when_api_key_missing(monkeypatch):
-    _install_fake_anthropic_module(monkeypatch)
-    provider = MinimaxProvider({"api_key": "", "provider_name": "minimax", "base_url": "https://mock"})
+async def test_minimax_extra_params_cannot_override_fixed_keys(fake_anthropic):
+    provider = MinimaxProvider({"api_key": "k", "provider_name": "minimax", "base_url": "https://mock"})
 
-    with pytest.raises(ValueError, match="Minimax API key is missing"):
-        await provider.generate(
-            AIRequest(
-                model="abab6.5s-chat",
-                messages=[Message(role=MessageRole.USER, content="hello")],
-            )
+    await provider.generate(
+        AIRequest(
+            model="abab6.5s-chat",
+            messages=[Message(role=MessageRole.USER, content="hello")],
+            max_tokens=16,
+            extra_params={"model": "other-model", "max_tokens": 100000, "top_p": 0.5},
         )
+    )
+
+    client = provider._async_client
+    assert client.messages.last_kwargs["model"] == "abab6.5s-chat"
+    assert client.messages.last_kwargs["max_tokens"] == 16
+    assert client.messages.last_kwargs["top_p"] == 0.5
 
 
 @pytest.mark.asyncio
-async def test_minimax_generate_raises_when_api_key_is_placeholder(monkeypatch):
-    _install_fake_anthropic_module(monkeypatch)
-    provider = MinimaxProvider(
-        {"api_key": "${MINIMAX_API_KEY}", "provider_name": "minimax", "base_url": "https://mock"}
+async def test_minimax_generate_passes_system_messages_as_system_param(fake_anthropic):
+    provider = MinimaxProvider({"api_key": "k", "provider_name": "minimax", "base_url": "https://mock"})
+
+    await provider.generate(
+        AIRequest(
+            model="abab6.5s-chat",
+            messages=[
+                Message(role=MessageRole.SYSTEM, content="be brief"),
+                Message(role=MessageRole.USER, content="hello"),
+                Message(role=MessageRole.SYSTEM, content="answer in English"),
+            ],
+            json_mode=True,
+        )
     )
 
-    with pytest.raises(ValueError, match="Minimax API key is missing"):
-        await provider.generate(
-            AIRequest(
-                model="abab6.5s-chat",
-                messages=[Message(role=MessageRole.USER, content="hello")],
-            )
+    client = provider._async_client
+    assert client.messages.last_kwargs["system"] == (
+        "be brief\n\nanswer in English\n\nYou must respond in valid JSON."
+    )
+    assert client.messages.last_kwargs["messages"] == [{"role": "user", "content": "hello"}]
+
+
+@pytest.mark.asyncio
+async def test_minimax_stream_generate_uses_anthropic_stream(fake_anthropic):
+    provider = MinimaxProvider({"api_key": "k", "provider_name": "minimax", "base_url": "https://mock"})
+
+    chunks = []
+    async for chunk in provider.stream_generate(
+        AIRequest(
+            model="abab6.5s-chat",
+            messages=[Message(role=MessageRole.USER, content="hello")],
+            stream=True,
         )
+    ):
+        chunks.append(chunk)
+
+    assert [chunk.text for chunk in chunks] == ["A", "B"]
+
+
+@pytest.mark.parametrize(
+    "api_key",
+    [
+        pytest.param("", id="missing"),
+        pytest.param("${MINIMAX_API_KEY}", id="placeholder"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_minimax_generate_raises_when_api_key_invalid(fake_anthropic, hello_request, api_key):
+    provider = MinimaxProvider({"api_key": api_key, "provider_name": "minimax", "base_url": "https://mock"})
+
+    with pytest.raises(ValueError, match="Minimax API key is missing"):
+        await provider.generate(hello_request)
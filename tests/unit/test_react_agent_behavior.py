@@ -19,6 +19,9 @@ class _PlainAnswerProvider:
         )
 
 
+_PLAIN_ANSWER_PROVIDER = _PlainAnswerProvider()
+
+
 class _LowerCaseActionProvider:
     async def generate(self, request):
         return AIResponse(
@@ -29,6 +32,9 @@ class _LowerCaseActionProvider:
         )
 
 
+_LOWER_CASE_ACTION_PROVIDER = _LowerCaseActionProvider()
+
+
 class _ToolActionWithoutToolsProvider:
     async def generate(self, request):
         return AIResponse(
@@ -39,17 +45,21 @@ class _ToolActionWithoutToolsProvider:
         )
 
 
+_TOOL_ACTION_WITHOUT_TOOLS_PROVIDER = _ToolActionWithoutToolsProvider()
+
+# Agent 只持有配置引用、不会修改，各用例共用同一份配置
+_REACT_CONFIG = AgentConfig(
+    name="react",
+    agent_type=AgentType.REACT,
+    model="chat-max-001",
+    max_iterations=3,
+)
+
+
 @pytest.mark.asyncio
 async def test_react_agent_finishes_when_model_returns_plain_answer():
-    agent = ReActAgent(
-        AgentConfig(
-            name="react",
-            agent_type=AgentType.REACT,
-            model="chat-max-001",
-            max_iterations=3,
-        )
-    )
-    agent._set_llm_provider(_PlainAnswerProvider())
+    agent = ReActAgent(_REACT_CONFIG)
+    agent._set_llm_provider(_PLAIN_ANSWER_PROVIDER)
 
     result = await agent.execute("What is the capital of France?")
 
@@ -60,15 +70,8 @@ async def test_react_agent_finishes_when_model_returns_plain_answer():
 
 @pytest.mark.asyncio
 async def test_react_agent_parses_action_case_insensitively():
-    agent = ReActAgent(
-        AgentConfig(
-            name="react",
-            agent_type=AgentType.REACT,
-            model="chat-max-001",
-            max_iterations=3,
-        )
-    )
-    agent._set_llm_provider(_LowerCaseActionProvider())
+    agent = ReActAgent(_REACT_CONFIG)
+    agent._set_llm_provider(_LOWER_CASE_ACTION_PROVIDER)
 
     result = await agent.execute("Any task")
 
@@ -79,15 +82,8 @@ async def test_react_agent_parses_action_case_insensitively():
 
 @pytest.mark.asyncio
 async def test_react_agent_finishes_when_action_requested_but_no_tools_configured():
-    agent = ReActAgent(
-        AgentConfig(
-            name="react",
-            agent_type=AgentType.REACT,
-            model="chat-max-001",
-            max_iterations=3,
-        )
-    )
-    agent._set_llm_provider(_ToolActionWithoutToolsProvider())
+    agent = ReActAgent(_REACT_CONFIG)
+    agent._set_llm_provider(_TOOL_ACTION_WITHOUT_TOOLS_PROVIDER)
 
     result = await agent.execute("Any task")
 
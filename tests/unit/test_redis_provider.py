@@ -0,0 +1,114 @@
+# [Input] RedisProvider 与按类型区分 String/Hash 的内存版 Redis 客户端。
+# [Output] 验证 Hash 格式记忆的存取，以及旧版本JSON字符串键不影响新格式读写。
+# [Pos] unit 测试层 Redis 记忆存储格式兼容回归。
+
+import json
+
+import pytest
+
+from src.memory.providers import RedisProvider
+
+
+class _WrongTypeError(Exception):
+    """模拟 redis.exceptions.ResponseError: WRONGTYPE"""
+
+
+class _FakePipeline:
+    def __init__(self, client):
+        self._client = client
+        self._commands = []
+
+    def __getattr__(self, name):
+        method = getattr(self._client, name)
+
+        def queue(*args, **kwargs):
+            self._commands.append((method, args, kwargs))
+
+        return queue
+
+    async def execute(self):
+        return [await method(*args, **kwargs) for method, args, kwargs in self._commands]
+
+
+class _FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def pipeline(self, transaction=True):
+        return _FakePipeline(self)
+
+    def _hash(self, key):
+        value = self.data.get(key)
+        if value is not None and not isinstance(value, dict):
+            raise _WrongTypeError("WRONGTYPE Operation against a key holding the wrong kind of value")
+        return value
+
+    async def set(self, key, value):
+        self.data[key] = value
+
+    async def hset(self, key, mapping):
+        value = self._hash(key)
+        if value is None:
+            value = self.data[key] = {}
+        value.update(mapping)
+
+    async def hgetall(self, key):
+        return dict(self._hash(key) or {})
+
+    async def expire(self, key, seconds):
+        return key in self.data
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def delete(self, *keys):
+        return sum(self.data.pop(key, None) is not None for key in keys)
+
+    async def scan_iter(self, match, count=None):
+        prefix = match.rstrip("*")
+        for key in list(self.data):
+            if key.startswith(prefix):
+                yield key
+
+
+@pytest.fixture
+def redis_client():
+    return _FakeRedis()
+
+
+@pytest.fixture
+def provider(redis_client):
+    provider = RedisProvider()
+    provider._client = redis_client
+    return provider
+
+
+@pytest.mark.asyncio
+async def test_store_and_retrieve_hash(provider):
+    await provider.store("k1", "hello", {"conversation_id": "c1"})
+
+    memory = await provider.retrieve("k1")
+    assert memory.content == "hello"
+    assert memory.metadata == {"conversation_id": "c1"}
+    assert [m and m.content for m in await provider.retrieve_many(["k1", "missing"])] == ["hello", None]
+    assert await provider.exists_many(["k1", "missing"]) == [True, False]
+
+
+@pytest.mark.asyncio
+async def test_legacy_string_keys_do_not_break_hash_reads(provider, redis_client):
+    # 旧版本以JSON字符串写入 prefix+key，HGETALL/HSET 同名键会报 WRONGTYPE
+    await redis_client.set("memory:k1", json.dumps({"content": "old"}))
+
+    assert await provider.retrieve("k1") is None
+    await provider.store("k1", "new")
+    assert (await provider.retrieve("k1")).content == "new"
+
+
+@pytest.mark.asyncio
+async def test_clear_removes_legacy_keys(provider, redis_client):
+    await redis_client.set("memory:old", json.dumps({"content": "old"}))
+    await provider.store("k1", "new")
+
+    await provider.clear()
+
+    assert redis_client.data == {}
@@ -38,25 +38,34 @@ class _DummyDelta:
 
 
 class _DummyStreamChoice:
-    def __init__(self, content: str):
+    def __init__(self, content: str, finish_reason=None):
         self.delta = _DummyDelta(content)
+        self.finish_reason = finish_reason
 
 
 class _DummyStreamChunk:
-    def __init__(self, content: str):
-        self.choices = [_DummyStreamChoice(content)]
+    def __init__(self, content: str, finish_reason=None, usage=None):
+        self.choices = [_DummyStreamChoice(content, finish_reason)]
+        self.usage = usage
 
 
 class _DummyStream:
     def __init__(self, contents: list[str]):
-        self._iterator = iter(contents)
+        # 智谱在最后一个数据块中返回结束原因与用量
+        self._chunks = tuple(_DummyStreamChunk(c) for c in contents[:-1]) + (
+            _DummyStreamChunk(contents[-1], "stop", _DummyUsage()),
+        )
+        self._index = 0
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        content = next(self._iterator)
-        return _DummyStreamChunk(content)
+        if self._index >= len(self._chunks):
+            raise StopIteration
+        chunk = self._chunks[self._index]
+        self._index += 1
+        return chunk
 
 
 class _DummyCompletions:
@@ -77,15 +86,30 @@ class _DummyZhipuAI:
         self.chat = _DummyChat()
 
 
-def _install_fake_zhipu_module(monkeypatch):
+@pytest.fixture(scope="session")
+def _fake_zhipu_module():
     fake_module = types.ModuleType("zhipuai")
     fake_module.ZhipuAI = _DummyZhipuAI
-    monkeypatch.setitem(sys.modules, "zhipuai", fake_module)
+    return fake_module
+
+
+@pytest.fixture
+def fake_zhipu(monkeypatch, _fake_zhipu_module):
+    monkeypatch.setitem(sys.modules, "zhipuai", _fake_zhipu_module)
+    return _fake_zhipu_module
+
+
+@pytest.fixture(scope="module")
+def hello_request():
+    # 请求对象只读，模块内用例共享
+    return AIRequest(
+        model="GLM-4.7",
+        messages=[Message(role=MessageRole.USER, content="hello")],
+    )
 
 
 @pytest.mark.asyncio
-async def test_fallback_to_sync_zhipu_client_when_async_class_missing(monkeypatch):
-    _install_fake_zhipu_module(monkeypatch)
+async def test_fallback_to_sync_zhipu_client_when_async_class_missing(fake_zhipu):
     provider = ZhipuProvider({"api_key": "test-key", "provider_name": "zhipu"})
 
     client = await provider._get_async_client()
@@ -95,31 +119,39 @@ async def test_fallback_to_sync_zhipu_client_when_async_class_missing(monkeypatc
 
 
 @pytest.mark.asyncio
-async def test_generate_with_sync_zhipu_client_fallback(monkeypatch):
-    _install_fake_zhipu_module(monkeypatch)
+async def test_generate_with_sync_zhipu_client_fallback(fake_zhipu, hello_request):
     provider = ZhipuProvider({"api_key": "test-key", "provider_name": "zhipu"})
-    request = AIRequest(
-        model="GLM-4.7",
-        messages=[Message(role=MessageRole.USER, content="hello")],
-    )
 
-    response = await provider.generate(request)
+    response = await provider.generate(hello_request)
 
     assert response.content == "ok"
     assert response.usage.total_tokens == 7
 
 
 @pytest.mark.asyncio
-async def test_stream_generate_with_sync_stream(monkeypatch):
-    _install_fake_zhipu_module(monkeypatch)
+async def test_stream_generate_with_sync_stream(fake_zhipu, hello_request):
     provider = ZhipuProvider({"api_key": "test-key", "provider_name": "zhipu"})
-    request = AIRequest(
-        model="GLM-4.7",
-        messages=[Message(role=MessageRole.USER, content="hello")],
-    )
 
     chunks = []
-    async for chunk in provider.stream_generate(request):
+    async for chunk in provider.stream_generate(hello_request):
         chunks.append(chunk)
 
-    assert chunks == ["a", "b"]
+    assert [chunk.text for chunk in chunks if chunk.text] == ["a", "b"]
+    assert chunks[-1].finish_reason == "stop"
+    assert chunks[-1].usage.total_tokens == 7
+
+
+@pytest.mark.asyncio
+async def test_generate_reports_cached_tokens(monkeypatch, fake_zhipu, hello_request):
+    monkeypatch.setattr(
+        _DummyUsage,
+        "prompt_tokens_details",
+        types.SimpleNamespace(cached_tokens=2),
+        raising=False,
+    )
+    provider = ZhipuProvider({"api_key": "test-key", "provider_name": "zhipu"})
+
+    response = await provider.generate(hello_request)
+
+    assert response.usage.cached_tokens == 2
+    assert response.usage.reasoning_tokens == 0